@@ -1155,6 +1155,7 @@ void checkServerSessionStatus() {
   HTTPClient http;
   http.setTimeout(10000);
   http.begin(String(server_ip) + "/api/session-status");
+  http.addHeader("X-Device-MAC", WiFi.macAddress());  // Server answers with this scanner's room session
 
   int httpCode = http.GET();
 
@@ -1200,6 +1201,7 @@ void sendToServer(int roll_id) {
   HTTPClient http;
   http.begin(String(server_ip) + "/api/mark-attendance-by-roll-id");
   http.addHeader("Content-Type", "application/json");
+  http.addHeader("X-Device-MAC", WiFi.macAddress());
 
   JsonDocument doc;
   doc["class_roll_id"] = roll_id;
@@ -1288,6 +1290,7 @@ void tryToSyncQueue() {
   http.setTimeout(15000);
   http.begin(String(server_ip) + "/api/bulk-mark-attendance");
   http.addHeader("Content-Type", "application/json");
+  http.addHeader("X-Device-MAC", WiFi.macAddress());
 
   JsonDocument doc;
   JsonArray rollArray = doc["roll_ids"].to<JsonArray>();
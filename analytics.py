@@ -3,11 +3,18 @@ import io
 import base64
 from datetime import datetime
 
-# Matplotlib configuration for server-side rendering (no GUI)
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+
+def _load_pyplot():
+    """
+    Imports matplotlib on first use (it is slow to import and only needed for graphs).
+    Returns (pyplot, matplotlib.dates) configured for server-side rendering (no GUI).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    return plt, mdates
+
 
 def calculate_status_and_improvement(present_count, total_sessions, target_percent=75.0, critical_percent=60.0):
     """
@@ -101,6 +108,59 @@ def calculate_status_and_improvement(present_count, total_sessions, target_perce
 #   Teacher Analytics Functions
 # =============================================================================
 
+def _parse_trend_points(sessions_data):
+    """
+    Parses session dicts into trend points.
+    
+    Returns:
+        list of (date_obj, percentage, session) tuples; sessions with unparseable dates are skipped
+    """
+    points = []
+    
+    for session in sessions_data:
+        try:
+            date_str = session.get('date', session.get('start_time', ''))
+            if isinstance(date_str, str):
+                # Handle different date formats
+                if 'T' in date_str:
+                    date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+                else:
+                    date_obj = datetime.strptime(date_str.split(' ')[0], '%Y-%m-%d')
+            else:
+                date_obj = date_str
+            
+            total = session.get('total_students', 1)
+            present = session.get('present_count', 0)
+            pct = (present / total * 100) if total > 0 else 0
+            points.append((date_obj, pct, session))
+        except (ValueError, TypeError):
+            continue
+    
+    return points
+
+
+def build_attendance_trend_series(sessions_data):
+    """
+    Returns the attendance trend as JSON-ready points (the data behind the trend graph),
+    so clients can draw the chart themselves.
+    
+    Args:
+        sessions_data: List of dicts with 'date', 'present_count', 'total_students' keys
+        
+    Returns:
+        list of dicts with 'date' (YYYY-MM-DD), 'percentage', 'present_count', 'total_students'
+    """
+    return [
+        {
+            'date': date_obj.strftime('%Y-%m-%d'),
+            'percentage': round(pct, 1),
+            'present_count': session.get('present_count', 0),
+            'total_students': session.get('total_students', 1)
+        }
+        for date_obj, pct, session in _parse_trend_points(sessions_data or [])
+    ]
+
+
 def generate_attendance_trend_graph(sessions_data):
     """
     Generates a base64-encoded PNG line graph showing attendance trends over time.
@@ -116,33 +176,15 @@ def generate_attendance_trend_graph(sessions_data):
     
     try:
         # Parse dates and calculate percentages
-        dates = []
-        percentages = []
-        
-        for session in sessions_data:
-            try:
-                date_str = session.get('date', session.get('start_time', ''))
-                if isinstance(date_str, str):
-                    # Handle different date formats
-                    if 'T' in date_str:
-                        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    else:
-                        date_obj = datetime.strptime(date_str.split(' ')[0], '%Y-%m-%d')
-                else:
-                    date_obj = date_str
-                
-                dates.append(date_obj)
-                
-                total = session.get('total_students', 1)
-                present = session.get('present_count', 0)
-                pct = (present / total * 100) if total > 0 else 0
-                percentages.append(pct)
-            except (ValueError, TypeError):
-                continue
+        points = _parse_trend_points(sessions_data)
+        dates = [date_obj for date_obj, _, _ in points]
+        percentages = [pct for _, pct, _ in points]
         
         if len(dates) < 2:
             return None
         
+        plt, mdates = _load_pyplot()
+        
         # Create the figure with a clean style
         fig, ax = plt.subplots(figsize=(10, 4), dpi=100)
         fig.patch.set_facecolor('#1a1d23')  # Dark background
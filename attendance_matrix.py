@@ -0,0 +1,278 @@
+# =================================================================
+#   A.R.I.S.E. - Attendance Matrix Store
+#   Per-course "who attended which session" matrices held in memory
+#
+#   Architecture:
+#     attendance_records --triggers--> attendance_changes (change log)
+#     AttendanceMatrixStore.get(course) --> loads the course once, then
+#       applies only the change-log rows written since (by any process)
+#
+#   A CourseMatrix holds two NumPy bool arrays (students x sessions):
+#     present - normal attendance marks
+#     absent  - explicit absents written by emergency mode
+#   Sessions are columns in start_time order (oldest first); students
+#   are rows for everyone with at least one record in the course.
+# =================================================================
+
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXPLICIT_ABSENT_METHOD = 'emergency_mode_absent'
+CHANGE_LOG_KEEP_ROWS = 20000  # Processes further behind than this reload the course
+
+# --- Change log (installed by schema migration 7) ---
+CHANGE_LOG_TABLE = """
+    CREATE TABLE IF NOT EXISTS attendance_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        course_id INTEGER,
+        session_id INTEGER,
+        student_id INTEGER,
+        change TEXT NOT NULL
+    )
+"""
+
+_LOG_RECORD = """
+    INSERT INTO attendance_changes (course_id, session_id, student_id, change)
+    SELECT s.course_id, {row}.session_id, {row}.student_id, {change}
+    FROM sessions s WHERE s.id = {row}.session_id;
+"""
+_MARK_CHANGE = f"CASE WHEN NEW.override_method IS '{EXPLICIT_ABSENT_METHOD}' THEN 'absent' ELSE 'present' END"
+_LOG_RELOAD = "INSERT INTO attendance_changes (course_id, change) VALUES ({course}, 'reload');"
+
+CHANGE_LOG_TRIGGERS = [
+    ('trg_changes_attendance_insert',
+     f"AFTER INSERT ON attendance_records BEGIN {_LOG_RECORD.format(row='NEW', change=_MARK_CHANGE)} END"),
+    ('trg_changes_attendance_delete',
+     f"AFTER DELETE ON attendance_records BEGIN {_LOG_RECORD.format(row='OLD', change=repr('remove'))} END"),
+    ('trg_changes_attendance_update',
+     "AFTER UPDATE OF session_id, student_id, override_method ON attendance_records BEGIN "
+     f"{_LOG_RECORD.format(row='OLD', change=repr('remove'))} "
+     f"{_LOG_RECORD.format(row='NEW', change=_MARK_CHANGE)} END"),
+    # Session columns changed - affected courses reload
+    ('trg_changes_session_insert',
+     f"AFTER INSERT ON sessions BEGIN {_LOG_RELOAD.format(course='NEW.course_id')} END"),
+    ('trg_changes_session_delete',
+     f"AFTER DELETE ON sessions BEGIN {_LOG_RELOAD.format(course='OLD.course_id')} END"),
+    ('trg_changes_session_update',
+     "AFTER UPDATE OF course_id, start_time ON sessions BEGIN "
+     f"{_LOG_RELOAD.format(course='OLD.course_id')} {_LOG_RELOAD.format(course='NEW.course_id')} END"),
+]
+
+
+def install_change_log(conn):
+    """Creates the attendance_changes table and its triggers. Does not commit."""
+    conn.execute(CHANGE_LOG_TABLE)
+    for name, body in CHANGE_LOG_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def log_reset(conn, after_seq=0):
+    """
+    Writes a 'reset' change that makes every process reload all matrices.
+    Used after the database file is replaced (sync import): the new seq is
+    placed after `after_seq`, the last seq of the replaced file.
+    """
+    latest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM attendance_changes").fetchone()[0]
+    conn.execute("INSERT INTO attendance_changes (seq, change) VALUES (?, 'reset')",
+                 (max(latest, after_seq) + 1,))
+
+
+def latest_change_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM attendance_changes").fetchone()[0]
+
+
+def prune_change_log(conn, keep_rows=CHANGE_LOG_KEEP_ROWS):
+    """Deletes old change-log rows, keeping the newest `keep_rows`. Returns rows deleted."""
+    cursor = conn.execute("DELETE FROM attendance_changes WHERE seq <= (SELECT MAX(seq) FROM attendance_changes) - ?",
+                          (keep_rows,))
+    conn.commit()
+    return cursor.rowcount
+
+
+class CourseMatrix:
+    """
+    Attendance of one course as students x sessions boolean arrays.
+    Treated as immutable once published - updates build a new matrix.
+    """
+
+    def __init__(self, course_id, session_ids, session_starts, student_ids, present, absent, seq):
+        self.course_id = course_id
+        self.session_ids = session_ids          # Oldest first
+        self.session_starts = session_starts    # start_time strings, same order
+        self.student_ids = student_ids
+        self.present = present
+        self.absent = absent
+        self.seq = seq                          # Last change-log seq applied
+        self.col_of = {sid: j for j, sid in enumerate(session_ids)}
+        self.row_of = {sid: i for i, sid in enumerate(student_ids)}
+
+    @property
+    def records(self):
+        """Any attendance record (present or explicit absent) - what raw COUNT(*) queries counted."""
+        return self.present | self.absent
+
+    @property
+    def nbytes(self):
+        return int(self.present.nbytes + self.absent.nbytes)
+
+    def student_row(self, student_id, matrix=None):
+        """One student's row (all sessions, oldest first); all False if the student has no records."""
+        matrix = self.records if matrix is None else matrix
+        i = self.row_of.get(student_id)
+        if i is None:
+            return np.zeros(len(self.session_ids), dtype=bool)
+        return matrix[i]
+
+    def counts_for(self, student_ids, matrix=None):
+        """Per-student totals across all sessions for the given students."""
+        matrix = self.records if matrix is None else matrix
+        totals = matrix.sum(axis=1)
+        return [int(totals[self.row_of[sid]]) if sid in self.row_of else 0 for sid in student_ids]
+
+    def session_counts(self, matrix=None):
+        """Per-session totals (oldest session first)."""
+        matrix = self.present if matrix is None else matrix
+        return matrix.sum(axis=0)
+
+    def pairs(self, matrix):
+        """(session_id, student_id) pairs set in `matrix` - the report's present/absent sets."""
+        rows, cols = np.nonzero(matrix)
+        return [(self.session_ids[j], self.student_ids[i]) for i, j in zip(rows.tolist(), cols.tolist())]
+
+    def with_changes(self, changes, seq):
+        """Returns a new matrix with present/absent/remove changes applied."""
+        student_ids = list(self.student_ids)
+        row_of = dict(self.row_of)
+        for _, _, student_id, change in changes:
+            if change != 'remove' and student_id not in row_of:
+                row_of[student_id] = len(student_ids)
+                student_ids.append(student_id)
+
+        n_new = len(student_ids) - len(self.student_ids)
+        padding = np.zeros((n_new, len(self.session_ids)), dtype=bool)
+        present = np.vstack([self.present, padding])
+        absent = np.vstack([self.absent, padding])
+
+        for session_id, _, student_id, change in changes:
+            j = self.col_of.get(session_id)
+            i = row_of.get(student_id)
+            if j is None or i is None:
+                continue
+            present[i, j] = change == 'present'
+            absent[i, j] = change == 'absent'
+
+        return CourseMatrix(self.course_id, self.session_ids, self.session_starts, student_ids,
+                            present, absent, seq)
+
+
+class AttendanceMatrixStore:
+    """
+    Lazily loaded, incrementally updated CourseMatrix per course.
+    Keeps up to `max_courses` matrices (least recently used are dropped).
+    """
+
+    def __init__(self, max_courses=64):
+        self.max_courses = max_courses
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'incremental_updates': 0}
+
+    def get(self, conn, course_id):
+        """Returns the up-to-date CourseMatrix for a course."""
+        latest = latest_change_seq(conn)
+        with self._lock:
+            matrix = self._matrices.get(course_id)
+            if matrix is not None:
+                self._matrices.move_to_end(course_id)
+            if matrix is not None and matrix.seq == latest:
+                self._stats['hits'] += 1
+                return matrix
+
+        if matrix is not None:
+            matrix = self._catch_up(conn, matrix, latest)
+        if matrix is None:
+            matrix = self._load(conn, course_id, latest)
+
+        with self._lock:
+            current = self._matrices.get(course_id)
+            # Another thread may have published a newer matrix meanwhile
+            if current is None or current.seq <= matrix.seq:
+                self._matrices[course_id] = matrix
+                self._matrices.move_to_end(course_id)
+            while len(self._matrices) > self.max_courses:
+                self._matrices.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._matrices.clear()
+
+    def stats(self):
+        """Counters and per-course memory use (bytes held by the NumPy arrays)."""
+        with self._lock:
+            stats = dict(self._stats)
+            courses = {
+                str(course_id): {
+                    'students': len(m.student_ids),
+                    'sessions': len(m.session_ids),
+                    'bytes': m.nbytes
+                }
+                for course_id, m in self._matrices.items()
+            }
+        stats['courses'] = courses
+        stats['total_bytes'] = sum(c['bytes'] for c in courses.values())
+        stats['max_courses'] = self.max_courses
+        return stats
+
+    def _catch_up(self, conn, matrix, latest):
+        """Applies change-log rows newer than the matrix. Returns None if a full reload is needed."""
+        oldest = conn.execute("SELECT MIN(seq) FROM attendance_changes").fetchone()[0]
+        if oldest is None or oldest > matrix.seq + 1:
+            return None  # Log was pruned past this matrix
+
+        changes = conn.execute("""
+            SELECT session_id, course_id, student_id, change FROM attendance_changes
+            WHERE seq > ? AND seq <= ? AND (course_id = ? OR course_id IS NULL)
+            ORDER BY seq
+        """, (matrix.seq, latest, matrix.course_id)).fetchall()
+        if any(c['change'] in ('reload', 'reset') for c in changes):
+            return None
+
+        with self._lock:
+            self._stats['incremental_updates'] += 1
+        return matrix.with_changes([tuple(c) for c in changes], latest)
+
+    def _load(self, conn, course_id, latest):
+        """Builds a course matrix from scratch with one sessions query and one records query."""
+        sessions = conn.execute(
+            "SELECT id, start_time FROM sessions WHERE course_id = ? ORDER BY start_time",
+            (course_id,)).fetchall()
+        session_ids = [s['id'] for s in sessions]
+        col_of = {sid: j for j, sid in enumerate(session_ids)}
+
+        records = conn.execute("""
+            SELECT ar.session_id, ar.student_id, ar.override_method
+            FROM attendance_records ar
+            JOIN sessions s ON ar.session_id = s.id
+            WHERE s.course_id = ?
+        """, (course_id,)).fetchall()
+
+        student_ids = sorted(set(r['student_id'] for r in records))
+        row_of = {sid: i for i, sid in enumerate(student_ids)}
+        present = np.zeros((len(student_ids), len(session_ids)), dtype=bool)
+        absent = np.zeros_like(present)
+        for r in records:
+            target = absent if r['override_method'] == EXPLICIT_ABSENT_METHOD else present
+            target[row_of[r['student_id']], col_of[r['session_id']]] = True
+
+        with self._lock:
+            self._stats['loads'] += 1
+        logger.debug(f"[MATRIX] Loaded course {course_id} - {len(student_ids)} students x {len(session_ids)} sessions")
+        return CourseMatrix(course_id, session_ids, [s['start_time'] for s in sessions],
+                            student_ids, present, absent, latest)
@@ -0,0 +1,177 @@
+# =================================================================
+#   A.R.I.S.E. - Group-Commit Attendance Writer
+#   One writer thread turns attendance inserts from concurrent requests
+#   into a few short transactions instead of one commit per student
+#
+#   Architecture:
+#     scan / OTP mark / manual override --submit()--> queue --> writer thread
+#        writer: take everything queued within batch_window_ms (max_batch)
+#                --> BEGIN IMMEDIATE, one INSERT OR IGNORE per item, COMMIT
+#        --> each caller's Future resolves to True (inserted) / False (ignored)
+#
+#   The Future only resolves after COMMIT, so a caller that waits on it
+#   answers the device with a durable result. Requests no longer compete
+#   for SQLite's write lock - inside this process only the writer writes
+#   attendance.
+# =================================================================
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+WRITE_TIMEOUT_SECONDS = 10   # How long a request waits for its batch to commit
+
+_INSERT_SQL = """
+    INSERT OR IGNORE INTO attendance_records (session_id, student_id, override_method, manual_reason)
+    SELECT ?, ?, ?, ?
+"""
+# Appended for inserts that must only land while the session is still active
+_ACTIVE_SESSION_GUARD = " WHERE EXISTS (SELECT 1 FROM sessions WHERE id = ? AND is_active = 1)"
+
+_STOP = object()
+
+
+class AttendanceWrite:
+    """One queued insert and the Future its caller waits on."""
+
+    def __init__(self, session_id, student_id, override_method, manual_reason=None, require_active=False):
+        self.session_id = session_id
+        self.student_id = student_id
+        self.override_method = override_method
+        self.manual_reason = manual_reason
+        self.require_active = require_active
+        self.future = Future()
+
+    def execute(self, conn):
+        """Runs the INSERT on `conn` (inside the caller's transaction). Returns True if a row was added."""
+        params = (self.session_id, self.student_id, self.override_method, self.manual_reason)
+        if self.require_active:
+            cursor = conn.execute(_INSERT_SQL + _ACTIVE_SESSION_GUARD, params + (self.session_id,))
+        else:
+            cursor = conn.execute(_INSERT_SQL, params)
+        return cursor.rowcount == 1
+
+
+class AttendanceWriter:
+    """
+    Single writer thread with group commit. If the thread isn't running
+    (not started, or shut down) submit() writes in the calling thread.
+    """
+
+    def __init__(self, connect, batch_window_ms=2, max_batch=200):
+        self.connect = connect          # Returns a pooled connection (closed after use)
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'writes': 0, 'inserted': 0, 'batches': 0, 'largest_batch': 0,
+                       'batch_retries': 0, 'inline_writes': 0, 'errors': 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout=5):
+        """Writes what is still queued, then stops the thread (registered with atexit by the server)."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, session_id, student_id, override_method, manual_reason=None, require_active=False):
+        """Queues one INSERT OR IGNORE. Returns a Future -> True if the record was added, False if ignored."""
+        write = AttendanceWrite(session_id, student_id, override_method, manual_reason, require_active)
+        if self._thread is None:
+            with self._lock:
+                self._stats['inline_writes'] += 1
+            self._write_batch([write])
+        else:
+            self._queue.put(write)
+        return write.future
+
+    def insert(self, session_id, student_id, override_method, manual_reason=None, require_active=False):
+        """submit() and wait for the commit. Returns True if the record was added."""
+        return self.submit(session_id, student_id, override_method, manual_reason,
+                           require_active).result(timeout=WRITE_TIMEOUT_SECONDS)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_batch'] = round(stats['writes'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize()
+        stats['running'] = self._thread is not None
+        stats['batch_window_ms'] = self.batch_window * 1000
+        return stats
+
+    # --- Writer thread ---
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    # Everything already queued, plus whatever arrives within the batch window
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        try:
+            results = self._commit(batch)
+        except Exception as e:
+            # One bad insert must not fail the others - retry them one transaction each
+            logger.warning(f"[WRITER] Batch of {len(batch)} failed ({e}), retrying individually")
+            with self._lock:
+                self._stats['batch_retries'] += 1
+            results = []
+            for write in batch:
+                try:
+                    results.extend(self._commit([write]))
+                except Exception as item_error:
+                    results.append(item_error)
+
+        inserted = 0
+        for write, result in zip(batch, results):
+            if isinstance(result, Exception):
+                write.future.set_exception(result)
+            else:
+                inserted += result
+                write.future.set_result(result)
+
+        with self._lock:
+            self._stats['writes'] += len(batch)
+            self._stats['inserted'] += inserted
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['errors'] += sum(1 for result in results if isinstance(result, Exception))
+
+    def _commit(self, batch):
+        """One transaction for the whole batch. Returns the per-write results (raises on failure)."""
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                results = [write.execute(conn) for write in batch]
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return results
+        finally:
+            conn.close()
@@ -6,7 +6,7 @@
 #   Cron:  0 */6 * * * cd /path/to/arise && python backup_db.py
 # =================================================================
 
-import shutil
+import sqlite3
 import os
 import datetime
 import glob
@@ -39,8 +39,13 @@ def create_backup():
     backup_path = os.path.join(BACKUP_DIR, backup_filename)
     
     try:
-        # Copy the database file
-        shutil.copy2(DB_PATH, backup_path)
+        # Copy via the SQLite backup API - a plain file copy would miss
+        # commits still sitting in the WAL file (database runs in WAL mode)
+        source = sqlite3.connect(DB_PATH)
+        dest = sqlite3.connect(backup_path)
+        source.backup(dest)
+        dest.close()
+        source.close()
         
         # Get file size
         size_mb = os.path.getsize(backup_path) / (1024 * 1024)
@@ -0,0 +1,245 @@
+# =================================================================
+#   A.R.I.S.E. - Admin Analytics Overview Benchmark
+#   Compares the original per-row query version of the overview with
+#   rollups.analytics_overview on synthetic databases of growing size,
+#   checks that both return identical results and prints the timings.
+#
+#   Usage: python benchmark_overview.py [--scales 1,2,4,8]
+# =================================================================
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import argparse
+import contextlib
+
+from schema_migrations import run_migrations
+from rollups import analytics_overview
+
+# Synthetic batch per scale step
+COURSES_PER_SEMESTER = 6
+SEMESTERS = 2
+STUDENTS_PER_SCALE = 60
+SESSIONS_PER_COURSE_PER_SCALE = 25
+PRESENT_PROBABILITY = 0.8
+
+
+def legacy_overview(conn, semester_id=None):
+    """The overview exactly as the endpoint computed it before the rollup rewrite."""
+    sem_course_filter = ""
+    sem_session_filter = ""
+    sem_enroll_filter = ""
+    sem_params = []
+    
+    if semester_id:
+        sem_course_filter = " WHERE c.semester_id = ?"
+        sem_session_filter = " AND s.course_id IN (SELECT id FROM courses WHERE semester_id = ?)"
+        sem_enroll_filter = " AND e.course_id IN (SELECT id FROM courses WHERE semester_id = ?)"
+        sem_params = [semester_id]
+    
+    # Total students: if semester filter, count distinct students enrolled in that semester's courses
+    if semester_id:
+        total_students = conn.execute(
+            "SELECT COUNT(DISTINCT e.student_id) as c FROM enrollments e "
+            "JOIN courses c ON e.course_id = c.id WHERE c.semester_id = ?", [semester_id]
+        ).fetchone()['c']
+    else:
+        total_students = conn.execute("SELECT COUNT(*) as c FROM students").fetchone()['c']
+    
+    total_courses = conn.execute(
+        f"SELECT COUNT(*) as c FROM courses c{sem_course_filter}", sem_params
+    ).fetchone()['c']
+    
+    total_sessions = conn.execute(
+        f"SELECT COUNT(*) as c FROM sessions s WHERE 1=1{sem_session_filter}", sem_params
+    ).fetchone()['c']
+    
+    total_attendance = conn.execute(
+        f"SELECT COUNT(*) as c FROM attendance_records ar "
+        f"JOIN sessions s ON ar.session_id = s.id WHERE 1=1{sem_session_filter}", sem_params
+    ).fetchone()['c']
+    
+    # Online vs offline sessions
+    online_sessions = conn.execute(
+        f"SELECT COUNT(*) as c FROM sessions s WHERE session_type = 'online'{sem_session_filter}",
+        sem_params
+    ).fetchone()['c']
+    offline_sessions = total_sessions - online_sessions
+    
+    # Sessions this week
+    sessions_this_week = conn.execute(
+        f"SELECT COUNT(*) as c FROM sessions s "
+        f"WHERE start_time >= date('now', '-7 days'){sem_session_filter}", sem_params
+    ).fetchone()['c']
+    
+    # Sessions this month
+    sessions_this_month = conn.execute(
+        f"SELECT COUNT(*) as c FROM sessions s "
+        f"WHERE start_time >= date('now', 'start of month'){sem_session_filter}", sem_params
+    ).fetchone()['c']
+    
+    # Average attendance per session
+    avg_attendance = conn.execute(
+        f"SELECT AVG(cnt) as avg_count FROM ("
+        f"  SELECT ar.session_id, COUNT(*) as cnt FROM attendance_records ar "
+        f"  JOIN sessions s ON ar.session_id = s.id WHERE 1=1{sem_session_filter} "
+        f"  GROUP BY ar.session_id"
+        f")", sem_params
+    ).fetchone()['avg_count'] or 0
+    
+    # Overall attendance rate
+    total_possible = conn.execute(
+        f"SELECT SUM(enrolled) as total FROM ("
+        f"  SELECT s.id, "
+        f"    (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = s.course_id) as enrolled "
+        f"  FROM sessions s WHERE 1=1{sem_session_filter}"
+        f")", sem_params
+    ).fetchone()['total'] or 1
+    overall_rate = round((total_attendance / total_possible) * 100, 1) if total_possible > 0 else 0
+    
+    # At-risk student count (below 75% in any course)
+    at_risk_query = conn.execute(
+        f"SELECT COUNT(DISTINCT e.student_id) as c "
+        f"FROM enrollments e "
+        f"JOIN courses c ON e.course_id = c.id "
+        f"WHERE (SELECT COUNT(*) FROM attendance_records ar "
+        f"  JOIN sessions s ON ar.session_id = s.id "
+        f"  WHERE ar.student_id = e.student_id AND s.course_id = e.course_id"
+        f") < 0.75 * ("
+        f"  SELECT COUNT(*) FROM sessions s WHERE s.course_id = e.course_id"
+        f") AND (SELECT COUNT(*) FROM sessions s WHERE s.course_id = e.course_id) > 0"
+        f"{sem_enroll_filter}", sem_params
+    ).fetchone()['c']
+    
+    # Course-wise summary
+    course_summary = conn.execute(
+        f"SELECT c.id, c.course_name, c.course_code, "
+        f"  t.teacher_name, "
+        f"  (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = c.id) as enrolled_count, "
+        f"  (SELECT COUNT(*) FROM sessions s WHERE s.course_id = c.id) as session_count, "
+        f"  (SELECT COUNT(*) FROM attendance_records ar "
+        f"    JOIN sessions s ON ar.session_id = s.id "
+        f"    WHERE s.course_id = c.id) as total_marks "
+        f"FROM courses c "
+        f"LEFT JOIN teachers t ON c.teacher_id = t.id "
+        f"{'WHERE c.semester_id = ?' if semester_id else ''} "
+        f"ORDER BY c.course_name",
+        sem_params
+    ).fetchall()
+    
+    course_data = []
+    for row in course_summary:
+        r = dict(row)
+        possible = r['enrolled_count'] * r['session_count']
+        r['attendance_rate'] = round((r['total_marks'] / possible) * 100, 1) if possible > 0 else 0
+        course_data.append(r)
+    
+    return {
+        "total_students": total_students,
+        "total_courses": total_courses,
+        "total_sessions": total_sessions,
+        "total_attendance_marks": total_attendance,
+        "online_sessions": online_sessions,
+        "offline_sessions": offline_sessions,
+        "sessions_this_week": sessions_this_week,
+        "sessions_this_month": sessions_this_month,
+        "avg_attendance_per_session": round(avg_attendance, 1),
+        "overall_attendance_rate": overall_rate,
+        "at_risk_count": at_risk_query,
+        "course_summary": course_data,
+        "semester_id": semester_id
+    }
+
+
+def build_database(path, scale, seed=42):
+    """Creates the schema (database_setup) and fills it with a synthetic batch."""
+    os.environ['DATABASE_PATH'] = path
+    import database_setup
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        database_setup.setup_database()
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    n_students = STUDENTS_PER_SCALE * scale
+    n_sessions = SESSIONS_PER_COURSE_PER_SCALE * scale
+
+    conn.executemany("INSERT INTO students (id, student_name, university_roll_no, enrollment_no, password) "
+                     "VALUES (?, ?, ?, ?, 'x')",
+                     [(i, f"Student {i}", f"U{i:05d}", f"E{i:05d}") for i in range(1, n_students + 1)])
+    conn.execute("INSERT INTO teachers (id, teacher_name, pin) VALUES (1, 'Teacher', 'x')")
+
+    course_id = 0
+    for sem in range(1, SEMESTERS + 1):
+        conn.execute("INSERT INTO semesters (id, semester_name) VALUES (?, ?)", (sem, f"Semester {sem}"))
+        for _ in range(COURSES_PER_SEMESTER):
+            course_id += 1
+            conn.execute("INSERT INTO courses (id, semester_id, teacher_id, course_name, course_code) "
+                         "VALUES (?, ?, 1, ?, ?)", (course_id, sem, f"Course {course_id}", f"C{course_id:03d}"))
+            conn.executemany("INSERT INTO enrollments (student_id, course_id, class_roll_id) VALUES (?, ?, ?)",
+                             [(sid, course_id, sid) for sid in range(1, n_students + 1)])
+            for k in range(n_sessions):
+                cursor = conn.execute(
+                    "INSERT INTO sessions (course_id, start_time, end_time, is_active, session_type) "
+                    "VALUES (?, datetime('now', ?), datetime('now', ?), 0, ?)",
+                    (course_id, f"-{k} days", f"-{k} days", 'online' if k % 5 == 0 else 'offline'))
+                session_id = cursor.lastrowid
+                # Students have a personal attendance habit so some end up at risk
+                conn.executemany(
+                    "INSERT INTO attendance_records (session_id, student_id, override_method) VALUES (?, ?, ?)",
+                    [(session_id, sid, 'emergency_mode_absent' if rng.random() < 0.02 else 'biometric')
+                     for sid in range(1, n_students + 1)
+                     if rng.random() < PRESENT_PROBABILITY - (sid % 7) * 0.05])
+    conn.commit()
+    run_migrations(conn)
+    conn.close()
+
+
+def time_call(fn, conn, semester_id, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(conn, semester_id)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the admin analytics overview")
+    parser.add_argument('--scales', default='1,2,4,8', help="comma separated size multipliers")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'scale':>5} {'attendance':>11} {'legacy ms':>10} {'rollup ms':>10} {'speedup':>8}  identical")
+    all_identical = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in [int(s) for s in args.scales.split(',')]:
+            path = os.path.join(tmp, f"bench_{scale}.db")
+            build_database(path, scale)
+
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT COUNT(*) FROM attendance_records").fetchone()[0]
+
+            legacy_time = rollup_time = 0
+            identical = True
+            for semester_id in (None, 1):
+                t, expected = time_call(legacy_overview, conn, semester_id, args.repeat)
+                legacy_time += t
+                t, actual = time_call(analytics_overview, conn, semester_id, args.repeat)
+                rollup_time += t
+                identical = identical and expected == actual
+            conn.close()
+
+            all_identical = all_identical and identical
+            print(f"{scale:>5} {rows:>11} {legacy_time * 1000:>10.1f} {rollup_time * 1000:>10.1f} "
+                  f"{legacy_time / rollup_time:>7.1f}x  {'yes' if identical else 'NO'}")
+
+    sys.exit(0 if all_identical else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# =================================================================
+#   A.R.I.S.E. - Trend Graph Renderer
+#   Renders the teacher analytics trend graph off the request thread
+#   and caches the PNG until the course's plotted data changes
+#
+#   Architecture:
+#     request --> cache[(course_id, plotted points)] --hit--> data URI
+#                                                    --miss-> process pool
+#        worker process: analytics.generate_attendance_trend_graph
+#
+#   The key is the course's own data (date, present, enrolled per
+#   session), so scans in other courses never invalidate a graph and
+#   no counter can go stale (sync imports, other server processes).
+#
+#   matplotlib/pyplot keeps global state and holds the GIL while drawing,
+#   so rendering happens in the server's worker process pool (shared with
+#   export jobs, see process_pool.py). Where no pool can be used (no
+#   workers, Windows, a crashed worker) rendering runs in the calling
+#   thread behind a lock.
+# =================================================================
+
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import analytics
+
+logger = logging.getLogger(__name__)
+
+RENDER_TIMEOUT_SECONDS = 30
+
+
+def trend_data_key(sessions_data):
+    """Everything the graph shows: (date, present_count, total_students) per session."""
+    return tuple((session['date'], session['present_count'], session['total_students'])
+                 for session in sessions_data)
+
+
+class TrendGraphRenderer:
+    """
+    LRU cache of rendered trend graphs keyed by (course_id, plotted points),
+    rendered on `pool` - a ProcessPoolExecutor owned by the caller, or None.
+    """
+
+    def __init__(self, max_entries=32, pool=None):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'renders': 0, 'in_thread_renders': 0, 'pool_failures': 0}
+
+    def get(self, course_id, sessions_data):
+        """Returns the graph data URI (or None) for a course's sessions_data."""
+        key = (course_id, trend_data_key(sessions_data))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._cache[key]
+            self._stats['misses'] += 1
+            # Concurrent requests for the same graph share one render
+            future = self._pending.get(key)
+            if future is None:
+                future = self._submit(sessions_data)
+                if future is not None:
+                    self._pending[key] = future
+
+        image = self._wait(future, sessions_data) if future is not None else self._render_in_thread(sessions_data)
+
+        with self._lock:
+            self._pending.pop(key, None)
+            self._stats['renders'] += 1
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Cache counters for monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_graphs'] = len(self._cache)
+            stats['pool_running'] = self._pool is not None
+        stats['max_entries'] = self.max_entries
+        return stats
+
+    # --- Rendering ---
+
+    def _submit(self, sessions_data):
+        """Queues a render on the pool. Caller holds self._lock. Returns None if there is no pool."""
+        if self._pool is None:
+            return None
+        try:
+            return self._pool.submit(analytics.generate_attendance_trend_graph, sessions_data)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._drop_pool(e)
+            return None
+
+    def _drop_pool(self, error):
+        """
+        Stops using a broken or stuck pool - later renders run in-thread. The pool
+        itself belongs to the server (export jobs use it too). Caller holds self._lock.
+        """
+        logger.warning(f"[CHART] Render pool unavailable ({type(error).__name__}), rendering in-thread from now on")
+        self._stats['pool_failures'] += 1
+        self._pool = None
+
+    def _wait(self, future, sessions_data):
+        try:
+            return future.result(timeout=RENDER_TIMEOUT_SECONDS)
+        except (BrokenProcessPool, FutureTimeoutError) as e:
+            with self._lock:
+                if self._pool is not None:
+                    self._drop_pool(e)
+            return self._render_in_thread(sessions_data)
+
+    def _render_in_thread(self, sessions_data):
+        # pyplot is not thread-safe - one in-process render at a time
+        with self._render_lock:
+            with self._lock:
+                self._stats['in_thread_renders'] += 1
+            return analytics.generate_attendance_trend_graph(sessions_data)
@@ -62,6 +62,12 @@ class BaseConfig:
     
     # Database
     DATABASE_PATH = os.environ.get('DATABASE_PATH', 'attendance.db')
+    # Max idle SQLite connections kept open for reuse across requests
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+    # SQLite tuning (WAL mode is enabled at startup)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '16384'))
+    WAL_CHECKPOINT_MINUTES = int(os.environ.get('WAL_CHECKPOINT_MINUTES', '5'))
     
     # Admin
     ADMIN_DEFAULT_PASSWORD = os.environ.get('ADMIN_DEFAULT_PASSWORD', 'admin')
@@ -79,9 +85,44 @@ class BaseConfig:
     ANALYTICS_LAST_DAYS = 7              # Last N days for trend analysis
     ANALYTICS_TREND_DAYS = 30            # Last N days for overall trend
     
+    # Worker processes shared by trend graph renders and export files (0 = run them in-thread)
+    WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', '2'))
+    
+    # Teacher analytics trend graph: rendered PNGs kept in memory
+    TREND_GRAPH_CACHE_SIZE = int(os.environ.get('TREND_GRAPH_CACHE_SIZE', '32'))
+    
+    # Background export jobs: output folder, retention
+    EXPORT_DIR = os.environ.get('EXPORT_DIR', 'exports')
+    EXPORT_RETENTION_HOURS = int(os.environ.get('EXPORT_RETENTION_HOURS', '24'))
+    
+    # Live dashboard event streams (SSE): cross-process re-check interval, stream lifetime before the browser reconnects
+    LIVE_EVENTS_RESYNC_SECONDS = float(os.environ.get('LIVE_EVENTS_RESYNC_SECONDS', '3'))
+    LIVE_EVENTS_MAX_STREAM_SECONDS = int(os.environ.get('LIVE_EVENTS_MAX_STREAM_SECONDS', '900'))
+    # Open live streams per server process (each holds a thread - keep it well below the thread count)
+    LIVE_EVENTS_MAX_STREAMS = int(os.environ.get('LIVE_EVENTS_MAX_STREAMS', '4'))
+    
+    # Scanner hot-path cache (active session + roster): reloaded at least this often, to pick up
+    # changes made by other server processes
+    SCANNER_CACHE_MAX_AGE_SECONDS = int(os.environ.get('SCANNER_CACHE_MAX_AGE_SECONDS', '60'))
+    
+    # Group commit: attendance inserts arriving within this many milliseconds share one transaction
+    ATTENDANCE_BATCH_WINDOW_MS = float(os.environ.get('ATTENDANCE_BATCH_WINDOW_MS', '2'))
+    
+    # A scanner is shown offline when its last heartbeat (sent every 10 s) is older than this
+    DEVICE_OFFLINE_SECONDS = int(os.environ.get('DEVICE_OFFLINE_SECONDS', '15'))
+    
+    # Session expiry timer: re-reads active sessions this often (sessions started by other server processes)
+    SESSION_EXPIRY_RESYNC_SECONDS = int(os.environ.get('SESSION_EXPIRY_RESYNC_SECONDS', '60'))
+    
+    # Pagination for long attendance logs / history lists (?before=<cursor>&limit=N)
+    PAGE_SIZE_DEFAULT = 50
+    PAGE_SIZE_MAX = 200
+    
     # Rate Limiting
     RATE_LIMIT_LOGIN = "5 per minute"    # Max login attempts per IP
     RATE_LIMIT_API = "100 per minute"    # Max API calls per IP
+    # Limiter counters: a SQLite file shared by all server processes ("memory://" = per process)
+    RATE_LIMIT_STORAGE_URI = os.environ.get('RATE_LIMIT_STORAGE_URI', 'sqlite://ratelimit.db')
     
     # --- Cloud Sync Settings ---
     # Auto-detect Render.com (sets RENDER=true automatically) or manual IS_CLOUD_SERVER=true
@@ -112,6 +153,7 @@ class TestingConfig(BaseConfig):
     DEBUG = True
     TESTING = True
     DATABASE_PATH = ':memory:'  # Use in-memory database for tests
+    RATE_LIMIT_STORAGE_URI = 'memory://'
 
 
 # --- Select configuration based on FLASK_ENV ---
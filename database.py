@@ -0,0 +1,282 @@
+# =================================================================
+#   A.R.I.S.E. - Database Connection Pool
+#   Keeps pre-configured SQLite connections alive between requests
+#
+#   Architecture:
+#     Flask request --> flask.g.db (one pooled connection per request)
+#     Teardown hook --> connection goes back to the pool, not closed
+#
+#   The database runs in WAL mode so the scanner, teacher dashboards
+#   and the scheduler can read while a write is in progress.
+# =================================================================
+
+import sqlite3
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Tuned PRAGMA profile ---
+DEFAULT_BUSY_TIMEOUT_MS = 5000     # Wait up to 5s for a lock instead of failing with "database is locked"
+DEFAULT_CACHE_SIZE_KB = 16384      # 16 MB page cache per connection
+
+
+def enable_wal(db_path):
+    """
+    Switches the database file to WAL journal mode (persistent, stored in the file).
+    Readers no longer block the writer and vice versa.
+    Returns the journal mode SQLite reports afterwards.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    finally:
+        conn.close()
+    return mode
+
+
+def apply_pragma_profile(conn, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS, cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+    """
+    Applies the per-connection PRAGMAs used for every A.R.I.S.E. connection.
+    - synchronous=NORMAL is safe in WAL mode (only the last commits can be lost on power cut)
+    - busy_timeout makes concurrent writers wait instead of raising
+    - temp_store=MEMORY keeps sorting/grouping temp tables off the (slow) pendrive
+    - negative cache_size is interpreted by SQLite as KiB
+    """
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_kb)}")
+
+
+def checkpoint_wal(conn, mode='PASSIVE'):
+    """
+    Copies committed WAL frames back into the main database file.
+    PASSIVE never waits for readers, so it is safe to run while serving requests.
+    Returns (busy, wal_frames, checkpointed_frames).
+    """
+    row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return tuple(row) if row else (0, 0, 0)
+
+
+# --- Hot-path index set ---
+# (index name, CREATE statement). Every statement is idempotent.
+HOT_PATH_INDEXES = [
+    # One attendance row per student per session - lets writers use INSERT OR IGNORE
+    ('idx_attendance_session_student',
+     "CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_session_student "
+     "ON attendance_records(session_id, student_id)"),
+    # Per-student history (dashboards, leaderboard, analytics)
+    ('idx_attendance_student',
+     "CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance_records(student_id)"),
+    # Sessions of a course in chronological order (reports, analytics, history)
+    ('idx_sessions_course_start',
+     "CREATE INDEX IF NOT EXISTS idx_sessions_course_start ON sessions(course_id, start_time)"),
+    # Active sessions only - tiny, used by the scanner and the expiry job
+    ('idx_sessions_active',
+     "CREATE INDEX IF NOT EXISTS idx_sessions_active ON sessions(is_active) WHERE is_active = 1"),
+    # Online attendance links
+    ('idx_sessions_token',
+     "CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token) "
+     "WHERE session_token IS NOT NULL"),
+    # Scanner lookup: class roll id -> student
+    ('idx_enrollments_course_roll',
+     "CREATE INDEX IF NOT EXISTS idx_enrollments_course_roll ON enrollments(course_id, class_roll_id)"),
+    # Case-insensitive roll number lookup (online attendance form)
+    ('idx_students_roll_upper',
+     "CREATE INDEX IF NOT EXISTS idx_students_roll_upper ON students(UPPER(university_roll_no))"),
+]
+
+
+def remove_duplicate_attendance(conn):
+    """
+    Deletes duplicate (session_id, student_id) attendance rows, keeping the earliest one.
+    Needed before the UNIQUE index can be created on databases that collected duplicates.
+    Returns the number of rows removed.
+    """
+    cursor = conn.execute("""
+        DELETE FROM attendance_records
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM attendance_records GROUP BY session_id, student_id
+        )
+    """)
+    return cursor.rowcount
+
+
+def ensure_indexes(conn, commit=True):
+    """
+    Creates any missing index from HOT_PATH_INDEXES. Returns the names that were created.
+    Pass commit=False to leave the transaction open (used by the migration runner).
+    """
+    existing = set(row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'").fetchall())
+    missing = [(name, sql) for name, sql in HOT_PATH_INDEXES if name not in existing]
+
+    if any(name == 'idx_attendance_session_student' for name, _ in missing):
+        removed = remove_duplicate_attendance(conn)
+        if removed:
+            logger.warning(f"[DB] Removed {removed} duplicate attendance record(s) before adding UNIQUE index")
+
+    for name, sql in missing:
+        conn.execute(sql)
+    if commit:
+        conn.commit()
+    return [name for name, _ in missing]
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled sqlite3 connection.
+
+    Behaves exactly like a normal connection (execute, cursor, commit, ...),
+    but close() hands the connection back to the pool instead of tearing it
+    down. Request-scoped handles only discard uncommitted work on close();
+    the teardown hook returns the connection to the pool.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        """Release the connection (same semantics as sqlite3.Connection.close)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._request_scoped:
+            # Closing a plain connection throws away uncommitted work - keep that behaviour
+            if self._conn.in_transaction:
+                self._conn.rollback()
+        else:
+            self._pool.release(self._conn)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of ready-to-use SQLite connections.
+
+    Connections are configured once (row_factory, PRAGMAs) when created and
+    reused afterwards. Up to `max_size` idle connections are kept; bursts
+    beyond that get a temporary connection that is closed on release.
+    """
+
+    def __init__(self, db_path, max_size=8, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._conn_generation = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'created': 0,
+            'discarded': 0,
+            'in_use': 0
+        }
+
+    def _connect(self):
+        """Open and configure a new connection."""
+        # check_same_thread=False is needed because pooled connections move between request threads.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               timeout=self.busy_timeout_ms / 1000.0)
+        # This makes the database return rows that can be accessed by column name.
+        conn.row_factory = sqlite3.Row
+        apply_pragma_profile(conn, self.busy_timeout_ms, self.cache_size_kb)
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening a new one if none is idle."""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats['hits'] += 1
+                self._stats['in_use'] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        conn = self._connect()
+        with self._lock:
+            self._conn_generation[id(conn)] = self._generation
+            self._stats['misses'] += 1
+            self._stats['created'] += 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool (or close it if the pool is full or stale)."""
+        with self._lock:
+            self._stats['in_use'] = max(0, self._stats['in_use'] - 1)
+            stale = self._conn_generation.get(id(conn)) != self._generation
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            stale = True
+
+        if not stale:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._conn_generation.pop(id(conn), None)
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def connection(self, request_scoped=False, conn=None):
+        """Wrap a connection in a PooledConnection handle."""
+        if conn is None:
+            conn = self.acquire()
+        return PooledConnection(self, conn, request_scoped=request_scoped)
+
+    def reset(self):
+        """
+        Drop every pooled connection.
+        Must be called after the database file is replaced on disk (e.g. sync import),
+        otherwise pooled connections keep pointing at the old file.
+        """
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        logger.info("[DB POOL] Pool reset - all idle connections closed")
+
+    def stats(self):
+        """Pool sizing counters (hits/misses/in-use) for monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_size'] = self.max_size
+        stats['idle'] = self._idle.qsize()
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total * 100, 1) if total else 0
+        return stats
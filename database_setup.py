@@ -2,6 +2,8 @@ import sqlite3
 import bcrypt
 import os
 from dotenv import load_dotenv
+from database import enable_wal
+from schema_migrations import run_migrations
 
 # =================================================================
 #   A.R.I.S.E. Database Setup Script - Production Build
@@ -41,6 +43,15 @@ def setup_database():
         cursor.execute("DROP TABLE IF EXISTS teachers")
         cursor.execute("DROP TABLE IF EXISTS semesters")
         cursor.execute("DROP TABLE IF EXISTS admins")
+        # Tables added by schema migrations (rollups, change log, export jobs, scanner registry)
+        cursor.execute("DROP TABLE IF EXISTS course_stats")
+        cursor.execute("DROP TABLE IF EXISTS student_course_stats")
+        cursor.execute("DROP TABLE IF EXISTS session_stats")
+        cursor.execute("DROP TABLE IF EXISTS data_version")
+        cursor.execute("DROP TABLE IF EXISTS attendance_changes")
+        cursor.execute("DROP TABLE IF EXISTS export_jobs")
+        cursor.execute("DROP TABLE IF EXISTS devices")
+        cursor.execute("DROP TABLE IF EXISTS schema_version")
         print("Old tables dropped successfully.")
 
         print("\n--- Creating new tables with final schema...")
@@ -160,6 +171,10 @@ def setup_database():
         
         print("\n--- All tables created successfully.")
 
+        # Schema migrations (teacher_code, created_on, hot-path indexes, ...)
+        applied_migrations = run_migrations(connection)
+        print(f"Schema migrations applied: {applied_migrations}")
+
         # --- Create a Default Admin User ---
         print("\n--- Adding default admin user...")
         admin_password = os.environ.get('ADMIN_DEFAULT_PASSWORD', 'admin')
@@ -178,6 +193,9 @@ def setup_database():
         connection.commit()
         print("\nDatabase changes committed.")
 
+        # Switch to WAL so the scanner can write while dashboards read
+        print(f"Journal mode: {enable_wal(db_path)}")
+
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
     finally:
@@ -0,0 +1,143 @@
+# =================================================================
+#   A.R.I.S.E. - Scanner Device Registry
+#   Last heartbeat of every ESP32 scanner, keyed by MAC address
+#
+#   Architecture:
+#     POST /api/device/heartbeat --> devices row (UPSERT by mac_address)
+#     GET  /api/teacher/device-status, live dashboard 'device' events
+#        --> one primary-key / index lookup --> status payload
+#
+#   The table lives in the shared database, so every server process
+#   (gunicorn workers, the cloud instance) sees the same heartbeats.
+#   Freshness is computed from last_seen (epoch seconds) at read time,
+#   so no process has to "expire" a device.
+# =================================================================
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Devices table (installed by schema migration 10) ---
+DEVICES_TABLE = """
+    CREATE TABLE IF NOT EXISTS devices (
+        mac_address TEXT PRIMARY KEY,
+        room TEXT,
+        session_id INTEGER,
+        wifi_strength INTEGER,
+        battery INTEGER,
+        queue_count INTEGER,
+        sync_count INTEGER,
+        first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_seen REAL NOT NULL
+    )
+"""
+DEVICES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen)",
+    "CREATE INDEX IF NOT EXISTS idx_devices_session ON devices(session_id, last_seen)",
+    "CREATE INDEX IF NOT EXISTS idx_devices_room ON devices(room, last_seen)",
+]
+
+_UPSERT_SQL = """
+    INSERT INTO devices (mac_address, session_id, wifi_strength, battery, queue_count, sync_count, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(mac_address) DO UPDATE SET
+        session_id = excluded.session_id,
+        wifi_strength = excluded.wifi_strength,
+        battery = excluded.battery,
+        queue_count = excluded.queue_count,
+        sync_count = excluded.sync_count,
+        last_seen = excluded.last_seen
+"""
+
+NO_DEVICE_STATUS = {
+    "status": "offline",
+    "message": "No heartbeat data available",
+    "mac_address": None,
+    "wifi_strength": None,
+    "battery": None,
+    "queue_count": None,
+    "sync_count": None
+}
+
+
+def install_devices(conn):
+    """Creates the devices table and its indexes. Does not commit."""
+    conn.execute(DEVICES_TABLE)
+    for statement in DEVICES_INDEXES:
+        conn.execute(statement)
+
+
+class DeviceRegistry:
+    """
+    Reads and writes the devices table. A device is online while its last
+    heartbeat is at most `offline_after_seconds` old.
+    """
+
+    def __init__(self, offline_after_seconds=15):
+        self.offline_after_seconds = offline_after_seconds
+
+    def record_heartbeat(self, conn, data, session_id=None):
+        """
+        Stores a heartbeat (commits). Never changes the device's room - heartbeats are
+        unauthenticated, rooms are assigned with set_room() by an admin.
+        """
+        conn.execute(_UPSERT_SQL, (
+            data['mac_address'], session_id, data.get('wifi_strength'),
+            data.get('battery'), data.get('queue_count'), data.get('sync_count'), time.time()))
+        conn.commit()
+
+    def set_room(self, conn, mac_address, room):
+        """Assigns a device to a classroom (commits). Returns False for an unknown device."""
+        cursor = conn.execute("UPDATE devices SET room = ? WHERE mac_address = ?", (room, mac_address))
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def get(self, conn, mac_address):
+        """Status payload of one device, or None if it never sent a heartbeat."""
+        row = conn.execute("SELECT * FROM devices WHERE mac_address = ?", (mac_address,)).fetchone()
+        return self.status_payload(row) if row else None
+
+    def for_session(self, conn, session_id=None, room=None):
+        """
+        Status payload of the device serving `session_id` - falling back to the most
+        recently seen device in `room` (or anywhere, for a session without a room) -
+        or NO_DEVICE_STATUS.
+        """
+        row = None
+        if session_id is not None:
+            row = conn.execute("SELECT * FROM devices WHERE session_id = ? ORDER BY last_seen DESC LIMIT 1",
+                               (session_id,)).fetchone()
+        if row is None and room is not None:
+            row = conn.execute("SELECT * FROM devices WHERE room = ? ORDER BY last_seen DESC LIMIT 1",
+                               (room,)).fetchone()
+        elif row is None:
+            row = conn.execute("SELECT * FROM devices ORDER BY last_seen DESC LIMIT 1").fetchone()
+        return self.status_payload(row) if row else dict(NO_DEVICE_STATUS)
+
+    def list_rooms(self, conn):
+        """Rooms that have at least one scanner assigned."""
+        return [row['room'] for row in conn.execute(
+            "SELECT DISTINCT room FROM devices WHERE room IS NOT NULL ORDER BY room")]
+
+    def list_devices(self, conn):
+        rows = conn.execute("SELECT * FROM devices ORDER BY room IS NULL, room, mac_address").fetchall()
+        return [self.status_payload(row) for row in rows]
+
+    def status_payload(self, row):
+        """The device status as shown on the Teacher Dashboard (offline after offline_after_seconds)."""
+        age = max(time.time() - row['last_seen'], 0)
+        payload = {
+            "status": "online",
+            "mac_address": row['mac_address'],
+            "room": row['room'],
+            "session_id": row['session_id'],
+            "wifi_strength": row['wifi_strength'],
+            "battery": row['battery'],
+            "queue_count": row['queue_count'],
+            "sync_count": row['sync_count'],
+            "last_seen": int(age)
+        }
+        if age > self.offline_after_seconds:
+            payload.update(status="offline", message=f"Last heartbeat {int(age)} seconds ago", wifi_strength=None)
+        return payload
@@ -0,0 +1,173 @@
+# =================================================================
+#   A.R.I.S.E. - Live Dashboard Event Hub
+#   In-process publish/subscribe that pushes live session changes to
+#   teacher dashboards over Server-Sent Events
+#
+#   Architecture:
+#     scan / override / end / extend / expire --> hub.publish(session_id)
+#     device heartbeat                        --> hub.broadcast('device')
+#        --> one queue per open GET /api/teacher/session/<id>/events
+#            stream, which re-reads only what changed (records after its
+#            attendance cursor) and sends it as a small SSE event
+#
+#   Events only reach streams in the same server process. Every stream
+#   also re-checks the session watermark every few seconds, so writes
+#   handled by another process (gunicorn workers, cloud sync) still show
+#   up - just not instantly.
+#
+#   Each open stream holds a server thread, so a process accepts at most
+#   max_streams of them; the rest are refused and the dashboard polls.
+# =================================================================
+
+import json
+import queue
+import threading
+import logging
+
+from attendance_matrix import EXPLICIT_ABSENT_METHOD
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256   # Pending events per stream before it falls back to a full resync
+KEEPALIVE_SECONDS = 15        # Comment line sent on idle streams so proxies keep them open
+RECONNECT_MS = 3000           # EventSource reconnect delay sent to browsers
+
+# Cheap per-poll check: has anything about this session changed?
+_SESSION_WATERMARK_SQL = """
+    SELECT s.is_active, s.end_time, COUNT(ar.id) AS record_count, COALESCE(MAX(ar.id), 0) AS last_record_id
+    FROM sessions s
+    LEFT JOIN attendance_records ar ON ar.session_id = s.id
+    WHERE s.id = ?
+"""
+
+# Attendance records of a session after a cursor (record id), oldest first
+_RECORDS_SINCE_SQL = """
+    SELECT ar.id, ar.timestamp AS marked_at, ar.override_method,
+           st.student_name, st.university_roll_no, e.class_roll_id
+    FROM attendance_records ar
+    JOIN sessions s ON s.id = ar.session_id
+    JOIN students st ON st.id = ar.student_id
+    LEFT JOIN enrollments e ON e.student_id = ar.student_id AND e.course_id = s.course_id
+    WHERE ar.session_id = ? AND ar.id > ?
+    ORDER BY ar.id
+"""
+
+
+def format_sse(event, data):
+    """One Server-Sent Events message (UTF-8 bytes) with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+
+def session_watermark(conn, session_id):
+    """(is_active, end_time, record_count, last_record_id) row for a session, or None."""
+    row = conn.execute(_SESSION_WATERMARK_SQL, (session_id,)).fetchone()
+    return row if row is not None and row['is_active'] is not None else None
+
+
+def records_since(conn, session_id, after_id=0):
+    """
+    Attendance records added after `after_id`, split the way the dashboard
+    shows them: {'present': [student dicts], 'absent': [university roll nos]}.
+    """
+    present, absent = [], []
+    for row in conn.execute(_RECORDS_SINCE_SQL, (session_id, after_id)):
+        if row['override_method'] == EXPLICIT_ABSENT_METHOD:
+            absent.append(row['university_roll_no'])
+        else:
+            present.append({
+                'id': row['id'],
+                'student_name': row['student_name'],
+                'university_roll_no': row['university_roll_no'],
+                'class_roll_id': row['class_roll_id'],
+                'marked_at': row['marked_at'],
+            })
+    return {'present': present, 'absent': absent}
+
+
+class Subscription:
+    """One stream's event queue. `overflowed` is set when events had to be dropped."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        """Next (event, data) or None after `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return None
+
+    def _offer(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+
+class EventHub:
+    """
+    Thread-safe publish/subscribe keyed by channel (a session id). Publishing
+    never blocks: a subscriber whose queue is full is flagged to resync instead.
+    At most `max_streams` subscriptions are open at once (0 = no limit).
+    """
+
+    def __init__(self, max_streams=0):
+        self.max_streams = max_streams
+        self._channels = {}
+        self._open = 0
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'dropped': 0, 'streams_opened': 0, 'streams_refused': 0}
+
+    def subscribe(self, channel):
+        """A new Subscription, or None if max_streams are already open."""
+        subscription = Subscription(channel)
+        with self._lock:
+            if self.max_streams and self._open >= self.max_streams:
+                self._stats['streams_refused'] += 1
+                return None
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._open += 1
+            self._stats['streams_opened'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Closes a subscription (safe to call more than once)."""
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._open -= 1
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event, data=None):
+        """Queues (event, data) for every stream on `channel`. Returns the number of streams reached."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        return self._deliver(subscribers, event, data)
+
+    def broadcast(self, event, data=None):
+        """Queues (event, data) for every open stream (device status is shared by all dashboards)."""
+        with self._lock:
+            subscribers = [sub for subs in self._channels.values() for sub in subs]
+        return self._deliver(subscribers, event, data)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_streams'] = self._open
+            stats['channels'] = len(self._channels)
+        stats['max_streams'] = self.max_streams
+        return stats
+
+    def _deliver(self, subscribers, event, data):
+        delivered = sum(1 for sub in subscribers if sub._offer((event, data)))
+        with self._lock:
+            self._stats['published'] += 1
+            self._stats['delivered'] += delivered
+            self._stats['dropped'] += len(subscribers) - delivered
+        return delivered
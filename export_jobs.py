@@ -0,0 +1,258 @@
+# =================================================================
+#   A.R.I.S.E. - Background Export Jobs
+#   Semester-wide attendance exports that run outside request threads
+#
+#   Architecture:
+#     POST /api/admin/jobs --> export_jobs row (queued) --> job thread:
+#        one report file per course, written in parallel by the server's
+#        worker process pool --> zipped to EXPORT_DIR --> row marked done
+#     GET /api/admin/jobs/<id> reads progress from the export_jobs row,
+#     so any server process can answer polls and serve the download.
+# =================================================================
+
+import os
+import re
+import shutil
+import sqlite3
+import zipfile
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from database import apply_pragma_profile
+from report_export import write_xlsx_report, iter_csv_report
+
+logger = logging.getLogger(__name__)
+
+JOB_SEMESTER_EXPORT = 'semester_export'
+EXPORT_FORMATS = ('xlsx', 'csv')
+STALE_JOB_MINUTES = 30   # Running jobs without progress for this long were lost (e.g. server restart)
+
+# --- Jobs table (installed by schema migration 8) ---
+EXPORT_JOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS export_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        semester_id INTEGER,
+        export_format TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        total_items INTEGER NOT NULL DEFAULT 0,
+        completed_items INTEGER NOT NULL DEFAULT 0,
+        file_path TEXT,
+        error TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        finished_at DATETIME
+    )
+"""
+
+
+def install_export_jobs(conn):
+    """Creates the export_jobs table. Does not commit."""
+    conn.execute(EXPORT_JOBS_TABLE)
+
+
+def _safe_filename(text):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', text).strip('_') or 'course'
+
+
+def export_course_file(db_path, course_id, path, export_format):
+    """
+    Writes one course's attendance report to `path`. Runs in an export worker
+    process, so it opens its own database connection. Returns the path.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        apply_pragma_profile(conn)
+        if export_format == 'csv':
+            with open(path, 'wb') as f:
+                for chunk in iter_csv_report(conn, course_id):
+                    f.write(chunk)
+        else:
+            with open(path, 'wb') as f:
+                write_xlsx_report(conn, course_id, f)
+    finally:
+        conn.close()
+    return path
+
+
+class ExportJobManager:
+    """
+    Queues export jobs (one at a time, on a background thread) and fans each
+    job out over `pool` - a ProcessPoolExecutor owned by the caller, or None
+    to write the files on the job thread - one task per course.
+    """
+
+    def __init__(self, db_path, connect, export_dir, pool=None):
+        self.db_path = db_path
+        self.connect = connect          # Returns a pooled connection (closed after use)
+        self.export_dir = os.path.abspath(export_dir)
+        self._pool = pool
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-job')
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'files_written': 0}
+
+    def shutdown(self):
+        self._runner.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pool_running'] = self._pool is not None
+        return stats
+
+    # --- Jobs API ---
+
+    def submit_semester_export(self, conn, semester_id, export_format='xlsx'):
+        """Records a queued job for every course of the semester and starts it. Returns the job id."""
+        course_count = conn.execute(
+            "SELECT COUNT(*) FROM courses WHERE semester_id = ?", (semester_id,)).fetchone()[0]
+        cursor = conn.execute("""
+            INSERT INTO export_jobs (job_type, semester_id, export_format, total_items)
+            VALUES (?, ?, ?, ?)
+        """, (JOB_SEMESTER_EXPORT, semester_id, export_format, course_count))
+        conn.commit()
+        job_id = cursor.lastrowid
+
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._runner.submit(self._run_semester_export, job_id, semester_id, export_format)
+        logger.info(f"[EXPORT] Job {job_id} queued - semester {semester_id}, {course_count} course(s), {export_format}")
+        return job_id
+
+    def get(self, conn, job_id):
+        """Job status as a dict (None if unknown), including progress_percent."""
+        row = conn.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        total = job['total_items']
+        job['progress_percent'] = round(job['completed_items'] / total * 100, 1) if total else (
+            100.0 if job['status'] == 'done' else 0.0)
+        return job
+
+    def list_recent(self, conn, limit=20):
+        rows = conn.execute("SELECT id FROM export_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self.get(conn, row['id']) for row in rows]
+
+    def cleanup(self, conn, retention_hours):
+        """
+        Deletes finished jobs (and their zip files) older than `retention_hours`, fails
+        running jobs that stopped making progress and queued jobs that never started
+        within `retention_hours` (their process went away - the job queue is in memory).
+        Returns the number of jobs removed.
+        """
+        conn.execute("""
+            UPDATE export_jobs
+            SET status = 'failed', error = 'Interrupted (no progress)', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND updated_at < datetime('now', ?)
+        """, (f'-{STALE_JOB_MINUTES} minutes',))
+        # A queued job may wait behind long exports, so it only counts as lost after retention_hours
+        conn.execute("""
+            UPDATE export_jobs
+            SET status = 'failed', error = 'Never started (server restarted?)', finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'queued' AND created_at < datetime('now', ?)
+        """, (f'-{int(retention_hours)} hours',))
+        expired = conn.execute("""
+            SELECT id, file_path FROM export_jobs
+            WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)
+        """, (f'-{int(retention_hours)} hours',)).fetchall()
+        for job in expired:
+            if job['file_path'] and os.path.exists(job['file_path']):
+                os.remove(job['file_path'])
+            conn.execute("DELETE FROM export_jobs WHERE id = ?", (job['id'],))
+        conn.commit()
+        return len(expired)
+
+    # --- Running ---
+
+    def _update(self, job_id, finished=False, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        if finished:
+            assignments += ", finished_at = CURRENT_TIMESTAMP"
+        conn = self.connect()
+        try:
+            conn.execute(f"UPDATE export_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (*fields.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run_semester_export(self, job_id, semester_id, export_format):
+        work_dir = os.path.join(self.export_dir, f"job_{job_id}")
+        try:
+            conn = self.connect()
+            try:
+                semester = conn.execute("SELECT semester_name FROM semesters WHERE id = ?", (semester_id,)).fetchone()
+                courses = conn.execute("""
+                    SELECT id, course_code, course_name FROM courses WHERE semester_id = ? ORDER BY course_code
+                """, (semester_id,)).fetchall()
+                # Claim the job - cleanup() may already have failed it after waiting too long in the queue
+                claimed = conn.execute("""
+                    UPDATE export_jobs SET status = 'running', total_items = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'queued'
+                """, (len(courses), job_id)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            if not claimed:
+                logger.warning(f"[EXPORT] Job {job_id} is no longer queued - skipped")
+                return
+
+            os.makedirs(work_dir, exist_ok=True)
+
+            files = self._write_course_files(job_id, courses, work_dir, export_format)
+
+            semester_name = semester['semester_name'] if semester else f"semester_{semester_id}"
+            zip_path = os.path.join(self.export_dir, f"{_safe_filename(semester_name)}_attendance_job{job_id}.zip")
+            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for path in files:
+                    archive.write(path, arcname=os.path.basename(path))
+
+            self._update(job_id, status='done', file_path=zip_path, finished=True)
+            with self._lock:
+                self._stats['completed'] += 1
+            logger.info(f"[EXPORT] Job {job_id} done - {len(files)} file(s) in {zip_path}")
+        except Exception as e:
+            logger.error(f"[EXPORT] Job {job_id} failed: {e}", exc_info=True)
+            with self._lock:
+                self._stats['failed'] += 1
+            try:
+                self._update(job_id, status='failed', error=str(e), finished=True)
+            except sqlite3.Error:
+                pass
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _write_course_files(self, job_id, courses, work_dir, export_format):
+        """One file per course - in the worker processes when available, else on this thread."""
+        tasks = [
+            (course['id'], os.path.join(work_dir, f"{_safe_filename(course['course_code'])}_"
+                                                  f"{_safe_filename(course['course_name'])}.{export_format}"))
+            for course in courses
+        ]
+        files = []
+        if self._pool is not None:
+            try:
+                futures = [self._pool.submit(export_course_file, self.db_path, course_id, path, export_format)
+                           for course_id, path in tasks]
+                for future in as_completed(futures):
+                    files.append(future.result())
+                    self._file_done(job_id, len(files))
+                return sorted(files)
+            except BrokenProcessPool as e:
+                logger.warning(f"[EXPORT] Worker pool broken ({e}), exporting on the job thread from now on")
+                self._pool = None
+                files = []
+        for course_id, path in tasks:
+            files.append(export_course_file(self.db_path, course_id, path, export_format))
+            self._file_done(job_id, len(files))
+        return sorted(files)
+
+    def _file_done(self, job_id, completed):
+        with self._lock:
+            self._stats['files_written'] += 1
+        self._update(job_id, completed_items=completed)
+
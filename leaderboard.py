@@ -0,0 +1,262 @@
+# =================================================================
+#   A.R.I.S.E. - Leaderboard Engine
+#   Builds ranked leaderboards from one bulk fetch per scope and caches
+#   them until attendance data changes
+#
+#   Architecture:
+#     request --> cache[(scope, id)] --(data_version unchanged)--> ranked board
+#                                    --(stale / missing)---------> rebuild:
+#        students + present counts (GROUP BY) + streaks on the course's
+#        attendance matrix (attendance_matrix.AttendanceMatrixStore)
+#
+#   data_version is bumped by database triggers (see rollups.py), so
+#   every server process notices writes made by any other process.
+# =================================================================
+
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from rollups import get_data_version
+
+logger = logging.getLogger(__name__)
+
+SCOPE_COURSE = 'course'
+SCOPE_SEMESTER = 'semester'
+SCOPE_GLOBAL = 'global'
+
+
+def resolve_scope(course_id=None, semester_id=None):
+    """Maps the leaderboard query parameters to a cache key: (scope, scope_id)."""
+    if course_id:
+        return SCOPE_COURSE, course_id
+    if semester_id:
+        return SCOPE_SEMESTER, semester_id
+    return SCOPE_GLOBAL, None
+
+
+def compute_streaks(matrix):
+    """
+    Vectorized streaks for a students x sessions boolean matrix (sessions newest first).
+
+    Matches the original per-session loop: leading absences are skipped and
+    the first run of attended sessions is reported as both the current and
+    the longest streak. Returns (current_streaks, longest_streaks) arrays.
+    """
+    n_students, n_sessions = matrix.shape
+    if n_sessions == 0:
+        zeros = np.zeros(n_students, dtype=np.int64)
+        return zeros, zeros.copy()
+
+    attended_any = matrix.any(axis=1)
+    run_start = matrix.argmax(axis=1)
+    columns = np.arange(n_sessions)
+    gap_after_start = ~matrix & (columns >= run_start[:, None])
+    run_end = np.where(gap_after_start.any(axis=1), gap_after_start.argmax(axis=1), n_sessions)
+    streaks = np.where(attended_any, run_end - run_start, 0)
+    return streaks, streaks.copy()
+
+
+def generate_badges(attendance_pct, current_streak, longest_streak, has_attended):
+    """Generate badges based on attendance and streak achievements."""
+    badges = []
+
+    # FIRST_STEP: First class attended (in any course)
+    if has_attended:
+        badges.append({
+            'type': 'FIRST_STEP',
+            'icon': '🎯',
+            'description': 'First class attended'
+        })
+
+    # CONSISTENT: 5+ current streak
+    if current_streak >= 5:
+        badges.append({
+            'type': 'CONSISTENT',
+            'icon': '🔥',
+            'description': f'{current_streak} day streak'
+        })
+
+    # PERFECT_WEEK: 7-day streak
+    if current_streak >= 7:
+        badges.append({
+            'type': 'PERFECT_WEEK',
+            'icon': '⭐',
+            'description': '7 day perfect streak'
+        })
+
+    # IRON_STREAK: 15+ day streak
+    if longest_streak >= 15:
+        badges.append({
+            'type': 'IRON_STREAK',
+            'icon': '💪',
+            'description': '15+ day iron streak'
+        })
+
+    # PERFECT_MONTH: High attendance (90%+)
+    if attendance_pct >= 90:
+        badges.append({
+            'type': 'PERFECT_MONTH',
+            'icon': '👑',
+            'description': '90%+ attendance'
+        })
+
+    return badges
+
+
+class Leaderboard:
+    """A ranked, read-only leaderboard for one scope."""
+
+    def __init__(self, entries):
+        self.entries = entries  # Sorted, each entry carries its 'rank'
+        self._positions = {entry['student_id']: idx for idx, entry in enumerate(entries)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def position(self, student_id):
+        """0-based position of a student on the board, or None if not ranked."""
+        return self._positions.get(student_id)
+
+
+class LeaderboardEngine:
+    """
+    Builds and caches leaderboards per (scope, scope_id).
+
+    A cached board is reused while data_version is unchanged; up to
+    `max_entries` boards are kept (least recently used are evicted).
+    """
+
+    def __init__(self, matrix_store, max_entries=64):
+        self.matrix_store = matrix_store
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'builds': 0}
+
+    def get(self, conn, scope, scope_id=None):
+        """Returns the Leaderboard for a scope, rebuilding it only if attendance data changed."""
+        key = (scope, scope_id)
+        version = get_data_version(conn)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return cached[1]
+            self._stats['misses'] += 1
+
+        board = self._build(conn, scope, scope_id)
+
+        with self._lock:
+            self._stats['builds'] += 1
+            self._cache[key] = (version, board)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return board
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Cache counters for monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_boards'] = len(self._cache)
+        stats['max_entries'] = self.max_entries
+        return stats
+
+    # --- Building ---
+
+    def _build(self, conn, scope, scope_id):
+        if scope == SCOPE_COURSE:
+            students = conn.execute("""
+                SELECT DISTINCT e.student_id, s.student_name
+                FROM enrollments e
+                JOIN students s ON e.student_id = s.id
+                WHERE e.course_id = ?
+            """, (scope_id,)).fetchall()
+            session_filter, params = "s.course_id = ?", [scope_id]
+            streak_course_id = scope_id
+        elif scope == SCOPE_SEMESTER:
+            students = conn.execute("""
+                SELECT DISTINCT e.student_id, s.student_name
+                FROM enrollments e
+                JOIN students s ON e.student_id = s.id
+                JOIN courses c ON e.course_id = c.id
+                WHERE c.semester_id = ?
+            """, (scope_id,)).fetchall()
+            target_course_ids = [row['id'] for row in conn.execute(
+                "SELECT id FROM courses WHERE semester_id = ?", (scope_id,)).fetchall()]
+            if not target_course_ids:
+                return Leaderboard([])  # Semester without courses - nobody to rank
+            session_filter, params = "s.course_id IN (SELECT id FROM courses WHERE semester_id = ?)", [scope_id]
+            # Streaks use the semester's first course
+            streak_course_id = target_course_ids[0]
+        else:
+            students = conn.execute("SELECT id as student_id, student_name FROM students").fetchall()
+            session_filter, params = "1 = 1", []
+            any_course = conn.execute("SELECT id FROM courses LIMIT 1").fetchone()
+            streak_course_id = any_course['id'] if any_course else None
+
+        total_sessions = conn.execute(
+            f"SELECT COUNT(*) as c FROM sessions s WHERE {session_filter}", params).fetchone()['c']
+
+        # Attendance records (incl. emergency absents, as before) per student in scope
+        present_by_student = dict(conn.execute(f"""
+            SELECT ar.student_id, COUNT(*) as count
+            FROM attendance_records ar
+            JOIN sessions s ON ar.session_id = s.id
+            WHERE {session_filter}
+            GROUP BY ar.student_id
+        """, params).fetchall())
+
+        attended_ever = set(row[0] for row in conn.execute(
+            "SELECT DISTINCT student_id FROM attendance_records").fetchall())
+
+        student_ids = [row['student_id'] for row in students]
+        current, longest = self._streaks(conn, student_ids, streak_course_id)
+
+        entries = []
+        for i, student in enumerate(students):
+            sid = student['student_id']
+            present_count = present_by_student.get(sid, 0) if total_sessions > 0 else 0
+            attendance_pct = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+            current_streak, longest_streak = int(current[i]), int(longest[i])
+            entries.append({
+                'student_id': sid,
+                'student_name': student['student_name'],
+                'attendance_percentage': round(attendance_pct, 1),
+                'present_count': present_count,
+                'total_sessions': total_sessions,
+                'current_streak': current_streak,
+                'longest_streak': longest_streak,
+                'badges': generate_badges(attendance_pct, current_streak, longest_streak, sid in attended_ever)
+            })
+
+        # Sort by: attendance % DESC, then streak DESC, then present count DESC
+        entries.sort(key=lambda x: (-x['attendance_percentage'], -x['current_streak'], -x['present_count']))
+        for idx, entry in enumerate(entries):
+            entry['rank'] = idx + 1
+
+        logger.debug(f"[LEADERBOARD] Built {scope} board ({scope_id}) - {len(entries)} students")
+        return Leaderboard(entries)
+
+    def _streaks(self, conn, student_ids, course_id):
+        """Streaks for the given students from the course's attendance matrix (newest session first)."""
+        n_students = len(student_ids)
+        if course_id is None or n_students == 0:
+            zeros = np.zeros(n_students, dtype=np.int64)
+            return zeros, zeros
+
+        course = self.matrix_store.get(conn, course_id)
+        records = course.records
+        # Students without any record in the course map to an extra all-False row
+        padded = np.vstack([records, np.zeros((1, records.shape[1]), dtype=bool)])
+        rows = [course.row_of.get(sid, len(records)) for sid in student_ids]
+        return compute_streaks(padded[rows][:, ::-1])
@@ -0,0 +1,55 @@
+# =================================================================
+#   A.R.I.S.E. - Worker Process Pool
+#   A small fork-based process pool for CPU-heavy work (chart rendering,
+#   report exports) that would otherwise hold the GIL in request threads
+#
+#   The server forks ONE pool at startup, while its process is still
+#   single-threaded - forking later could copy locks held by other
+#   threads - and hands it to every component that needs it. Workers
+#   exit on their own if the server process goes away.
+# =================================================================
+
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+STARTUP_TIMEOUT_SECONDS = 30
+PARENT_CHECK_SECONDS = 5
+
+
+def fork_available():
+    """fork keeps workers from re-importing server.py (not available on Windows)."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _exit_with_parent(parent_pid):
+    """Worker initializer: exit if the server process goes away without shutting the pool down."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(PARENT_CHECK_SECONDS)
+        os._exit(0)
+    threading.Thread(target=watch, name='pool-parent-watch', daemon=True).start()
+
+
+def start_fork_pool(workers, label):
+    """
+    Forks `workers` processes now and returns the ProcessPoolExecutor,
+    or None if the pool can't be used (workers=0, no fork, startup failure).
+    """
+    if workers <= 0 or not fork_available():
+        return None
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_exit_with_parent, initargs=(os.getpid(),))
+        pool.submit(os.getpid).result(timeout=STARTUP_TIMEOUT_SECONDS)  # Forks every worker now
+    except Exception as e:
+        logger.warning(f"[POOL] Could not start {label} workers: {e}")
+        return None
+    logger.info(f"[POOL] Started {label} pool - {workers} worker(s)")
+    return pool
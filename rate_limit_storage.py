@@ -0,0 +1,111 @@
+# =================================================================
+#   A.R.I.S.E. - Shared Rate-Limit Storage
+#   Fixed-window counters for Flask-Limiter in a small SQLite file, so
+#   every server process (gunicorn workers) counts against one limit
+#
+#   Architecture:
+#     Limiter(storage_uri="sqlite://ratelimit.db")
+#        --> limits' storage registry --> SQLiteRateLimitStorage
+#        hit:  one UPSERT ... RETURNING count  (starts a new window
+#              when the old one expired)
+#        test: one primary-key SELECT
+#
+#   The counters live in their own file, not attendance.db: they don't
+#   compete for the attendance write lock and never travel with cloud
+#   sync or backups. synchronous=OFF - losing a few counts in an OS
+#   crash is harmless. Only the fixed-window strategy is supported.
+# =================================================================
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = 2000
+PURGE_EVERY = 500   # Delete expired windows after this many hits (per process)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        key TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+"""
+
+# Adds to the current window, or starts a new one if it expired (?1 = now)
+_INCR_SQL = """
+    INSERT INTO rate_limits (key, count, expires_at) VALUES (?2, ?3, ?4)
+    ON CONFLICT(key) DO UPDATE SET
+        count = CASE WHEN expires_at <= ?1 THEN excluded.count ELSE count + excluded.count END,
+        expires_at = CASE WHEN expires_at <= ?1 THEN excluded.expires_at ELSE expires_at END
+    RETURNING count
+"""
+
+
+class SQLiteRateLimitStorage(Storage):
+    """
+    limits storage backend for URIs like sqlite://ratelimit.db or
+    sqlite:///var/lib/arise/ratelimit.db. One connection per thread (and per process).
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        self.path = uri.split('://', 1)[1] if uri and '://' in uri else 'ratelimit.db'
+        self._local = threading.local()
+        self._hits = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._connection()   # Creates the file and table at startup, not on the first request
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        count = self._connection().execute(_INCR_SQL, (now, key, amount, now + expiry)).fetchall()[0][0]
+        self._hits += 1
+        if self._hits % PURGE_EVERY == 0:
+            self._connection().execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def _connection(self):
+        """This thread's connection - reopened after a fork (a SQLite handle must not cross processes)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit: every statement is its own tiny transaction
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
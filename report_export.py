@@ -0,0 +1,143 @@
+# =================================================================
+#   A.R.I.S.E. - Attendance Report Export
+#   Writes a course's students x sessions attendance report as
+#   .xlsx or CSV without building the whole report in memory
+#
+#   Architecture:
+#     iter_report_rows(course) --one cursor, student-major order-->
+#        write_xlsx_report  (openpyxl write-only, spooled temp file)
+#        iter_csv_report    (CSV text chunks for a streamed response)
+#
+#   Only one student's row is held at a time, so memory no longer grows
+#   with students x sessions.
+# =================================================================
+
+import csv
+import io
+import datetime
+import tempfile
+import unicodedata
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from attendance_matrix import EXPLICIT_ABSENT_METHOD
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XLSX_SPOOL_MAX_BYTES = 4 * 1024 * 1024   # Larger workbooks spill to a temp file on disk
+CSV_CHUNK_ROWS = 200                     # Rows per chunk of a streamed CSV response
+
+FIXED_HEADERS = ["Class Roll ID", "Student Name", "University Roll No."]
+
+# Every enrolled student (class roll order) x every session of the course (oldest first).
+# Students of a course without sessions still get one row (session_id NULL).
+_REPORT_ROWS_SQL = f"""
+    SELECT e.student_id, e.class_roll_id, st.student_name, st.university_roll_no, s.id AS session_id,
+           (ar.id IS NOT NULL AND ar.override_method IS NOT '{EXPLICIT_ABSENT_METHOD}') AS present
+    FROM enrollments e
+    JOIN students st ON st.id = e.student_id
+    LEFT JOIN sessions s ON s.course_id = e.course_id
+    LEFT JOIN attendance_records ar ON ar.session_id = s.id AND ar.student_id = e.student_id
+    WHERE e.course_id = ?
+    ORDER BY e.class_roll_id, e.student_id, s.start_time, s.id
+"""
+
+
+@contextmanager
+def read_snapshot(conn):
+    """Runs the header and row queries against one snapshot, so a session added mid-export can't misalign columns."""
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.rollback()
+
+
+def report_header(conn, course_id):
+    """Header row: fixed student columns, then one column per session (oldest first)."""
+    sessions = conn.execute(
+        "SELECT start_time FROM sessions WHERE course_id = ? ORDER BY start_time, id", (course_id,))
+    return FIXED_HEADERS + [
+        datetime.datetime.fromisoformat(row['start_time']).strftime('%d-%b-%Y %H:%M') for row in sessions
+    ]
+
+
+def iter_report_rows(conn, course_id):
+    """Yields one row per enrolled student: class roll, name, university roll, then 'P'/'A' per session."""
+    current_student = None
+    row = None
+    for record in conn.execute(_REPORT_ROWS_SQL, (course_id,)):
+        if record['student_id'] != current_student:
+            if row is not None:
+                yield row
+            current_student = record['student_id']
+            row = [record['class_roll_id'], record['student_name'], record['university_roll_no']]
+        if record['session_id'] is not None:
+            row.append("P" if record['present'] else "A")
+    if row is not None:
+        yield row
+
+
+def write_xlsx_report(conn, course_id, fileobj, title="Attendance Report"):
+    """Writes the report as a one-sheet .xlsx to `fileobj` (openpyxl write-only mode). Returns the student count."""
+    # openpyxl is imported on first export, not at server start
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    students = 0
+    with read_snapshot(conn):
+        header = []
+        for value in report_header(conn, course_id):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center')
+            header.append(cell)
+        ws.append(header)
+        for row in iter_report_rows(conn, course_id):
+            ws.append(row)
+            students += 1
+    wb.save(fileobj)
+    return students
+
+
+def spooled_xlsx_report(conn, course_id):
+    """Returns (file, student_count) - the .xlsx in a spooled temp file, rewound for sending."""
+    spool = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_BYTES, suffix='.xlsx')
+    try:
+        students = write_xlsx_report(conn, course_id, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, students
+
+
+def iter_csv_report(conn, course_id):
+    """Yields the report as UTF-8 CSV in chunks of CSV_CHUNK_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM - lets Excel open non-ASCII student names correctly
+    with read_snapshot(conn):
+        writer.writerow(report_header(conn, course_id))
+        for i, row in enumerate(iter_report_rows(conn, course_id), start=1):
+            writer.writerow(row)
+            if i % CSV_CHUNK_ROWS == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def attachment_disposition(download_name):
+    """Content-Disposition options for a download name (RFC 2231 form for non-ASCII names, like send_file)."""
+    try:
+        download_name.encode('ascii')
+        return {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+^`|~')}"}
@@ -0,0 +1,428 @@
+# =================================================================
+#   A.R.I.S.E. - Attendance Rollups
+#   Trigger-maintained counters so percentage lookups don't have to
+#   COUNT(*) raw attendance rows on every request
+#
+#   Tables:
+#     course_stats          (course_id)             -> session_count, enrolled_count
+#     student_course_stats  (student_id, course_id) -> present_count, explicit_absent_count
+#     session_stats         (session_id)            -> present_count, explicit_absent_count,
+#                                                      change_count (bumped by every record/state change,
+#                                                      used for live status ETags)
+#     data_version          (single row)            -> bumped on every attendance-relevant write,
+#                                                      used to invalidate in-process caches
+#
+#   "explicit_absent" = records written by emergency mode with
+#   override_method = 'emergency_mode_absent'. Every other record is a
+#   present mark. Endpoints that historically counted all records add
+#   the two columns together.
+#
+#   Usage: python rollups.py           (rebuild all rollups)
+#          python rollups.py --check   (report drift only)
+# =================================================================
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPLICIT_ABSENT_METHOD = 'emergency_mode_absent'
+
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS course_stats (
+        course_id INTEGER PRIMARY KEY,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        enrolled_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_course_stats (
+        student_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        explicit_absent_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, course_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_student_course_stats_course ON student_course_stats(course_id)",
+    """
+    CREATE TABLE IF NOT EXISTS session_stats (
+        session_id INTEGER PRIMARY KEY,
+        present_count INTEGER NOT NULL DEFAULT 0,
+        explicit_absent_count INTEGER NOT NULL DEFAULT 0,
+        change_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+]
+
+# 1 for a present mark, 0 for an explicit absent (and the inverse)
+_IS_PRESENT = f"(CASE WHEN {{row}}.override_method IS '{EXPLICIT_ABSENT_METHOD}' THEN 0 ELSE 1 END)"
+_IS_ABSENT = f"(CASE WHEN {{row}}.override_method IS '{EXPLICIT_ABSENT_METHOD}' THEN 1 ELSE 0 END)"
+
+
+def _add_record(row):
+    """Trigger body fragment: count attendance record `row` (NEW/OLD) into the rollups."""
+    present, absent = _IS_PRESENT.format(row=row), _IS_ABSENT.format(row=row)
+    return f"""
+        INSERT INTO student_course_stats (student_id, course_id, present_count, explicit_absent_count)
+        SELECT {row}.student_id, s.course_id, {present}, {absent}
+        FROM sessions s JOIN courses c ON c.id = s.course_id
+        WHERE s.id = {row}.session_id
+        ON CONFLICT(student_id, course_id) DO UPDATE SET
+            present_count = present_count + excluded.present_count,
+            explicit_absent_count = explicit_absent_count + excluded.explicit_absent_count;
+        INSERT INTO session_stats (session_id, present_count, explicit_absent_count, change_count)
+        VALUES ({row}.session_id, {present}, {absent}, 1)
+        ON CONFLICT(session_id) DO UPDATE SET
+            present_count = present_count + excluded.present_count,
+            explicit_absent_count = explicit_absent_count + excluded.explicit_absent_count,
+            change_count = change_count + 1;
+    """
+
+
+def _remove_record(row):
+    """Trigger body fragment: take attendance record `row` (NEW/OLD) out of the rollups."""
+    present, absent = _IS_PRESENT.format(row=row), _IS_ABSENT.format(row=row)
+    return f"""
+        UPDATE student_course_stats
+        SET present_count = present_count - {present},
+            explicit_absent_count = explicit_absent_count - {absent}
+        WHERE student_id = {row}.student_id
+          AND course_id = (SELECT course_id FROM sessions WHERE id = {row}.session_id);
+        DELETE FROM student_course_stats
+        WHERE student_id = {row}.student_id AND present_count = 0 AND explicit_absent_count = 0;
+        UPDATE session_stats
+        SET present_count = present_count - {present},
+            explicit_absent_count = explicit_absent_count - {absent},
+            change_count = change_count + 1
+        WHERE session_id = {row}.session_id;
+    """
+
+
+# (trigger name, body). Triggers are dropped and re-created on install so
+# a migration can change their definition.
+ROLLUP_TRIGGERS = [
+    # --- attendance_records ---
+    ('trg_rollup_attendance_insert',
+     f"AFTER INSERT ON attendance_records BEGIN {_add_record('NEW')} END"),
+    ('trg_rollup_attendance_delete',
+     f"AFTER DELETE ON attendance_records BEGIN {_remove_record('OLD')} END"),
+    ('trg_rollup_attendance_update',
+     "AFTER UPDATE OF session_id, student_id, override_method ON attendance_records "
+     f"BEGIN {_remove_record('OLD')} {_add_record('NEW')} END"),
+
+    # --- sessions ---
+    ('trg_rollup_session_insert', """
+        AFTER INSERT ON sessions BEGIN
+            INSERT INTO course_stats (course_id, session_count)
+            SELECT NEW.course_id, 1 FROM courses WHERE id = NEW.course_id
+            ON CONFLICT(course_id) DO UPDATE SET session_count = session_count + 1;
+            INSERT OR IGNORE INTO session_stats (session_id) VALUES (NEW.id);
+        END"""),
+    # Delete the session's records while the session row still exists, so the
+    # attendance trigger can still find its course (same effect as ON DELETE CASCADE)
+    ('trg_rollup_session_before_delete', """
+        BEFORE DELETE ON sessions BEGIN
+            DELETE FROM attendance_records WHERE session_id = OLD.id;
+        END"""),
+    ('trg_rollup_session_state_update', """
+        AFTER UPDATE OF is_active, end_time ON sessions BEGIN
+            UPDATE session_stats SET change_count = change_count + 1 WHERE session_id = NEW.id;
+        END"""),
+    ('trg_rollup_session_delete', """
+        AFTER DELETE ON sessions BEGIN
+            UPDATE course_stats SET session_count = session_count - 1 WHERE course_id = OLD.course_id;
+            DELETE FROM session_stats WHERE session_id = OLD.id;
+        END"""),
+
+    # --- enrollments ---
+    ('trg_rollup_enrollment_insert', """
+        AFTER INSERT ON enrollments BEGIN
+            INSERT INTO course_stats (course_id, enrolled_count)
+            SELECT NEW.course_id, 1 FROM courses WHERE id = NEW.course_id
+            ON CONFLICT(course_id) DO UPDATE SET enrolled_count = enrolled_count + 1;
+        END"""),
+    ('trg_rollup_enrollment_delete', """
+        AFTER DELETE ON enrollments BEGIN
+            UPDATE course_stats SET enrolled_count = enrolled_count - 1 WHERE course_id = OLD.course_id;
+        END"""),
+
+    # --- courses / students ---
+    ('trg_rollup_course_insert', """
+        AFTER INSERT ON courses BEGIN
+            INSERT OR IGNORE INTO course_stats (course_id) VALUES (NEW.id);
+        END"""),
+    ('trg_rollup_course_delete', """
+        AFTER DELETE ON courses BEGIN
+            DELETE FROM course_stats WHERE course_id = OLD.id;
+            DELETE FROM student_course_stats WHERE course_id = OLD.id;
+        END"""),
+    ('trg_rollup_student_delete', """
+        AFTER DELETE ON students BEGIN
+            DELETE FROM student_course_stats WHERE student_id = OLD.id;
+        END"""),
+]
+
+# Writes that change attendance data as seen by students (leaderboards, reports).
+# Each one bumps data_version so every server process can tell its caches are stale.
+_VERSIONED_EVENTS = [
+    ('attendance', 'INSERT ON attendance_records'),
+    ('attendance_del', 'DELETE ON attendance_records'),
+    ('attendance_upd', 'UPDATE OF session_id, student_id, override_method ON attendance_records'),
+    ('session', 'INSERT ON sessions'),
+    ('session_del', 'DELETE ON sessions'),
+    ('session_upd', 'UPDATE OF course_id, start_time ON sessions'),
+    ('enrollment', 'INSERT ON enrollments'),
+    ('enrollment_del', 'DELETE ON enrollments'),
+    ('student', 'INSERT ON students'),
+    ('student_del', 'DELETE ON students'),
+    ('student_upd', 'UPDATE OF student_name ON students'),
+    ('course', 'INSERT ON courses'),
+    ('course_del', 'DELETE ON courses'),
+    ('course_upd', 'UPDATE OF semester_id ON courses'),
+]
+ROLLUP_TRIGGERS += [
+    (f'trg_data_version_{name}',
+     f"AFTER {event} BEGIN UPDATE data_version SET version = version + 1 WHERE id = 1; END")
+    for name, event in _VERSIONED_EVENTS
+]
+
+# Rollup contents computed from scratch - used by rebuild and drift check
+_EXPECTED_COURSE_STATS = """
+    SELECT c.id AS course_id,
+           (SELECT COUNT(*) FROM sessions s WHERE s.course_id = c.id) AS session_count,
+           (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = c.id) AS enrolled_count
+    FROM courses c
+"""
+_EXPECTED_STUDENT_COURSE_STATS = f"""
+    SELECT ar.student_id, s.course_id,
+           SUM({_IS_PRESENT.format(row='ar')}) AS present_count,
+           SUM({_IS_ABSENT.format(row='ar')}) AS explicit_absent_count
+    FROM attendance_records ar
+    JOIN sessions s ON ar.session_id = s.id
+    JOIN courses c ON c.id = s.course_id
+    GROUP BY ar.student_id, s.course_id
+"""
+_EXPECTED_SESSION_STATS = f"""
+    SELECT s.id AS session_id,
+           COALESCE(ar.present_count, 0) AS present_count,
+           COALESCE(ar.explicit_absent_count, 0) AS explicit_absent_count
+    FROM sessions s
+    LEFT JOIN (
+        SELECT ar.session_id,
+               SUM({_IS_PRESENT.format(row='ar')}) AS present_count,
+               SUM({_IS_ABSENT.format(row='ar')}) AS explicit_absent_count
+        FROM attendance_records ar
+        GROUP BY ar.session_id
+    ) ar ON ar.session_id = s.id
+"""
+
+_ROLLUPS = [
+    ('course_stats', _EXPECTED_COURSE_STATS,
+     'course_id, session_count, enrolled_count'),
+    ('student_course_stats', _EXPECTED_STUDENT_COURSE_STATS,
+     'student_id, course_id, present_count, explicit_absent_count'),
+    ('session_stats', _EXPECTED_SESSION_STATS,
+     'session_id, present_count, explicit_absent_count'),
+]
+
+
+def install_rollups(conn):
+    """Creates the rollup tables and (re-)creates their triggers. Does not commit."""
+    for sql in ROLLUP_TABLES:
+        conn.execute(sql)
+    for name, body in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def get_data_version(conn):
+    """Current attendance data version - changes whenever attendance-relevant data is written."""
+    row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def rebuild_rollups(conn, commit=True):
+    """Recomputes every rollup table from the raw tables (repairs any drift)."""
+    # Change counters are not derived data - carry them over (+1, so cached ETags go stale)
+    change_counts = conn.execute("SELECT change_count + 1, session_id FROM session_stats").fetchall()
+    for table, expected, columns in _ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} ({columns}) {expected}")
+    conn.executemany("UPDATE session_stats SET change_count = ? WHERE session_id = ?", change_counts)
+    conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+    if commit:
+        conn.commit()
+    logger.info("[ROLLUP] Rollup tables rebuilt")
+
+
+def check_rollups(conn):
+    """Returns {table: number of rows that differ from a fresh recomputation}."""
+    drift = {}
+    for table, expected, columns in _ROLLUPS:
+        stored = f"SELECT {columns} FROM {table}"
+        drift[table] = conn.execute(
+            f"SELECT COUNT(*) FROM ("
+            f"  SELECT * FROM ({stored} EXCEPT {expected}) "
+            f"  UNION ALL SELECT * FROM ({expected} EXCEPT {stored})"
+            f")").fetchone()[0]
+    return drift
+
+
+
+# --- Readers ---
+
+_OVERVIEW_KPIS = """
+    WITH
+    scoped_sessions AS (
+        SELECT s.course_id, s.session_type, s.start_time,
+               COALESCE(ss.present_count + ss.explicit_absent_count, 0) AS marks
+        FROM sessions s
+        LEFT JOIN session_stats ss ON ss.session_id = s.id
+        WHERE :semester_id IS NULL
+           OR s.course_id IN (SELECT id FROM courses WHERE semester_id = :semester_id)
+    ),
+    enrolled AS (
+        SELECT course_id, COUNT(*) AS n FROM enrollments GROUP BY course_id
+    ),
+    session_kpis AS (
+        SELECT COUNT(*) AS total_sessions,
+               TOTAL(ss.marks) AS total_attendance,
+               TOTAL(ss.session_type = 'online') AS online_sessions,
+               TOTAL(ss.start_time >= date('now', '-7 days')) AS sessions_this_week,
+               TOTAL(ss.start_time >= date('now', 'start of month')) AS sessions_this_month,
+               AVG(NULLIF(ss.marks, 0)) AS avg_attendance,
+               SUM(COALESCE(en.n, 0)) AS total_possible
+        FROM scoped_sessions ss
+        LEFT JOIN enrolled en ON en.course_id = ss.course_id
+    ),
+    at_risk AS (
+        SELECT COUNT(DISTINCT e.student_id) AS at_risk_count
+        FROM enrollments e
+        JOIN courses c ON c.id = e.course_id
+        JOIN course_stats cs ON cs.course_id = e.course_id
+        LEFT JOIN student_course_stats scs
+               ON scs.student_id = e.student_id AND scs.course_id = e.course_id
+        WHERE cs.session_count > 0
+          AND COALESCE(scs.present_count + scs.explicit_absent_count, 0) < 0.75 * cs.session_count
+          AND (:semester_id IS NULL OR c.semester_id = :semester_id)
+    )
+    SELECT
+        CASE WHEN :semester_id IS NULL THEN (SELECT COUNT(*) FROM students)
+             ELSE (SELECT COUNT(DISTINCT e.student_id) FROM enrollments e
+                   JOIN courses c ON e.course_id = c.id WHERE c.semester_id = :semester_id)
+        END AS total_students,
+        (SELECT COUNT(*) FROM courses
+         WHERE :semester_id IS NULL OR semester_id = :semester_id) AS total_courses,
+        session_kpis.*,
+        at_risk.at_risk_count
+    FROM session_kpis, at_risk
+"""
+
+_OVERVIEW_COURSES = """
+    SELECT c.id, c.course_name, c.course_code, t.teacher_name,
+           COALESCE(cs.enrolled_count, 0) AS enrolled_count,
+           COALESCE(cs.session_count, 0) AS session_count,
+           COALESCE(marks.total_marks, 0) AS total_marks
+    FROM courses c
+    LEFT JOIN teachers t ON c.teacher_id = t.id
+    LEFT JOIN course_stats cs ON cs.course_id = c.id
+    LEFT JOIN (
+        SELECT course_id, SUM(present_count + explicit_absent_count) AS total_marks
+        FROM student_course_stats GROUP BY course_id
+    ) marks ON marks.course_id = c.id
+    WHERE :semester_id IS NULL OR c.semester_id = :semester_id
+    ORDER BY c.course_name
+"""
+
+
+def analytics_overview(conn, semester_id=None):
+    """
+    Batch-wide KPIs and course summary for the admin analytics page.
+    One aggregation pass over sessions + the rollup tables (no per-row
+    correlated subqueries), so cost grows with sessions and enrollments,
+    not with attendance rows. Attendance marks are raw record counts.
+    """
+    params = {'semester_id': semester_id or None}
+    kpis = conn.execute(_OVERVIEW_KPIS, params).fetchone()
+
+    total_attendance = int(kpis['total_attendance'])
+    total_possible = kpis['total_possible'] or 1
+    overall_rate = round((total_attendance / total_possible) * 100, 1) if total_possible > 0 else 0
+
+    course_data = []
+    for row in conn.execute(_OVERVIEW_COURSES, params).fetchall():
+        r = dict(row)
+        possible = r['enrolled_count'] * r['session_count']
+        r['attendance_rate'] = round((r['total_marks'] / possible) * 100, 1) if possible > 0 else 0
+        course_data.append(r)
+
+    return {
+        "total_students": kpis['total_students'],
+        "total_courses": kpis['total_courses'],
+        "total_sessions": kpis['total_sessions'],
+        "total_attendance_marks": total_attendance,
+        "online_sessions": int(kpis['online_sessions']),
+        "offline_sessions": kpis['total_sessions'] - int(kpis['online_sessions']),
+        "sessions_this_week": int(kpis['sessions_this_week']),
+        "sessions_this_month": int(kpis['sessions_this_month']),
+        "avg_attendance_per_session": round(kpis['avg_attendance'] or 0, 1),
+        "overall_attendance_rate": overall_rate,
+        "at_risk_count": kpis['at_risk_count'],
+        "course_summary": course_data,
+        "semester_id": semester_id
+    }
+
+
+_STUDENT_COURSE_SUMMARY = """
+    SELECT c.id as course_id, c.course_name, s.semester_name,
+           COALESCE(cs.session_count, 0) as total_sessions,
+           COALESCE(scs.present_count + scs.explicit_absent_count, 0) as present_count
+    FROM courses c
+    JOIN enrollments e ON c.id = e.course_id
+    LEFT JOIN semesters s ON c.semester_id = s.id
+    LEFT JOIN course_stats cs ON cs.course_id = c.id
+    LEFT JOIN student_course_stats scs ON scs.student_id = e.student_id AND scs.course_id = c.id
+    WHERE e.student_id = :student_id AND (:semester_id IS NULL OR c.semester_id = :semester_id)
+"""
+
+
+def student_course_summary(conn, student_id, semester_id=None):
+    """
+    Per-course attendance totals for one student in a single query
+    (shared by the student dashboard and critical alerts).
+    present_count is the raw record count, as those endpoints always used.
+    """
+    return [dict(row) for row in conn.execute(
+        _STUDENT_COURSE_SUMMARY, {'student_id': student_id, 'semester_id': semester_id or None}).fetchall()]
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import sqlite3
+    from dotenv import load_dotenv
+    from schema_migrations import run_migrations
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+    db_path = os.environ.get('DATABASE_PATH', 'attendance.db')
+
+    conn = sqlite3.connect(db_path)
+    run_migrations(conn)  # Makes sure the rollup tables/triggers exist
+    drift = check_rollups(conn)
+    print(f"Rollup drift ({db_path}): " + ", ".join(f"{t}={n}" for t, n in drift.items()))
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        conn.close()
+        sys.exit(1 if any(drift.values()) else 0)
+
+    rebuild_rollups(conn)
+    print("[OK] Rollups rebuilt.")
+    conn.close()
@@ -0,0 +1,170 @@
+# =================================================================
+#   A.R.I.S.E. - Scanner Hot-Path Cache
+#   Keeps each classroom's active session, its class_roll_id -> student_id
+#   roster and the set of already-marked students in memory, so a scan
+#   is a dictionary lookup plus one INSERT
+#
+#   Architecture:
+#     session start ------------------------> reload(room)
+#     end / extend / expire / delete session,
+#     enrollment + student edits, sync import -> invalidate()
+#     POST /api/mark-attendance-by-roll-id ---> room_for_device(mac)
+#                                               --> active_session(room) (cached)
+#
+#   Rooms: a scanner bound to a room (devices.room) is served by the
+#   active session started for that room. Unbound scanners (room None)
+#   are served by the newest active session started without a room, as
+#   in a single-classroom setup. Online sessions are never served.
+#
+#   Other server processes can't invalidate this cache, so every entry
+#   also expires after max_age seconds, and the scanner INSERT checks
+#   the session is still active - a stale hit falls back to the
+#   uncached queries instead of marking the wrong session.
+# =================================================================
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# The session a scanner in `room` (None = unbound) records attendance for
+ACTIVE_SESSION_FOR_ROOM_SQL = """
+    SELECT id, course_id, room FROM sessions
+    WHERE is_active = 1 AND room IS ? AND session_type IS NOT 'online'
+    ORDER BY start_time DESC, id DESC
+    LIMIT 1
+"""
+
+
+class ActiveSession:
+    """
+    Cached view of an active session. `marked` holds every student with a record (present
+    or absent) as far as this process knows - it words replies, the database decides.
+    """
+
+    def __init__(self, session_id, course_id, room, roster, marked):
+        self.session_id = session_id
+        self.course_id = course_id
+        self.room = room
+        self.roster = roster          # class_roll_id -> student_id
+        self.marked = marked          # student ids already in attendance_records
+        self.loaded_at = time.monotonic()
+
+    def student_for_roll(self, class_roll_id):
+        """student_id for a class roll id (int or numeric string), or None if not enrolled / not a number."""
+        try:
+            return self.roster.get(int(class_roll_id))
+        except (TypeError, ValueError):
+            return None
+
+
+class ActiveSessionCache:
+    """
+    Process-level cache of the active session per room for the scanner endpoints,
+    plus the room each scanner MAC is bound to. Loads lazily (or on reload()),
+    never caches "no active session".
+    """
+
+    def __init__(self, connect, max_age_seconds=60):
+        self.connect = connect          # Returns a pooled connection (closed after use)
+        self.max_age_seconds = max_age_seconds
+        self._entries = {}              # room (None = unbound scanners) -> ActiveSession
+        self._device_rooms = {}         # mac_address -> (room, loaded_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0, 'stale_fallbacks': 0}
+
+    def active_session(self, room=None):
+        """The cached ActiveSession for `room`, loading it on a miss. None if no session is active there."""
+        with self._lock:
+            entry = self._entries.get(room)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.max_age_seconds:
+                self._stats['hits'] += 1
+                return entry
+            self._stats['misses'] += 1
+        return self.reload(room)
+
+    def reload(self, room=None):
+        """Reads the room's active session, its roster and marked students from the database."""
+        conn = self.connect()
+        try:
+            session = conn.execute(ACTIVE_SESSION_FOR_ROOM_SQL, (room,)).fetchone()
+            if session is None:
+                entry = None
+            else:
+                roster = {row['class_roll_id']: row['student_id'] for row in conn.execute(
+                    "SELECT class_roll_id, student_id FROM enrollments WHERE course_id = ?", (session['course_id'],))}
+                marked = {row['student_id'] for row in conn.execute(
+                    "SELECT student_id FROM attendance_records WHERE session_id = ?", (session['id'],))}
+                entry = ActiveSession(session['id'], session['course_id'], session['room'], roster, marked)
+        finally:
+            conn.close()
+
+        with self._lock:
+            if entry is None:
+                self._entries.pop(room, None)
+            else:
+                self._entries[room] = entry
+            self._stats['loads'] += 1
+        if entry is not None:
+            logger.info(f"[SCANNER] Cached session {entry.session_id} (room {room or '-'}) - "
+                        f"{len(entry.roster)} enrolled, {len(entry.marked)} already marked")
+        return entry
+
+    def room_for_device(self, mac_address):
+        """Room the scanner is bound to (devices.room), None if unbound, unknown or no MAC was sent."""
+        if not mac_address:
+            return None
+        with self._lock:
+            cached = self._device_rooms.get(mac_address)
+            if cached is not None and time.monotonic() - cached[1] < self.max_age_seconds:
+                return cached[0]
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT room FROM devices WHERE mac_address = ?", (mac_address,)).fetchone()
+        finally:
+            conn.close()
+        room = row['room'] if row else None
+        with self._lock:
+            self._device_rooms[mac_address] = (room, time.monotonic())
+        return room
+
+    def forget_device(self, mac_address):
+        """The scanner's room changed - look it up again on its next request."""
+        with self._lock:
+            self._device_rooms.pop(mac_address, None)
+
+    def invalidate(self, reason=''):
+        """Drops every cached session (session and roster changes are rare next to scans)."""
+        with self._lock:
+            if not self._entries:
+                return
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+        logger.debug(f"[SCANNER] Cache invalidated ({reason})")
+
+    def note_marked(self, session_id, student_ids):
+        """Records students marked by this process."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.session_id == session_id:
+                    entry.marked.update(student_ids)
+
+    def stale(self, reason=''):
+        """A cached entry turned out to be wrong (caller falls back to the uncached path)."""
+        with self._lock:
+            self._stats['stale_fallbacks'] += 1
+        self.invalidate(reason)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            entries = list(self._entries.values())
+            stats['cached_devices'] = len(self._device_rooms)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        stats['cached_sessions'] = {entry.room or '-': entry.session_id for entry in entries}
+        stats['cached_roster_size'] = sum(len(entry.roster) for entry in entries)
+        stats['max_age_seconds'] = self.max_age_seconds
+        return stats
@@ -0,0 +1,146 @@
+# =================================================================
+#   A.R.I.S.E. - Schema Migrations
+#   Brings older databases (e.g. from a pendrive) up to date ONCE at
+#   startup, so request handlers never have to run DDL.
+#
+#   Each migration runs in its own transaction and is recorded in the
+#   schema_version table. Add new migrations to the END of MIGRATIONS.
+# =================================================================
+
+import logging
+
+from database import ensure_indexes
+from rollups import install_rollups, rebuild_rollups
+from attendance_matrix import install_change_log
+from export_jobs import install_export_jobs
+from device_registry import install_devices
+
+logger = logging.getLogger(__name__)
+
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})").fetchall())
+
+
+def _add_column(conn, table, column, declaration):
+    """ALTER TABLE ... ADD COLUMN, skipped if an earlier ad-hoc migration already added it."""
+    if not _column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+# --- Migrations ---
+
+def _m001_teacher_code(conn):
+    _add_column(conn, 'teachers', 'teacher_code', 'TEXT')
+    # SQLite doesn't support UNIQUE in ALTER TABLE ADD COLUMN - use a partial unique index
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_teacher_code ON teachers(teacher_code) "
+                 "WHERE teacher_code IS NOT NULL")
+
+
+def _m002_online_session_columns(conn):
+    _add_column(conn, 'sessions', 'topic', 'TEXT')
+    _add_column(conn, 'sessions', 'session_token', 'TEXT')
+    _add_column(conn, 'sessions', 'otp_seed', 'TEXT')
+
+
+def _m003_session_created_on(conn):
+    # Tracks whether a session was created on the 'local' or 'cloud' server (used by the sync engine)
+    _add_column(conn, 'sessions', 'created_on', "TEXT DEFAULT 'local'")
+
+
+def _m004_hot_path_indexes(conn):
+    ensure_indexes(conn, commit=False)
+
+
+def _m005_attendance_rollups(conn):
+    install_rollups(conn)
+    rebuild_rollups(conn, commit=False)
+
+
+def _m006_data_version(conn):
+    # Adds the data_version table and its triggers (install is idempotent)
+    install_rollups(conn)
+
+
+def _m007_attendance_change_log(conn):
+    install_change_log(conn)
+
+
+def _m008_export_jobs(conn):
+    install_export_jobs(conn)
+
+
+def _m009_session_change_count(conn):
+    _add_column(conn, 'session_stats', 'change_count', 'INTEGER NOT NULL DEFAULT 0')
+    install_rollups(conn)
+
+
+def _m010_device_registry(conn):
+    install_devices(conn)
+
+
+def _m011_session_rooms(conn):
+    # Concurrent sessions: each one serves the scanners bound to its room
+    _add_column(conn, 'sessions', 'room', 'TEXT')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_active_room ON sessions(room) WHERE is_active = 1")
+    install_devices(conn)
+
+
+# (version, description, function) - versions must be increasing
+MIGRATIONS = [
+    (1, 'teachers.teacher_code + unique index', _m001_teacher_code),
+    (2, 'sessions.topic / session_token / otp_seed', _m002_online_session_columns),
+    (3, 'sessions.created_on', _m003_session_created_on),
+    (4, 'hot-path indexes + UNIQUE attendance (session_id, student_id)', _m004_hot_path_indexes),
+    (5, 'trigger-maintained attendance rollups', _m005_attendance_rollups),
+    (6, 'data_version counter for cache invalidation', _m006_data_version),
+    (7, 'attendance_changes log for in-memory attendance matrices', _m007_attendance_change_log),
+    (8, 'export_jobs table for background exports', _m008_export_jobs),
+    (9, 'session_stats.change_count for live status ETags', _m009_session_change_count),
+    (10, 'devices table (scanner registry keyed by MAC)', _m010_device_registry),
+    (11, 'sessions.room for concurrent per-classroom sessions', _m011_session_rooms),
+]
+
+
+def get_schema_version(conn):
+    """Returns the highest applied migration version (0 for a database never migrated)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn):
+    """
+    Applies every pending migration in order.
+    Safe to call from several server processes at once: each migration takes
+    the write lock (BEGIN IMMEDIATE) and re-checks the version before running.
+    Returns the list of versions applied by this call.
+    """
+    applied = []
+    get_schema_version(conn)
+    conn.commit()
+
+    for version, description, migrate in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                         (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"[MIGRATION] Failed at version {version} ({description})", exc_info=True)
+            raise
+        applied.append(version)
+        logger.info(f"[MIGRATION] Applied version {version}: {description}")
+
+    return applied
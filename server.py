@@ -2,9 +2,12 @@
 #   A.R.I.S.E. Server — Production Build
 # =================================================================
 
+# Time the top-level imports of this module (stopped before any thread or worker process starts)
+from startup_profile import ImportTimer
+_import_timer = ImportTimer()
+_import_timer.start()
 
-
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, g, has_request_context
 import sqlite3
 import datetime
 import jwt
@@ -24,11 +27,9 @@ def get_ist_now():
     return datetime.datetime.now(IST_TZ).replace(tzinfo=None)
 # ------------------------------
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 import io
 import csv
-from flask import send_file
+from flask import send_file, Response
 
 import logging
 from logging.handlers import RotatingFileHandler
@@ -37,7 +38,22 @@ import atexit
 import analytics
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import rate_limit_storage  # Registers the sqlite:// limiter storage (counters shared by all workers)
 from flask_cors import CORS
+from database import ConnectionPool, enable_wal, checkpoint_wal
+from schema_migrations import run_migrations
+from rollups import analytics_overview, student_course_summary
+from leaderboard import LeaderboardEngine, resolve_scope
+from attendance_matrix import AttendanceMatrixStore, prune_change_log
+from process_pool import start_fork_pool
+from chart_renderer import TrendGraphRenderer
+from report_export import XLSX_MIMETYPE, spooled_xlsx_report, iter_csv_report, attachment_disposition, read_snapshot
+from export_jobs import ExportJobManager, EXPORT_FORMATS
+from scanner_cache import ActiveSessionCache, ACTIVE_SESSION_FOR_ROOM_SQL
+from attendance_writer import AttendanceWriter
+from device_registry import DeviceRegistry
+from session_expiry import SessionExpiryScheduler
+from event_hub import EventHub, format_sse, session_watermark, records_since, KEEPALIVE_SECONDS, RECONNECT_MS
 
 
 import io
@@ -152,7 +168,7 @@ limiter = Limiter(
     key_func=get_remote_address,
     app=app,
     default_limits=[Config.RATE_LIMIT_API],
-    storage_uri="memory://"
+    storage_uri=Config.RATE_LIMIT_STORAGE_URI
 )
 
 # --- Security Headers Middleware ---
@@ -225,16 +241,86 @@ def log_response_info(response):
 
 # --- Database & Token Helper Functions ---
 
+# Switch the database to WAL once at startup so scanner writes don't block dashboard reads
+try:
+    logger.info(f"[DB] Journal mode: {enable_wal(Config.DATABASE_PATH)}")
+except sqlite3.Error as e:
+    logger.error(f"[DB] Could not enable WAL journal mode: {e}")
+
+# Pre-configured connections are reused instead of opening a new one per call
+db_pool = ConnectionPool(
+    Config.DATABASE_PATH,
+    max_size=Config.DB_POOL_SIZE,
+    busy_timeout_ms=Config.SQLITE_BUSY_TIMEOUT_MS,
+    cache_size_kb=Config.SQLITE_CACHE_SIZE_KB
+)
+
+# Bring older (pendrive) databases up to the current schema - once, before serving requests
+try:
+    _boot_conn = db_pool.connection()
+    _applied_migrations = run_migrations(_boot_conn)
+    _boot_conn.close()
+    if _applied_migrations:
+        logger.info(f"[DB] Applied schema migrations: {_applied_migrations}")
+except sqlite3.Error as e:
+    logger.error(f"[DB] Schema migration failed: {e}")
+
+# In-memory students x sessions attendance matrix per course (reports, analytics, streaks)
+attendance_store = AttendanceMatrixStore()
+
+# Ranked leaderboards, cached per (scope, id) until attendance data changes
+leaderboard_engine = LeaderboardEngine(attendance_store)
+
+# Imports are done - restore builtins.__import__ before threads start and worker processes are forked
+_import_timer.stop()
+logger.info(f"[STARTUP] Imports took {_import_timer.elapsed_ms():.0f}ms - slowest: {_import_timer.summary()}")
+
+# One worker process pool for CPU-heavy work - forked here, before any thread of this process starts
+worker_pool = start_fork_pool(Config.WORKER_PROCESSES, 'render/export')
+if worker_pool is not None:
+    atexit.register(worker_pool.shutdown, wait=False, cancel_futures=True)
+
+# Teacher analytics trend graphs, rendered in worker processes and cached per (course, plotted data)
+trend_renderer = TrendGraphRenderer(max_entries=Config.TREND_GRAPH_CACHE_SIZE, pool=worker_pool)
+
+# Semester-wide export jobs: one job thread, per-course files written by the worker processes
+export_jobs = ExportJobManager(Config.DATABASE_PATH, db_pool.connection, Config.EXPORT_DIR, pool=worker_pool)
+atexit.register(export_jobs.shutdown)
+
+# Scanner hot path: active session, class roll -> student map and marked students kept in memory
+scanner_cache = ActiveSessionCache(db_pool.connection, max_age_seconds=Config.SCANNER_CACHE_MAX_AGE_SECONDS)
+
+# Attendance inserts (scans, OTP marks, manual overrides) go through one writer thread that group-commits them
+attendance_writer = AttendanceWriter(db_pool.connection, batch_window_ms=Config.ATTENDANCE_BATCH_WINDOW_MS)
+attendance_writer.start()
+atexit.register(attendance_writer.shutdown)
+
+# Scanner heartbeats, one registry row per device MAC (shared by all server processes)
+device_registry = DeviceRegistry(offline_after_seconds=Config.DEVICE_OFFLINE_SECONDS)
+
+# Live dashboard pushes: attendance and session changes are published per session id (SSE streams subscribe)
+event_hub = EventHub(max_streams=Config.LIVE_EVENTS_MAX_STREAMS)
+
 def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    # check_same_thread=False is needed because Flask can handle requests in different threads.
-    db_path = Config.DATABASE_PATH
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    # This makes the database return rows that can be accessed by column name.
-    conn.row_factory = sqlite3.Row
-    # Enable foreign key support
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+    """
+    Returns a pooled connection to the SQLite database.
+    Inside a request every call shares one connection (stored on flask.g),
+    which the teardown hook hands back to the pool when the request ends.
+    """
+    if has_request_context():
+        if 'db' not in g:
+            g.db = db_pool.acquire()
+        return db_pool.connection(request_scoped=True, conn=g.db)
+    # Background jobs (scheduler) - close() returns the connection to the pool
+    return db_pool.connection()
+
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Return the request's connection to the pool."""
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
 
 
 
@@ -396,6 +482,9 @@ def sync_receive():
         
         # Extract online records BEFORE replacing the database
         online_records = sync.extract_online_records()
+        
+        # Close idle pooled connections so nothing holds the old file (and its WAL) open
+        db_pool.reset()
         if online_records['sessions']:
             logger.info(f"[SYNC] Preserving {len(online_records['sessions'])} online sessions for merge")
         
@@ -403,6 +492,11 @@ def sync_receive():
         success = sync.import_database_binary(db_binary, online_records=online_records)
         
         if success:
+            # The database file was replaced - pooled connections still point at the old one
+            db_pool.reset()
+            scanner_cache.invalidate('database imported')
+            session_expiry.rebuild()
+            
             # Handle log synchronization
             log_info = ""
             if 'log_data' in data and data['log_data']:
@@ -521,6 +615,97 @@ def manage_config(user_data):
         logger.info(f"System config updated - batch_name: '{new_name}'")
         return jsonify({"message": "System configuration updated."})
 
+# --- Runtime Diagnostics API ---
+@app.route('/api/admin/diagnostics', methods=['GET'])
+@token_required
+def admin_diagnostics(user_data):
+    """Runtime counters used for capacity planning (connection pool, caches)."""
+    return jsonify({
+        "db_pool": db_pool.stats(),
+        "leaderboard_cache": leaderboard_engine.stats(),
+        "attendance_matrices": attendance_store.stats(),
+        "worker_processes": Config.WORKER_PROCESSES if worker_pool is not None else 0,
+        "trend_graphs": trend_renderer.stats(),
+        "export_jobs": export_jobs.stats(),
+        "live_events": event_hub.stats(),
+        "scanner_cache": scanner_cache.stats(),
+        "attendance_writer": attendance_writer.stats(),
+        "session_expiry": session_expiry.stats()
+    })
+
+# --- Background Export Jobs API ---
+def _job_response(job):
+    """Job row as returned by the API (adds the download link once the file is ready)."""
+    job = dict(job)
+    job.pop('file_path', None)
+    job['download_url'] = f"/api/admin/jobs/{job['id']}/download" if job['status'] == 'done' else None
+    return job
+
+@app.route('/api/admin/jobs', methods=['GET', 'POST'])
+@token_required
+def manage_export_jobs(user_data):
+    """
+    GET: recent export jobs.
+    POST: queue an export - {"type": "semester_export", "semester_id": 3, "format": "xlsx" | "csv"}.
+    Returns 202 with the job id; poll /api/admin/jobs/<id> for progress.
+    """
+    conn = get_db_connection()
+    if request.method == 'GET':
+        jobs = [_job_response(job) for job in export_jobs.list_recent(conn)]
+        conn.close()
+        return jsonify(jobs)
+    
+    data = request.get_json() or {}
+    valid, error = validate_required_fields(data, ['semester_id'])
+    if not valid:
+        conn.close()
+        return jsonify({"error": error}), 400
+    if data.get('type', 'semester_export') != 'semester_export':
+        conn.close()
+        return jsonify({"error": "Unsupported job type"}), 400
+    export_format = str(data.get('format', 'xlsx')).lower()
+    if export_format not in EXPORT_FORMATS:
+        conn.close()
+        return jsonify({"error": "format must be 'xlsx' or 'csv'"}), 400
+    
+    semester = conn.execute("SELECT id FROM semesters WHERE id = ?", (data['semester_id'],)).fetchone()
+    if not semester:
+        conn.close()
+        return jsonify({"error": "Semester not found"}), 404
+    
+    job_id = export_jobs.submit_semester_export(conn, semester['id'], export_format)
+    conn.close()
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/admin/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/admin/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_export_job(user_data, job_id):
+    """Progress of an export job (status, completed_items / total_items, progress_percent)."""
+    conn = get_db_connection()
+    job = export_jobs.get(conn, job_id)
+    conn.close()
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_response(job))
+
+@app.route('/api/admin/jobs/<int:job_id>/download', methods=['GET'])
+@token_required
+def download_export_job(user_data, job_id):
+    """Downloads the zip of a finished export job."""
+    conn = get_db_connection()
+    job = export_jobs.get(conn, job_id)
+    conn.close()
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] != 'done' or not job['file_path'] or not os.path.exists(job['file_path']):
+        return jsonify({"error": "Export is not ready", "status": job['status']}), 409
+    return send_file(job['file_path'], as_attachment=True,
+                     download_name=os.path.basename(job['file_path']), mimetype='application/zip')
+
 # --- Semester Management API (Full CRUD) ---
 @app.route('/api/admin/semesters', methods=['GET', 'POST'])
 @token_required
@@ -571,37 +756,10 @@ def manage_single_semester(user_data, id):
     return jsonify({"message": "Operation successful."})
 
 # --- Teacher Management API (Full CRUD) ---
-def _migrate_teachers_table(conn):
-    """Add teacher_code column if it doesn't exist (migration for existing DBs)."""
-    try:
-        conn.execute("ALTER TABLE teachers ADD COLUMN teacher_code TEXT")
-        conn.commit()
-        logger.info("Migrated teachers table: added teacher_code column")
-    except Exception:
-        pass  # Column already exists
-    # Create unique index separately (SQLite doesn't support UNIQUE in ALTER TABLE ADD COLUMN)
-    try:
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_teacher_code ON teachers(teacher_code) WHERE teacher_code IS NOT NULL")
-        conn.commit()
-    except Exception:
-        pass  # Index already exists
-
-def _migrate_sessions_table(conn):
-    """Add created_on column to sessions table (migration for existing DBs).
-    Tracks whether a session was created on 'local' or 'cloud' server.
-    Used by sync engine to preserve ALL cloud-created sessions during sync."""
-    try:
-        conn.execute("ALTER TABLE sessions ADD COLUMN created_on TEXT DEFAULT 'local'")
-        conn.commit()
-        logger.info("Migrated sessions table: added created_on column")
-    except Exception:
-        pass  # Column already exists
-
 @app.route('/api/admin/teachers', methods=['GET', 'POST'])
 @token_required
 def manage_teachers(user_data):
     conn = get_db_connection()
-    _migrate_teachers_table(conn)
     
     if request.method == 'GET':
         teachers_cursor = conn.execute("SELECT * FROM teachers ORDER BY id DESC").fetchall()
@@ -644,7 +802,6 @@ def manage_teachers(user_data):
 @token_required
 def manage_single_teacher(user_data, id):
     conn = get_db_connection()
-    _migrate_teachers_table(conn)
     
     if request.method == 'PUT':
         data = request.get_json()
@@ -745,6 +902,7 @@ def manage_single_student(user_data, id):
     elif request.method == 'DELETE':
         conn.execute("DELETE FROM students WHERE id = ?", (id,))
         conn.commit()
+        scanner_cache.invalidate('student deleted')
         logger.info(f"Student deleted - ID: {id}")
     conn.close()
     return jsonify({"message": "Operation successful."})
@@ -927,6 +1085,7 @@ def manage_single_course(user_data, id):
     elif request.method == 'DELETE':
         conn.execute("DELETE FROM courses WHERE id = ?", (id,))
         conn.commit()
+        scanner_cache.invalidate('course deleted')
         logger.info(f"Course deleted - ID: {id}")
     conn.close()
     return jsonify({"message": "Operation successful."})
@@ -961,6 +1120,7 @@ def manage_enrollments(user_data, course_id):
                 conn.execute("INSERT INTO enrollments (student_id, course_id, class_roll_id) VALUES (?, ?, ?)",
                              (student['student_id'], course_id, student['class_roll_id']))
             conn.commit()
+            scanner_cache.invalidate('enrollments edited')
             logger.info(f"Enrollments updated - CourseID: {course_id}, Students enrolled: {len(enrollment_data)}")
         except Exception as e:
             conn.rollback()
@@ -1008,132 +1168,12 @@ def admin_analytics_overview(user_data):
     conn = get_db_connection()
     semester_id = request.args.get('semester_id', type=int)
     
-    # Build conditional filters based on semester
-    sem_course_filter = ""
-    sem_session_filter = ""
-    sem_enroll_filter = ""
-    sem_params = []
-    
-    if semester_id:
-        sem_course_filter = " WHERE c.semester_id = ?"
-        sem_session_filter = " AND s.course_id IN (SELECT id FROM courses WHERE semester_id = ?)"
-        sem_enroll_filter = " AND e.course_id IN (SELECT id FROM courses WHERE semester_id = ?)"
-        sem_params = [semester_id]
-    
-    # Total students: if semester filter, count distinct students enrolled in that semester's courses
-    if semester_id:
-        total_students = conn.execute(
-            "SELECT COUNT(DISTINCT e.student_id) as c FROM enrollments e "
-            "JOIN courses c ON e.course_id = c.id WHERE c.semester_id = ?", [semester_id]
-        ).fetchone()['c']
-    else:
-        total_students = conn.execute("SELECT COUNT(*) as c FROM students").fetchone()['c']
-    
-    total_courses = conn.execute(
-        f"SELECT COUNT(*) as c FROM courses c{sem_course_filter}", sem_params
-    ).fetchone()['c']
-    
-    total_sessions = conn.execute(
-        f"SELECT COUNT(*) as c FROM sessions s WHERE 1=1{sem_session_filter}", sem_params
-    ).fetchone()['c']
-    
-    total_attendance = conn.execute(
-        f"SELECT COUNT(*) as c FROM attendance_records ar "
-        f"JOIN sessions s ON ar.session_id = s.id WHERE 1=1{sem_session_filter}", sem_params
-    ).fetchone()['c']
-    
-    # Online vs offline sessions
-    online_sessions = conn.execute(
-        f"SELECT COUNT(*) as c FROM sessions s WHERE session_type = 'online'{sem_session_filter}",
-        sem_params
-    ).fetchone()['c']
-    offline_sessions = total_sessions - online_sessions
-    
-    # Sessions this week
-    sessions_this_week = conn.execute(
-        f"SELECT COUNT(*) as c FROM sessions s "
-        f"WHERE start_time >= date('now', '-7 days'){sem_session_filter}", sem_params
-    ).fetchone()['c']
-    
-    # Sessions this month
-    sessions_this_month = conn.execute(
-        f"SELECT COUNT(*) as c FROM sessions s "
-        f"WHERE start_time >= date('now', 'start of month'){sem_session_filter}", sem_params
-    ).fetchone()['c']
-    
-    # Average attendance per session
-    avg_attendance = conn.execute(
-        f"SELECT AVG(cnt) as avg_count FROM ("
-        f"  SELECT ar.session_id, COUNT(*) as cnt FROM attendance_records ar "
-        f"  JOIN sessions s ON ar.session_id = s.id WHERE 1=1{sem_session_filter} "
-        f"  GROUP BY ar.session_id"
-        f")", sem_params
-    ).fetchone()['avg_count'] or 0
-    
-    # Overall attendance rate
-    total_possible = conn.execute(
-        f"SELECT SUM(enrolled) as total FROM ("
-        f"  SELECT s.id, "
-        f"    (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = s.course_id) as enrolled "
-        f"  FROM sessions s WHERE 1=1{sem_session_filter}"
-        f")", sem_params
-    ).fetchone()['total'] or 1
-    overall_rate = round((total_attendance / total_possible) * 100, 1) if total_possible > 0 else 0
-    
-    # At-risk student count (below 75% in any course)
-    at_risk_query = conn.execute(
-        f"SELECT COUNT(DISTINCT e.student_id) as c "
-        f"FROM enrollments e "
-        f"JOIN courses c ON e.course_id = c.id "
-        f"WHERE (SELECT COUNT(*) FROM attendance_records ar "
-        f"  JOIN sessions s ON ar.session_id = s.id "
-        f"  WHERE ar.student_id = e.student_id AND s.course_id = e.course_id"
-        f") < 0.75 * ("
-        f"  SELECT COUNT(*) FROM sessions s WHERE s.course_id = e.course_id"
-        f") AND (SELECT COUNT(*) FROM sessions s WHERE s.course_id = e.course_id) > 0"
-        f"{sem_enroll_filter}", sem_params
-    ).fetchone()['c']
-    
-    # Course-wise summary
-    course_summary = conn.execute(
-        f"SELECT c.id, c.course_name, c.course_code, "
-        f"  t.teacher_name, "
-        f"  (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = c.id) as enrolled_count, "
-        f"  (SELECT COUNT(*) FROM sessions s WHERE s.course_id = c.id) as session_count, "
-        f"  (SELECT COUNT(*) FROM attendance_records ar "
-        f"    JOIN sessions s ON ar.session_id = s.id "
-        f"    WHERE s.course_id = c.id) as total_marks "
-        f"FROM courses c "
-        f"LEFT JOIN teachers t ON c.teacher_id = t.id "
-        f"{'WHERE c.semester_id = ?' if semester_id else ''} "
-        f"ORDER BY c.course_name",
-        sem_params
-    ).fetchall()
-    
-    course_data = []
-    for row in course_summary:
-        r = dict(row)
-        possible = r['enrolled_count'] * r['session_count']
-        r['attendance_rate'] = round((r['total_marks'] / possible) * 100, 1) if possible > 0 else 0
-        course_data.append(r)
+    # Single aggregation pass over the rollup tables (see rollups.analytics_overview)
+    overview = analytics_overview(conn, semester_id)
     
     conn.close()
     
-    return jsonify({
-        "total_students": total_students,
-        "total_courses": total_courses,
-        "total_sessions": total_sessions,
-        "total_attendance_marks": total_attendance,
-        "online_sessions": online_sessions,
-        "offline_sessions": offline_sessions,
-        "sessions_this_week": sessions_this_week,
-        "sessions_this_month": sessions_this_month,
-        "avg_attendance_per_session": round(avg_attendance, 1),
-        "overall_attendance_rate": overall_rate,
-        "at_risk_count": at_risk_query,
-        "course_summary": course_data,
-        "semester_id": semester_id
-    })
+    return jsonify(overview)
 
 
 @app.route('/api/admin/analytics/course/<int:course_id>', methods=['GET'])
@@ -1154,21 +1194,22 @@ def admin_analytics_course(user_data, course_id):
         conn.close()
         return jsonify({"error": "Course not found"}), 404
     
-    total_sessions = conn.execute(
-        "SELECT COUNT(*) as c FROM sessions WHERE course_id = ?", (course_id,)).fetchone()['c']
+    stats = conn.execute(
+        "SELECT session_count, enrolled_count FROM course_stats WHERE course_id = ?", (course_id,)).fetchone()
+    total_sessions = stats['session_count'] if stats else 0
+    enrolled_count = stats['enrolled_count'] if stats else 0
     
     # Per-student attendance
     students = conn.execute("""
         SELECT s.id as student_id, s.student_name, s.university_roll_no, 
                e.class_roll_id,
-               (SELECT COUNT(*) FROM attendance_records ar 
-                JOIN sessions ses ON ar.session_id = ses.id 
-                WHERE ar.student_id = s.id AND ses.course_id = ?) as present_count
+               COALESCE(scs.present_count + scs.explicit_absent_count, 0) as present_count
         FROM enrollments e
         JOIN students s ON e.student_id = s.id
+        LEFT JOIN student_course_stats scs ON scs.student_id = s.id AND scs.course_id = e.course_id
         WHERE e.course_id = ?
         ORDER BY e.class_roll_id
-    """, (course_id, course_id)).fetchall()
+    """, (course_id,)).fetchall()
     
     student_data = []
     at_risk = 0
@@ -1189,12 +1230,13 @@ def admin_analytics_course(user_data, course_id):
     # Session-wise attendance trend
     trend = conn.execute("""
         SELECT s.id, s.start_time, s.topic, s.session_type,
-               (SELECT COUNT(*) FROM attendance_records ar WHERE ar.session_id = s.id) as present_count,
-               (SELECT COUNT(*) FROM enrollments e WHERE e.course_id = s.course_id) as total_students
+               COALESCE(ss.present_count + ss.explicit_absent_count, 0) as present_count,
+               ? as total_students
         FROM sessions s
+        LEFT JOIN session_stats ss ON ss.session_id = s.id
         WHERE s.course_id = ?
         ORDER BY s.start_time
-    """, (course_id,)).fetchall()
+    """, (enrolled_count, course_id)).fetchall()
     
     conn.close()
     
@@ -1230,15 +1272,15 @@ def admin_analytics_student(user_data, student_id):
     # Per-course attendance
     courses = conn.execute("""
         SELECT c.id as course_id, c.course_name, c.course_code, e.class_roll_id,
-               (SELECT COUNT(*) FROM sessions s WHERE s.course_id = c.id) as total_sessions,
-               (SELECT COUNT(*) FROM attendance_records ar 
-                JOIN sessions s ON ar.session_id = s.id 
-                WHERE ar.student_id = ? AND s.course_id = c.id) as present_count
+               COALESCE(cs.session_count, 0) as total_sessions,
+               COALESCE(scs.present_count + scs.explicit_absent_count, 0) as present_count
         FROM enrollments e
         JOIN courses c ON e.course_id = c.id
+        LEFT JOIN course_stats cs ON cs.course_id = c.id
+        LEFT JOIN student_course_stats scs ON scs.student_id = e.student_id AND scs.course_id = c.id
         WHERE e.student_id = ?
         ORDER BY c.course_name
-    """, (student_id, student_id)).fetchall()
+    """, (student_id,)).fetchall()
     
     course_data = []
     total_present = 0
@@ -1457,9 +1499,14 @@ def teacher_start_session():
     
     conn = get_db_connection()
     
-    # Deactivate any other active sessions for safety
-    conn.execute("UPDATE sessions SET is_active = 0, end_time = ? WHERE is_active = 1",
-                 (get_ist_now().strftime('%Y-%m-%d %H:%M:%S'),))
+    # Classroom whose scanners this session serves (None = scanners not bound to a room)
+    room = str(data.get('room') or '').strip() or None
+    
+    # One active session per room and per course - sessions in other classrooms keep running
+    conn.execute("""
+        UPDATE sessions SET is_active = 0, end_time = ?
+        WHERE is_active = 1 AND (course_id = ? OR (room IS ? AND session_type IS NOT 'online'))
+    """, (get_ist_now().strftime('%Y-%m-%d %H:%M:%S'), data['course_id'], room))
     
     # CRITICAL FIX: Use current local time, not ISO string from frontend
     start_time = get_ist_now()  # Use server's current time
@@ -1473,27 +1520,30 @@ def teacher_start_session():
     
     logger.info(f"Creating session - Duration: {duration_minutes}min, Grace: {grace_period_minutes}min, "
                 f"Start: {start_time.strftime('%Y-%m-%d %H:%M:%S')}, "
-                f"Scheduled end: {end_time.strftime('%Y-%m-%d %H:%M:%S')}, Topic: {topic}")
+                f"Scheduled end: {end_time.strftime('%Y-%m-%d %H:%M:%S')}, Topic: {topic}, Room: {room}")
     
     # Create new session
     cursor = conn.cursor()
-    _migrate_sessions_table(conn)  # Ensure created_on column exists
     created_on = 'cloud' if Config.IS_CLOUD_SERVER else 'local'
     cursor.execute(
         """INSERT INTO sessions 
-           (course_id, start_time, end_time, is_active, session_type, topic, created_on) 
-           VALUES (?, ?, ?, 1, ?, ?, ?)""",
+           (course_id, start_time, end_time, is_active, session_type, topic, created_on, room) 
+           VALUES (?, ?, ?, 1, ?, ?, ?, ?)""",
         (data['course_id'], 
          start_time.strftime('%Y-%m-%d %H:%M:%S'),
          end_time.strftime('%Y-%m-%d %H:%M:%S'),
          data['session_type'],
          topic,
-         created_on)
+         created_on,
+         room)
     )
     session_id = cursor.lastrowid
     conn.commit()
+    scanner_cache.invalidate('session started')
+    scanner_cache.reload(room)
+    session_expiry.schedule(session_id, end_time)
     
-    logger.info(f"Session started - ID: {session_id}, Course: {data['course_id']}, "
+    logger.info(f"Session started - ID: {session_id}, Course: {data['course_id']}, Room: {room}, "
                 f"Duration: {duration_minutes}min (+{grace_period_minutes}min grace)")
     
     # Get enrolled students
@@ -1516,6 +1566,7 @@ def teacher_start_session():
         "message": "Session Started",
         "students": students,
         "session_id": session_id,
+        "room": room,
         "end_time": end_time.strftime('%Y-%m-%d %H:%M:%S'),  # Send as string
         "duration_minutes": duration_minutes,
         "seconds_remaining": seconds_remaining  # Timezone-safe countdown
@@ -1580,20 +1631,9 @@ def start_online_session():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Migrate: add session_token, otp_seed, and created_on columns if they don't exist
-    try:
-        cursor.execute("ALTER TABLE sessions ADD COLUMN session_token TEXT")
-    except Exception:
-        pass
-    try:
-        cursor.execute("ALTER TABLE sessions ADD COLUMN otp_seed TEXT")
-    except Exception:
-        pass
-    _migrate_sessions_table(conn)  # Ensure created_on column exists
-    
-    # Deactivate any other active sessions
-    conn.execute("UPDATE sessions SET is_active = 0, end_time = ? WHERE is_active = 1",
-                 (get_ist_now().strftime('%Y-%m-%d %H:%M:%S'),))
+    # Deactivate other active sessions of this course (online sessions occupy no classroom)
+    conn.execute("UPDATE sessions SET is_active = 0, end_time = ? WHERE is_active = 1 AND course_id = ?",
+                 (get_ist_now().strftime('%Y-%m-%d %H:%M:%S'), data['course_id']))
     
     cursor.execute(
         """INSERT INTO sessions 
@@ -1606,6 +1646,8 @@ def start_online_session():
     )
     session_id = cursor.lastrowid
     conn.commit()
+    scanner_cache.invalidate('online session started')
+    session_expiry.schedule(session_id, end_time)
     
     # Get course info
     course = conn.execute("SELECT course_name, course_code FROM courses WHERE id = ?", 
@@ -1772,24 +1814,17 @@ def online_mark_attendance():
         logger.warning(f"[ONLINE] Not enrolled - Roll: {roll_no}, Course: {session['course_id']}")
         return jsonify({"status": "error", "message": "You are not enrolled in this course."}), 403
     
-    # Check duplicate
-    existing = conn.execute(
-        "SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?",
-        (session['id'], student['id'])).fetchone()
+    conn.close()
     
-    if existing:
-        conn.close()
+    # Mark attendance (the UNIQUE (session_id, student_id) index rejects duplicates)
+    inserted = attendance_writer.insert(session['id'], student['id'], 'online_otp')
+    
+    if not inserted:
         return jsonify({"status": "duplicate", "message": "Attendance already marked!", 
                         "student_name": student['student_name']})
     
-    # Mark attendance
-    conn.execute(
-        "INSERT INTO attendance_records (session_id, student_id, override_method) VALUES (?, ?, ?)",
-        (session['id'], student['id'], 'online_otp'))
-    conn.commit()
-    
     logger.info(f"[ONLINE] Attendance marked - {student['student_name']} (Roll: {roll_no})")
-    conn.close()
+    event_hub.publish(session['id'], 'attendance')
     
     return jsonify({
         "status": "success", 
@@ -1820,55 +1855,74 @@ def get_current_otp(token):
 
 @app.route('/api/teacher/session/<int:session_id>/online-status', methods=['GET'])
 def online_session_status(session_id):
-    """Get live attendance status for teacher's online session dashboard."""
+    """
+    Get live attendance status for teacher's online session dashboard.
+    
+    ?since=<last_record_id> returns only records added after that attendance id
+    and leaves out the roster (all_students). Responses carry an ETag (session
+    change counter, OTP window, enrollment count); unchanged polls get an empty 304.
+    """
+    since = request.args.get('since', 0, type=int)
     conn = get_db_connection()
     
-    session = conn.execute(
-        "SELECT id, course_id, is_active, session_token, otp_seed, end_time FROM sessions WHERE id = ?",
-        (session_id,)).fetchone()
+    session = session_change_state(conn, session_id)
     
     if not session:
         conn.close()
         return jsonify({"error": "Session not found"}), 404
     
+    total = session['enrolled_count']
+    otp_window = int(get_ist_now().timestamp()) // 30 if session['is_active'] else 0
+    
+    etag = f"online-{session_id}-{session['change_count']}-{otp_window}-{total}"
+    cached = not_modified(etag)
+    if cached is not None:
+        conn.close()
+        return cached
+    
     # Get marked students
     marked = conn.execute("""
-        SELECT s.student_name, s.university_roll_no, e.class_roll_id,
+        SELECT ar.id, s.student_name, s.university_roll_no, e.class_roll_id,
                ar.timestamp as marked_at
         FROM attendance_records ar
         JOIN students s ON ar.student_id = s.id
         LEFT JOIN enrollments e ON e.student_id = s.id AND e.course_id = ?
-        WHERE ar.session_id = ?
+        WHERE ar.session_id = ? AND ar.id > ?
         ORDER BY ar.timestamp DESC
-    """, (session['course_id'], session_id)).fetchall()
-    
-    total = conn.execute(
-        "SELECT COUNT(*) as c FROM enrollments WHERE course_id = ?",
-        (session['course_id'],)).fetchone()['c']
-    
-    # Get all enrolled students for unmarked list
-    all_students = conn.execute("""
-        SELECT e.class_roll_id, s.student_name, s.university_roll_no
-        FROM enrollments e
-        JOIN students s ON e.student_id = s.id
-        WHERE e.course_id = ?
-        ORDER BY e.class_roll_id
-    """, (session['course_id'],)).fetchall()
+    """, (session['course_id'], session_id, since)).fetchall()
+    
+    # Get all enrolled students for unmarked list (full responses only)
+    all_students = None
+    if not since:
+        all_students = conn.execute("""
+            SELECT e.class_roll_id, s.student_name, s.university_roll_no
+            FROM enrollments e
+            JOIN students s ON e.student_id = s.id
+            WHERE e.course_id = ?
+            ORDER BY e.class_roll_id
+        """, (session['course_id'],)).fetchall()
     
     conn.close()
     
     current_otp = generate_otp(session['otp_seed']) if session['is_active'] else None
     
-    return jsonify({
+    response = {
         "is_active": bool(session['is_active']),
-        "marked_count": len(marked),
+        "marked_count": session['present_count'] + session['explicit_absent_count'],
         "total_students": total,
         "current_otp": current_otp,
         "otp_time_remaining": get_otp_time_remaining() if session['is_active'] else 0,
-        "marked_students": [dict(s) for s in marked],
-        "all_students": [dict(s) for s in all_students],
-        "session_token": session['session_token']
-    })
+        "marked_students": [
+            {key: s[key] for key in ('student_name', 'university_roll_no', 'class_roll_id', 'marked_at')}
+            for s in marked
+        ],
+        "session_token": session['session_token'],
+        "since": since,
+        "last_record_id": max((s['id'] for s in marked), default=since)
+    }
+    if all_students is not None:
+        response["all_students"] = [dict(s) for s in all_students]
+    return with_etag(jsonify(response), etag)
 
 @app.route('/api/teacher/manual-override', methods=['POST'])
 def manual_override():
@@ -1926,31 +1980,20 @@ def manual_override():
             conn.close()
             return jsonify({"status": "error", "message": "Student not found"}), 404
         
-        # Check if already marked
-        existing = conn.execute(
-            "SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?",
-            (session['id'], student['id'])
-        ).fetchone()
+        conn.close()
         
-        if existing:
+        # Insert attendance record (ignored if the student is already marked)
+        inserted = attendance_writer.insert(session['id'], student['id'], 'teacher_manual', reason)
+        
+        if not inserted:
             logger.warning(f"Manual override rejected - Student {univ_roll_no} already marked")
-            conn.close()
             return jsonify({"status": "error", "message": "Student already marked present"}), 400
         
-        # Insert attendance record
-        conn.execute(
-            """INSERT INTO attendance_records 
-               (session_id, student_id, override_method, manual_reason) 
-               VALUES (?, ?, 'teacher_manual', ?)""",
-            (session['id'], student['id'], reason)
-        )
-        conn.commit()
-
-        conn.close()
-        
         # Log success
         logger.info(f"Manual override SUCCESS - Student: {student['student_name']} ({univ_roll_no}), "
                     f"Session: {session['id']}, Course: {session['course_id']}, Reason: '{reason}'")
+        event_hub.publish(session['id'], 'attendance')
+        scanner_cache.note_marked(session['id'], [student['id']])
         
         return jsonify({"status": "success", "message": "Attendance marked manually"})
     
@@ -2020,37 +2063,35 @@ def emergency_bulk_mark():
                 skipped_count += 1
                 continue
             
-            # Check if already marked
-            existing = conn.execute(
-                "SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?",
-                (session['id'], student['id'])
-            ).fetchone()
-            
-            if existing:
-                skipped_count += 1
-                continue
-            
+            # Already-marked students are skipped by INSERT OR IGNORE
             if status == 'present':
                 # Insert attendance record for present
-                conn.execute(
-                    """INSERT INTO attendance_records 
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO attendance_records 
                        (session_id, student_id, override_method, manual_reason) 
                        VALUES (?, ?, 'emergency_mode', ?)""",
                     (session['id'], student['id'], reason)
                 )
-                present_count += 1
             else:
                 # Insert attendance record for absent (with special override method)
-                conn.execute(
-                    """INSERT INTO attendance_records 
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO attendance_records 
                        (session_id, student_id, override_method, manual_reason) 
                        VALUES (?, ?, 'emergency_mode_absent', ?)""",
                     (session['id'], student['id'], reason + ' - Marked Absent')
                 )
+            
+            if cursor.rowcount == 0:
+                skipped_count += 1
+            elif status == 'present':
+                present_count += 1
+            else:
                 absent_count += 1
         
         conn.commit()
         conn.close()
+        event_hub.publish(session['id'], 'attendance')
+        scanner_cache.invalidate('emergency bulk mark')
         
         logger.info(f"Emergency bulk mark SUCCESS - "
                     f"Present: {present_count}, Absent: {absent_count}, Skipped: {skipped_count}")
@@ -2137,6 +2178,9 @@ def end_session(session_id):
         logger.info(f"Session ended - ID: {session_id}, Absent count: {absent_count}")
         
         conn.close()
+        session_expiry.cancel(session_id)
+        event_hub.publish(session_id, 'session')
+        scanner_cache.invalidate('session ended')
         return jsonify({
             "status": "success", 
             "message": f"Session ended. {absent_count} students marked absent."
@@ -2199,6 +2243,9 @@ def extend_session(session_id):
                 f"New end: {new_end_time_str}")
     
     conn.close()
+    session_expiry.schedule(session_id, new_end_time)
+    event_hub.publish(session_id, 'session')
+    scanner_cache.invalidate('session extended')
     
     # Calculate seconds remaining from new end time (timezone-safe)
     seconds_remaining = max(0, int((new_end_time - get_ist_now()).total_seconds()))
@@ -2251,6 +2298,9 @@ def check_and_expire_session(session_id):
         conn.execute("UPDATE sessions SET is_active = 0 WHERE id = ?", (session_id,))
         conn.commit()
         conn.close()
+        session_expiry.cancel(session_id)
+        event_hub.publish(session_id, 'session')
+        scanner_cache.invalidate('session expired')
         
         logger.warning(f"Session force-expired by countdown check - ID: {session_id}, "
                       f"End time was: {end_time_str}, Current time: {now_str}")
@@ -2266,52 +2316,234 @@ def check_and_expire_session(session_id):
             "seconds_remaining": int(seconds_remaining)
         }), 200
 
+def session_change_state(conn, session_id):
+    """
+    Session row plus its rollup counters (change_count, present/absent counts,
+    course enrolled_count), or None if the session doesn't exist. change_count moves on every attendance
+    write and every end/extend/expire, so it is the basis of the live status ETags.
+    """
+    return conn.execute("""
+        SELECT s.id, s.course_id, s.is_active, s.session_token, s.otp_seed, s.end_time,
+               COALESCE(ss.change_count, 0) AS change_count,
+               COALESCE(ss.present_count, 0) AS present_count,
+               COALESCE(ss.explicit_absent_count, 0) AS explicit_absent_count,
+               COALESCE(cs.enrolled_count, 0) AS enrolled_count
+        FROM sessions s
+        LEFT JOIN session_stats ss ON ss.session_id = s.id
+        LEFT JOIN course_stats cs ON cs.course_id = s.course_id
+        WHERE s.id = ?
+    """, (session_id,)).fetchone()
+
+
+def not_modified(etag):
+    """An empty 304 if the request's If-None-Match already holds `etag` (weak), else None."""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    """Tags a live status response; no-cache makes browsers revalidate (and get 304s) on every poll."""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/api/teacher/session/<int:session_id>/status', methods=['GET'])
 def get_live_session_status(session_id):
     """
     Provides a real-time status update for the live dashboard.
     Returns the list of students who have been marked present.
     ALSO returns whether session is still active (critical for auto-expire detection).
+    
+    ?since=<last_record_id> returns only records added after that attendance id
+    (check present_count/absent_count - a removed record needs a full reload).
+    Responses carry an ETag; an unchanged poll with If-None-Match gets an empty 304.
     """
+    since = request.args.get('since', 0, type=int)
     conn = get_db_connection()
     
     # Check if session is still active
-    session = conn.execute(
-        "SELECT is_active FROM sessions WHERE id = ?",
-        (session_id,)
-    ).fetchone()
+    session = session_change_state(conn, session_id)
     
     if not session:
         conn.close()
         return jsonify({"session_active": False, "marked_students": [], "absent_students": []}), 404
     
+    etag = f"status-{session_id}-{session['change_count']}"
+    cached = not_modified(etag)
+    if cached is not None:
+        conn.close()
+        return cached
+    
     is_active = bool(session['is_active'])
     
     # Get marked students (present - NOT marked as absent)
     present_cursor = conn.execute("""
-        SELECT s.university_roll_no
+        SELECT ar.id, s.university_roll_no
         FROM attendance_records ar
         JOIN students s ON ar.student_id = s.id
-        WHERE ar.session_id = ? AND (ar.override_method IS NULL OR ar.override_method != 'emergency_mode_absent')
-    """, (session_id,)).fetchall()
+        WHERE ar.session_id = ? AND ar.id > ?
+          AND (ar.override_method IS NULL OR ar.override_method != 'emergency_mode_absent')
+    """, (session_id, since)).fetchall()
     
     # Get absent students (marked as absent via emergency mode)
     absent_cursor = conn.execute("""
-        SELECT s.university_roll_no
+        SELECT ar.id, s.university_roll_no
         FROM attendance_records ar
         JOIN students s ON ar.student_id = s.id
-        WHERE ar.session_id = ? AND ar.override_method = 'emergency_mode_absent'
-    """, (session_id,)).fetchall()
+        WHERE ar.session_id = ? AND ar.id > ? AND ar.override_method = 'emergency_mode_absent'
+    """, (session_id, since)).fetchall()
     
     marked_students = [row['university_roll_no'] for row in present_cursor]
     absent_students = [row['university_roll_no'] for row in absent_cursor]
     conn.close()
     
-    return jsonify({
+    return with_etag(jsonify({
         "session_active": is_active,  # CRITICAL: Frontend needs this
         "marked_students": marked_students,
-        "absent_students": absent_students
-    })
+        "absent_students": absent_students,
+        "since": since,
+        "last_record_id": max((row['id'] for row in present_cursor + absent_cursor), default=since),
+        "present_count": session['present_count'],
+        "absent_count": session['explicit_absent_count']
+    }), etag)
+
+@app.route('/api/teacher/session/<int:session_id>/events', methods=['GET'])
+def session_events(session_id):
+    """
+    Server-Sent Events stream for the live dashboards. While it is open the
+    dashboard no longer polls /status, /online-status, /device-status or the OTP.
+    Sends 'snapshot' first, then small deltas: 'attendance', 'session', 'otp', 'device'.
+    Answers 503 when this process already holds LIVE_EVENTS_MAX_STREAMS streams -
+    the browser then falls back to polling instead of waiting for a free thread.
+    """
+    conn = get_db_connection()
+    session = conn.execute("SELECT otp_seed FROM sessions WHERE id = ?", (session_id,)).fetchone()
+    conn.close()
+    
+    if not session:
+        return jsonify({"error": "Session not found"}), 404
+    
+    subscription = event_hub.subscribe(session_id)
+    if subscription is None:
+        logger.warning(f"[LIVE] Stream limit reached ({event_hub.max_streams}) - session {session_id} dashboard polls")
+        return jsonify({"error": "Too many live streams, use polling"}), 503
+    
+    response = Response(_live_session_stream(session_id, session['otp_seed'], subscription),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Frees the slot even if the client disconnects before the stream starts
+    response.call_on_close(lambda: event_hub.unsubscribe(subscription))
+    return response
+
+
+def _session_timing(watermark):
+    """'session' event payload: active flag, end time and timezone-safe seconds remaining."""
+    end_time = watermark['end_time']
+    seconds_remaining = 0
+    if watermark['is_active'] and end_time:
+        end = datetime.datetime.strptime(end_time[:19], '%Y-%m-%d %H:%M:%S')
+        seconds_remaining = max(0, int((end - get_ist_now()).total_seconds()))
+    return {
+        "session_active": bool(watermark['is_active']),
+        "end_time": end_time,
+        "seconds_remaining": seconds_remaining
+    }
+
+
+def _live_session_stream(session_id, otp_seed, subscription):
+    """
+    Generator behind /events. Wakes on hub events (same process) or every
+    LIVE_EVENTS_RESYNC_SECONDS (writes from other processes), reads the session
+    watermark and sends only what changed since its attendance cursor.
+    Ends when the session ends or after LIVE_EVENTS_MAX_STREAM_SECONDS
+    (the browser reconnects and gets a fresh snapshot).
+    """
+    state = {}
+
+    def sync(full=False):
+        # Own connection per check - the request's connection is gone once streaming starts
+        conn = db_pool.connection()
+        try:
+            with read_snapshot(conn):
+                watermark = session_watermark(conn, session_id)
+                if watermark is None:   # Session was deleted
+                    state['session_active'] = False
+                    return [format_sse('session', {"session_active": False, "end_time": None, "seconds_remaining": 0})]
+                after = 0 if full else state['last_record_id']
+                changes = records_since(conn, session_id, after) if watermark['last_record_id'] > after or full else None
+        finally:
+            conn.close()
+        
+        new_records = len(changes['present']) + len(changes['absent']) if changes else 0
+        if not full and watermark['record_count'] != state['record_count'] + new_records:
+            return sync(full=True)   # Records were removed - resend everything
+        
+        timing = _session_timing(watermark)
+        messages = []
+        if full:
+            messages.append(format_sse('snapshot', dict(timing, **changes)))
+        else:
+            if new_records:
+                messages.append(format_sse('attendance', changes))
+            if (timing['session_active'], timing['end_time']) != (state['session_active'], state['end_time']):
+                messages.append(format_sse('session', timing))
+        state.update(session_active=timing['session_active'], end_time=timing['end_time'],
+                     record_count=watermark['record_count'], last_record_id=watermark['last_record_id'])
+        return messages
+
+    def otp_update():
+        window = int(get_ist_now().timestamp()) // 30
+        if not (otp_seed and state['session_active']) or window == state.get('otp_window'):
+            return []
+        state['otp_window'] = window
+        return [format_sse('otp', {"otp": generate_otp(otp_seed), "time_remaining": get_otp_time_remaining()})]
+
+    def device_update(pushed=None):
+        # Heartbeats of this session's scanner are sent as they arrive; between them
+        # only an online -> offline change (or a different scanner) is news
+        conn = db_pool.connection()
+        try:
+            payload = device_status_payload(conn, session_id)
+        finally:
+            conn.close()
+        current = (payload['status'], payload.get('mac_address'))
+        own_heartbeat = pushed is not None and pushed['mac_address'] == payload.get('mac_address')
+        if not own_heartbeat and current == state.get('device'):
+            return []
+        state['device'] = current
+        return [format_sse('device', payload)]
+
+    try:
+        started = last_sent = time.monotonic()
+        yield f"retry: {RECONNECT_MS}\n\n".encode('utf-8') + b''.join(sync(full=True) + otp_update() + device_update())
+        
+        while state.get('session_active') and time.monotonic() - started < Config.LIVE_EVENTS_MAX_STREAM_SECONDS:
+            timeout = Config.LIVE_EVENTS_RESYNC_SECONDS
+            if otp_seed:
+                timeout = min(timeout, 30 - get_ist_now().timestamp() % 30 + 0.05)
+            item = subscription.get(timeout)
+            
+            if item is not None and item[0] == 'device':
+                messages = device_update(item[1])
+            else:
+                messages = sync(full=subscription.overflowed)
+                subscription.overflowed = False
+                if item is None:
+                    messages += device_update()
+            messages += otp_update()
+            
+            if messages:
+                yield b''.join(messages)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                yield b': keepalive\n\n'
+                last_sent = time.monotonic()
+    finally:
+        event_hub.unsubscribe(subscription)
 
 @app.route('/api/teacher/report/<int:session_id>', methods=['GET'])
 def get_session_report(session_id):
@@ -2338,47 +2570,25 @@ def get_session_report(session_id):
     """, (course_id,)).fetchall()
     students = [dict(row) for row in students_cursor]
 
-    # Get all sessions for this course, up to and including the current one
-    sessions_cursor = conn.execute("""
-        SELECT id, start_time FROM sessions 
-        WHERE course_id = ?
-        ORDER BY start_time
-    """, (course_id,)).fetchall()
-    sessions = [dict(row) for row in sessions_cursor]
+    # All sessions of this course (oldest first) and who attended them - from the in-memory matrix
+    matrix = attendance_store.get(conn, course_id)
+    conn.close()
+    sessions = [{"id": sid, "start_time": start} for sid, start in zip(matrix.session_ids, matrix.session_starts)]
 
-    # Get all attendance records for these sessions
-    session_ids = [s['id'] for s in sessions]
-    if not session_ids:
+    if not sessions:
         # Handle case with no sessions
         return jsonify({"students": students, "sessions": sessions, "records": {}})
 
-    placeholders = ','.join('?' for _ in session_ids)
-    # Get present records (NOT emergency_mode_absent)
-    present_cursor = conn.execute(f"""
-        SELECT session_id, student_id FROM attendance_records
-        WHERE session_id IN ({placeholders})
-        AND (override_method IS NULL OR override_method != 'emergency_mode_absent')
-    """, session_ids).fetchall()
-    
-    # Get absent records (emergency_mode_absent only)
-    absent_cursor = conn.execute(f"""
-        SELECT session_id, student_id FROM attendance_records
-        WHERE session_id IN ({placeholders})
-        AND override_method = 'emergency_mode_absent'
-    """, session_ids).fetchall()
-    
-    # Create fast lookup sets for presence/absence check: (session_id, student_id)
-    present_set = set((rec['session_id'], rec['student_id']) for rec in present_cursor)
-    absent_set = set((rec['session_id'], rec['student_id']) for rec in absent_cursor)
-    
-    conn.close()
+    # (session_id, student_id) pairs - present marks and emergency-mode absents
+    present_set = matrix.pairs(matrix.present)
+    absent_set = matrix.pairs(matrix.absent)
 
     # Structure the data for the frontend
     report_data = {
         "students": students,
         "sessions": sessions,
-        "present_set": list(present_set),  # Convert set to list for JSON
-        "absent_set": list(absent_set)     # Absent students marked via emergency mode
+        "present_set": present_set,
+        "absent_set": absent_set     # Absent students marked via emergency mode
     }
     
     logger.info(f"Report generated - SessionID: {session_id}, Students: {len(students)}, "
@@ -2394,78 +2604,52 @@ def get_session_report(session_id):
 @app.route('/api/teacher/report/export/<int:session_id>')
 def export_session_report(session_id):
     """
-    Generates a .xlsx Excel file of the attendance report and sends it for download.
+    Downloads the attendance report of a session's course.
+    Query Parameters:
+        - format (optional): 'xlsx' (default) or 'csv' (streamed while it is generated)
     """
-    # This logic re-uses the get_session_report logic, but formats it into an Excel sheet
-    # (For brevity, the data fetching is duplicated. In a large app, this would be refactored)
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in ('xlsx', 'csv'):
+        return jsonify({"error": "format must be 'xlsx' or 'csv'"}), 400
+    
     conn = get_db_connection()
-    course = conn.execute("SELECT c.course_name FROM sessions s JOIN courses c ON s.course_id = c.id WHERE s.id = ?", (session_id,)).fetchone()
-    course_id = conn.execute("SELECT course_id FROM sessions WHERE id = ?", (session_id,)).fetchone()['course_id']
-    logger.info(f"Excel export started - SessionID: {session_id}, CourseID: {course_id}")
-    students = [dict(row) for row in conn.execute("SELECT s.id, s.student_name, s.university_roll_no, s.enrollment_no, e.class_roll_id FROM students s JOIN enrollments e ON s.id = e.student_id WHERE e.course_id = ? ORDER BY e.class_roll_id", (course_id,)).fetchall()]
-    sessions = [dict(row) for row in conn.execute(
-        "SELECT id, start_time FROM sessions WHERE course_id = ? ORDER BY start_time",
-        (course_id,)
-    ).fetchall()]
-    session_ids = [s['id'] for s in sessions]
-    present_set = set()
-    absent_set = set()
-    if session_ids:
-        placeholders = ','.join('?' for _ in session_ids)
-        # Get present records (NOT emergency_mode_absent)
-        present_cursor = conn.execute(f"""
-            SELECT session_id, student_id FROM attendance_records 
-            WHERE session_id IN ({placeholders})
-            AND (override_method IS NULL OR override_method != 'emergency_mode_absent')
-        """, session_ids).fetchall()
-        present_set = set((rec['session_id'], rec['student_id']) for rec in present_cursor)
-        
-        # Get absent records (emergency_mode_absent only)
-        absent_cursor = conn.execute(f"""
-            SELECT session_id, student_id FROM attendance_records 
-            WHERE session_id IN ({placeholders})
-            AND override_method = 'emergency_mode_absent'
-        """, session_ids).fetchall()
-        absent_set = set((rec['session_id'], rec['student_id']) for rec in absent_cursor)
+    course = conn.execute("""
+        SELECT c.id, c.course_name FROM sessions s JOIN courses c ON s.course_id = c.id WHERE s.id = ?
+    """, (session_id,)).fetchone()
+    if not course:
+        conn.close()
+        return jsonify({"error": "Session not found"}), 404
+    course_id = course['id']
+    download_name = f"Attendance_Report_{course['course_name']}_{datetime.date.today()}.{export_format}"
+    logger.info(f"Report export started - SessionID: {session_id}, CourseID: {course_id}, Format: {export_format}")
+    
+    if export_format == 'csv':
+        conn.close()
+        
+        def generate():
+            # Own connection - the request's connection is released before the body is streamed
+            stream_conn = db_pool.connection()
+            try:
+                yield from iter_csv_report(stream_conn, course_id)
+            finally:
+                stream_conn.close()
+            logger.info(f"CSV export complete - SessionID: {session_id}, CourseID: {course_id}")
+        
+        response = Response(generate(), mimetype='text/csv')
+        response.headers.set('Content-Disposition', 'attachment', **attachment_disposition(download_name))
+        return response
+    
+    # Write-only workbook, spooled to a temp file once it gets large
+    xlsx_file, student_count = spooled_xlsx_report(conn, course_id)
     conn.close()
-
-    # --- Create Excel Workbook in Memory ---
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Attendance Report"
-
-    # Header Row
-    headers = ["Class Roll ID", "Student Name", "University Roll No."] + [
-        datetime.datetime.fromisoformat(s['start_time']).strftime('%d-%b-%Y %H:%M') for s in sessions
-    ]
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center')
-
-    # Data Rows
-    for student in students:
-        row_data = [student['class_roll_id'], student['student_name'], student['university_roll_no']]
-        for session in sessions:
-            if (session['id'], student['id']) in present_set:
-                row_data.append("P")
-            else:
-                row_data.append("A")
-        ws.append(row_data)
-
-    # Save to an in-memory stream
-    in_memory_file = io.BytesIO()
-    wb.save(in_memory_file)
-    in_memory_file.seek(0) # Move cursor to the beginning of the stream
-
-    logger.info(f"Excel export complete - SessionID: {session_id}, "
-                f"Students: {len(students)}, Sessions: {len(sessions)}")
+    
+    logger.info(f"Excel export complete - SessionID: {session_id}, CourseID: {course_id}, Students: {student_count}")
     
     return send_file(
-        in_memory_file,
+        xlsx_file,
         as_attachment=True,
-        download_name=f"Attendance_Report_{course['course_name']}_{datetime.date.today()}.xlsx",
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        download_name=download_name,
+        mimetype=XLSX_MIMETYPE
     )
 
 
@@ -2478,17 +2662,23 @@ def get_teacher_analytics(course_id):
     """
     Returns comprehensive analytics for the teacher dashboard.
     Includes: avg attendance, at-risk students, trend graph (base64).
+    Query Parameters:
+        - graph (optional): 'png' (default) for the rendered trend graph,
+          'series' for the raw trend points ("trend_series") instead of an image
     """
     try:
+        graph_format = request.args.get('graph', 'png')
         conn = get_db_connection()
         logger.info(f"Loading teacher analytics - CourseID: {course_id}")
         
-        # Get all sessions for this course
+        # Get all sessions for this course with their present counts (session_stats rollup,
+        # emergency_mode_absent records are not counted as present)
         sessions_cursor = conn.execute("""
-            SELECT id, start_time, topic 
-            FROM sessions 
-            WHERE course_id = ? 
-            ORDER BY start_time
+            SELECT s.id, s.start_time, s.topic, COALESCE(ss.present_count, 0) as present_count
+            FROM sessions s
+            LEFT JOIN session_stats ss ON ss.session_id = s.id
+            WHERE s.course_id = ? 
+            ORDER BY s.start_time
         """, (course_id,)).fetchall()
         sessions = [dict(row) for row in sessions_cursor]
         
@@ -2503,9 +2693,9 @@ def get_teacher_analytics(course_id):
             })
         
         # Get total enrolled students
-        enrolled_count = conn.execute("""
-            SELECT COUNT(*) as count FROM enrollments WHERE course_id = ?
-        """, (course_id,)).fetchone()['count']
+        stats = conn.execute(
+            "SELECT enrolled_count FROM course_stats WHERE course_id = ?", (course_id,)).fetchone()
+        enrolled_count = stats['enrolled_count'] if stats else 0
         
         if enrolled_count == 0:
             conn.close()
@@ -2517,37 +2707,9 @@ def get_teacher_analytics(course_id):
                 "message": "No students enrolled in this course"
             })
         
-        session_ids = [s['id'] for s in sessions]
-        placeholders = ','.join('?' for _ in session_ids)
-        
-        # Get all attendance records for these sessions (exclude emergency_mode_absent)
-        records = conn.execute(f"""
-            SELECT session_id, student_id 
-            FROM attendance_records 
-            WHERE session_id IN ({placeholders})
-            AND (override_method IS NULL OR override_method != 'emergency_mode_absent')
-        """, session_ids).fetchall()
-        
-        # Create attendance lookup
-        attendance_by_session = {}
-        attendance_by_student = {}
-        
-        for rec in records:
-            # Count per session
-            sid = rec['session_id']
-            if sid not in attendance_by_session:
-                attendance_by_session[sid] = 0
-            attendance_by_session[sid] += 1
-            
-            # Count per student
-            stud_id = rec['student_id']
-            if stud_id not in attendance_by_student:
-                attendance_by_student[stud_id] = 0
-            attendance_by_student[stud_id] += 1
-        
         # Calculate average attendance percentage
         total_possible = len(sessions) * enrolled_count
-        total_present = sum(attendance_by_session.values())
+        total_present = sum(session['present_count'] for session in sessions)
         avg_percent = (total_present / total_possible * 100) if total_possible > 0 else 0
         
         # Prepare session data for trend graph
@@ -2555,19 +2717,26 @@ def get_teacher_analytics(course_id):
         for session in sessions:
             sessions_data.append({
                 'date': session['start_time'],
-                'present_count': attendance_by_session.get(session['id'], 0),
+                'present_count': session['present_count'],
                 'total_students': enrolled_count,
                 'topic': session.get('topic', '')
             })
         
-        # Generate trend graph
-        trend_graph = analytics.generate_attendance_trend_graph(sessions_data)
+        # Trend graph: raw points for client-side charts, or the cached/pool-rendered PNG
+        trend_series = None
+        trend_graph = None
+        if graph_format == 'series':
+            trend_series = analytics.build_attendance_trend_series(sessions_data)
+        else:
+            trend_graph = trend_renderer.get(course_id, sessions_data)
         
         # Get all enrolled students for at-risk calculation
         students_cursor = conn.execute("""
-            SELECT s.id as student_id, s.student_name, s.university_roll_no, e.class_roll_id
+            SELECT s.id as student_id, s.student_name, s.university_roll_no, e.class_roll_id,
+                   COALESCE(scs.present_count, 0) as present_count
             FROM students s
             JOIN enrollments e ON s.id = e.student_id
+            LEFT JOIN student_course_stats scs ON scs.student_id = s.id AND scs.course_id = e.course_id
             WHERE e.course_id = ?
         """, (course_id,)).fetchall()
         
@@ -2578,7 +2747,7 @@ def get_teacher_analytics(course_id):
                 'student_name': student['student_name'],
                 'university_roll_no': student['university_roll_no'],
                 'class_roll_id': student['class_roll_id'],
-                'present_count': attendance_by_student.get(student['student_id'], 0),
+                'present_count': student['present_count'],
                 'total_sessions': len(sessions)
             })
         
@@ -2587,65 +2756,89 @@ def get_teacher_analytics(course_id):
         
         conn.close()
         
-        return jsonify({
+        response = {
             "total_sessions": len(sessions),
             "enrolled_count": enrolled_count,
             "avg_attendance_percent": round(avg_percent, 1),
             "at_risk_students": at_risk,
             "trend_graph_base64": trend_graph
-        })
+        }
+        if trend_series is not None:
+            response["trend_series"] = trend_series
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error in teacher analytics for CourseID {course_id}: {e}", exc_info=True)
         return jsonify({"error": "Failed to load analytics"}), 500
 
 
+# History display formats computed in SQL: '%d %b %Y' and '%I:%M %p' for
+# 'YYYY-MM-DD HH:MM:SS' start times; anything else falls back to the raw date part.
+_HISTORY_TIMESTAMP_GLOB = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'"
+HISTORY_DATE_SQL = f"""
+    CASE WHEN s.start_time GLOB {_HISTORY_TIMESTAMP_GLOB}
+         THEN strftime('%d ', s.start_time)
+              || substr('JanFebMarAprMayJunJulAugSepOctNovDec', CAST(strftime('%m', s.start_time) AS INTEGER) * 3 - 2, 3)
+              || strftime(' %Y', s.start_time)
+         ELSE COALESCE(NULLIF(substr(s.start_time, 1, 10), ''), 'Unknown')
+    END"""
+HISTORY_TIME_SQL = f"""
+    CASE WHEN s.start_time GLOB {_HISTORY_TIMESTAMP_GLOB}
+         THEN printf('%02d:%s %s',
+                     (CAST(strftime('%H', s.start_time) AS INTEGER) + 11) % 12 + 1,
+                     strftime('%M', s.start_time),
+                     CASE WHEN CAST(strftime('%H', s.start_time) AS INTEGER) < 12 THEN 'AM' ELSE 'PM' END)
+         ELSE ''
+    END"""
+
 @app.route('/api/teacher/history/<int:course_id>', methods=['GET'])
 def get_teacher_history(course_id):
     """
-    Returns list of past sessions for the course.
+    Returns one page of past sessions for the course (most recent first).
     Includes present count and total students for each session.
+    Query Parameters:
+        - before (optional): next_before of the previous page ("<start_time>|<session id>";
+          a bare start_time is still accepted)
+        - limit (optional, default=PAGE_SIZE_DEFAULT): sessions per page
     """
     try:
+        cursor_params = get_session_cursor()
+        limit = get_page_limit()
         conn = get_db_connection()
-        logger.info(f"Loading teacher history - CourseID: {course_id}")
+        logger.info(f"Loading teacher history - CourseID: {course_id}, Before: {request.args.get('before')}")
         
-        # Get enrolled student count
-        enrolled_count = conn.execute("""
-            SELECT COUNT(*) as count FROM enrollments WHERE course_id = ?
-        """, (course_id,)).fetchone()['count']
+        # Session and enrolled student counts (trigger-maintained rollup)
+        course_totals = conn.execute("""
+            SELECT session_count, enrolled_count FROM course_stats WHERE course_id = ?
+        """, (course_id,)).fetchone()
+        total_count = course_totals['session_count'] if course_totals else 0
+        enrolled_count = course_totals['enrolled_count'] if course_totals else 0
+        
+        # One page of sessions with their present counts (emergency_mode_absent excluded)
+        # and display date/time formatted by SQLite. One extra row tells whether another page exists.
+        sessions_cursor = conn.execute(f"""
+            SELECT s.id, s.start_time, s.end_time, s.session_type, s.topic, s.is_active,
+                   COALESCE(ss.present_count, 0) AS present_count,
+                   {HISTORY_DATE_SQL} AS date_display,
+                   {HISTORY_TIME_SQL} AS time_display
+            FROM sessions s
+            LEFT JOIN session_stats ss ON ss.session_id = s.id
+            WHERE s.course_id = ? AND {SESSION_CURSOR_SQL}
+            ORDER BY s.start_time DESC, s.id DESC
+            LIMIT ?
+        """, (course_id, *cursor_params, limit + 1)).fetchall()
+        conn.close()
         
-        # Get all sessions for this course (most recent first)
-        sessions_cursor = conn.execute("""
-            SELECT id, start_time, end_time, session_type, topic, is_active
-            FROM sessions 
-            WHERE course_id = ?
-            ORDER BY start_time DESC
-        """, (course_id,)).fetchall()
+        has_more = len(sessions_cursor) > limit
+        sessions_cursor = sessions_cursor[:limit]
         
         sessions = []
         for session in sessions_cursor:
-            # Get attendance count for this session (exclude emergency_mode_absent)
-            present_count = conn.execute("""
-                SELECT COUNT(*) as count 
-                FROM attendance_records 
-                WHERE session_id = ?
-                AND (override_method IS NULL OR override_method != 'emergency_mode_absent')
-            """, (session['id'],)).fetchone()['count']
-            
-            # Parse date nicely
-            try:
-                start_dt = datetime.datetime.strptime(session['start_time'], '%Y-%m-%d %H:%M:%S')
-                date_display = start_dt.strftime('%d %b %Y')
-                time_display = start_dt.strftime('%I:%M %p')
-            except:
-                date_display = session['start_time'][:10] if session['start_time'] else 'Unknown'
-                time_display = ''
-            
+            present_count = session['present_count']
             sessions.append({
                 'id': session['id'],
-                'date': date_display,
-                'time': time_display,
+                'date': session['date_display'],
+                'time': session['time_display'],
                 'start_time': session['start_time'],
                 'end_time': session['end_time'],
                 'session_type': session['session_type'],
@@ -2656,11 +2849,11 @@ def get_teacher_history(course_id):
                 'attendance_percent': round((present_count / enrolled_count * 100), 1) if enrolled_count > 0 else 0
             })
         
-        conn.close()
-        
         return jsonify({
             "sessions": sessions,
-            "total_count": len(sessions)
+            "total_count": total_count,
+            "has_more": has_more,
+            "next_before": session_cursor(sessions[-1]) if has_more else None
         })
         
     except Exception as e:
@@ -2730,6 +2923,7 @@ def delete_session(session_id):
         
         conn.commit()
         conn.close()
+        scanner_cache.invalidate('session deleted')
         
         return jsonify({
             "status": "success",
@@ -2883,27 +3077,24 @@ def update_attendance_retroactive():
             return jsonify({"error": "Student not enrolled in this course"}), 400
         
         if action == 'mark_present':
-            # Check if already marked present
-            existing = conn.execute("""
-                SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?
-            """, (session_id, student_id)).fetchone()
-            
-            if existing:
-                conn.close()
-                return jsonify({"error": "Student is already marked present"}), 400
-            
-            # Insert attendance record with retroactive flag
-            conn.execute("""
-                INSERT INTO attendance_records 
+            # Insert attendance record with retroactive flag (ignored if already marked)
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO attendance_records 
                 (session_id, student_id, override_method, manual_reason)
                 VALUES (?, ?, 'retroactive_manual', ?)
             """, (session_id, student_id, reason))
             conn.commit()
             
+            if cursor.rowcount == 0:
+                conn.close()
+                return jsonify({"error": "Student is already marked present"}), 400
+            
             logger.info(f"Retroactive attendance - MARKED PRESENT - Session: {session_id}, "
                         f"Student: {student_id}, Reason: '{reason}'")
             
             conn.close()
+            event_hub.publish(session['id'], 'attendance')
+            scanner_cache.note_marked(session['id'], [student_id])
             return jsonify({
                 "status": "success",
                 "message": "Student marked present"
@@ -2929,6 +3120,8 @@ def update_attendance_retroactive():
                         f"Student: {student_id}, Reason: '{reason}'")
             
             conn.close()
+            event_hub.publish(session['id'], 'attendance')
+            scanner_cache.invalidate('attendance record removed')
             return jsonify({
                 "status": "success",
                 "message": "Attendance record removed"
@@ -3082,16 +3275,20 @@ def get_student_semesters(user_data):
     semesters_cursor = conn.execute("SELECT id, semester_name FROM semesters ORDER BY id").fetchall()
     semesters = [dict(row) for row in semesters_cursor]
     
-    # 2. Get ALL Courses for each semester
+    # 2. Get ALL Courses in one query and group them by semester
+    courses_by_semester = {semester['id']: [] for semester in semesters}
+    courses_cursor = conn.execute("""
+        SELECT id, course_name, course_code, semester_id
+        FROM courses 
+        ORDER BY semester_id, course_name
+    """).fetchall()
+    for row in courses_cursor:
+        if row['semester_id'] in courses_by_semester:
+            courses_by_semester[row['semester_id']].append(
+                {"id": row['id'], "course_name": row['course_name'], "course_code": row['course_code']})
+    
     for semester in semesters:
-        courses_cursor = conn.execute("""
-            SELECT id, course_name, course_code
-            FROM courses 
-            WHERE semester_id = ?
-            ORDER BY course_name
-        """, (semester['id'],)).fetchall()
-        
-        semester['courses'] = [dict(row) for row in courses_cursor]
+        semester['courses'] = courses_by_semester[semester['id']]
     
     conn.close()
     return jsonify(semesters)
@@ -3108,25 +3305,8 @@ def get_student_dashboard(user_data):
     student = conn.execute("SELECT student_name FROM students WHERE id = ?", (student_id,)).fetchone()
     student_name = student['student_name'] if student else 'Student'
     
-    # Base query for courses
-    if semester_id:
-        # Filter by specific semester
-        courses_cursor = conn.execute("""
-            SELECT c.id as course_id, c.course_name, s.semester_name
-            FROM courses c
-            JOIN enrollments e ON c.id = e.course_id
-            LEFT JOIN semesters s ON c.semester_id = s.id
-            WHERE e.student_id = ? AND c.semester_id = ?
-        """, (student_id, semester_id)).fetchall()
-    else:
-        # Get all courses (default behavior)
-        courses_cursor = conn.execute("""
-            SELECT c.id as course_id, c.course_name, s.semester_name
-            FROM courses c
-            JOIN enrollments e ON c.id = e.course_id
-            LEFT JOIN semesters s ON c.semester_id = s.id
-            WHERE e.student_id = ?
-        """, (student_id,)).fetchall()
+    # Per-course totals in one grouped query (optionally filtered by semester)
+    courses_cursor = student_course_summary(conn, student_id, semester_id)
     
     courses_data = []
     total_present_overall = 0
@@ -3137,15 +3317,8 @@ def get_student_dashboard(user_data):
         if semester_name is None and course['semester_name']:
             semester_name = course['semester_name']
             
-        sessions_cursor = conn.execute("SELECT id FROM sessions WHERE course_id = ?", (course['course_id'],)).fetchall()
-        session_ids = [s['id'] for s in sessions_cursor]
-        total_sessions = len(session_ids)
-        
-        if total_sessions > 0:
-            present_cursor = conn.execute(f"SELECT COUNT(id) as present_count FROM attendance_records WHERE student_id = ? AND session_id IN ({','.join(['?']*len(session_ids))})", [student_id] + session_ids)
-            present_count = present_cursor.fetchone()['present_count']
-        else:
-            present_count = 0
+        total_sessions = course['total_sessions']
+        present_count = course['present_count']
         
         percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
         total_present_overall += present_count
@@ -3207,31 +3380,18 @@ def get_critical_alerts(user_data):
     
     conn = get_db_connection()
     
-    # Get all enrolled courses
-    courses_cursor = conn.execute("""
-        SELECT c.id as course_id, c.course_name
-        FROM courses c
-        JOIN enrollments e ON c.id = e.course_id
-        WHERE e.student_id = ?
-    """, (student_id,)).fetchall()
+    # Get all enrolled courses with their totals (same summary as the dashboard)
+    courses_cursor = student_course_summary(conn, student_id)
     
     critical_alerts = []  # < 60%
     warning_alerts = []   # 60% - 75%
     
     for course in courses_cursor:
         course_id = course['course_id']
-        
-        # Get all sessions for this course
-        sessions_cursor = conn.execute("SELECT id FROM sessions WHERE course_id = ?", (course_id,)).fetchall()
-        session_ids = [s['id'] for s in sessions_cursor]
-        total_sessions = len(session_ids)
+        total_sessions = course['total_sessions']
         
         if total_sessions > 0:
-            present_cursor = conn.execute(
-                f"SELECT COUNT(id) as present_count FROM attendance_records WHERE student_id = ? AND session_id IN ({','.join(['?']*len(session_ids))})",
-                [student_id] + session_ids
-            )
-            present_count = present_cursor.fetchone()['present_count']
+            present_count = course['present_count']
             
             percentage = (present_count / total_sessions * 100)
             
@@ -3305,6 +3465,37 @@ def get_student_analytics(user_data):
             WHERE e.student_id = ?
         """, (student_id,)).fetchall()
     
+    # Last-7 / last-30 / semester windows of every course in one result set:
+    # sessions ranked newest-first per course, LEFT JOINed to this student's records.
+    # Only the newest ANALYTICS_LAST_DAYS rows per course come back (at least one,
+    # so the per-course totals are always present).
+    window_rows = conn.execute("""
+        WITH course_sessions AS (
+            SELECT s.course_id, s.id AS session_id, s.start_time,
+                   ROW_NUMBER() OVER (PARTITION BY s.course_id ORDER BY s.start_time DESC, s.id DESC) AS recency,
+                   (ar.id IS NOT NULL) AS attended
+            FROM sessions s
+            JOIN enrollments e ON e.course_id = s.course_id AND e.student_id = :student_id
+            LEFT JOIN attendance_records ar ON ar.session_id = s.id AND ar.student_id = :student_id
+        ),
+        windows AS (
+            SELECT course_id, session_id, start_time, recency, attended,
+                   COUNT(*) OVER per_course AS total_sessions,
+                   SUM(attended) OVER per_course AS total_present,
+                   SUM(CASE WHEN recency <= :last_n THEN attended ELSE 0 END) OVER per_course AS last_n_present,
+                   SUM(CASE WHEN recency <= :trend_n THEN attended ELSE 0 END) OVER per_course AS trend_n_present
+            FROM course_sessions
+            WINDOW per_course AS (PARTITION BY course_id)
+        )
+        SELECT * FROM windows
+        WHERE recency <= MAX(:last_n, 1)
+        ORDER BY course_id, recency DESC
+    """, {'student_id': student_id, 'last_n': ANALYTICS_LAST_DAYS, 'trend_n': ANALYTICS_TREND_DAYS}).fetchall()
+    
+    windows_by_course = {}
+    for row in window_rows:
+        windows_by_course.setdefault(row['course_id'], []).append(row)
+    
     analytics_data = {}
     
     for course in courses_cursor:
@@ -3312,49 +3503,15 @@ def get_student_analytics(user_data):
         course_name = course['course_name']
         semester_name = course['semester_name'] if course['semester_name'] else 'Other'
         
-        # Get all sessions for this course ordered by start_time (newest first)
-        sessions = conn.execute("""
-            SELECT id, start_time
-            FROM sessions
-            WHERE course_id = ?
-            ORDER BY start_time DESC
-        """, (course_id,)).fetchall()
+        rows = windows_by_course.get(course_id, [])  # Chronological (oldest of the last N first)
+        total_sessions = rows[0]['total_sessions'] if rows else 0
+        total_present = rows[0]['total_present'] if rows else 0
+        last_7_count = min(ANALYTICS_LAST_DAYS, total_sessions)
+        last_30_count = min(ANALYTICS_TREND_DAYS, total_sessions)
         
-        # Calculate last 7 sessions average (last 7 actual sessions conducted)
-        last_7_sessions = sessions[:ANALYTICS_LAST_DAYS]
-        if last_7_sessions:
-            last_7_session_ids = [s['id'] for s in last_7_sessions]
-            last_7_present = conn.execute(f"""
-                SELECT COUNT(*) as count FROM attendance_records
-                WHERE student_id = ? AND session_id IN ({','.join(['?']*len(last_7_session_ids))})
-            """, [student_id] + last_7_session_ids).fetchone()['count']
-            last_7_days_avg = (last_7_present / len(last_7_sessions) * 100) if last_7_sessions else 0
-        else:
-            last_7_days_avg = 0
-        
-        # Calculate last 30 sessions average (last 30 actual sessions conducted)
-        last_30_sessions = sessions[:ANALYTICS_TREND_DAYS]
-        if last_30_sessions:
-            last_30_session_ids = [s['id'] for s in last_30_sessions]
-            last_30_present = conn.execute(f"""
-                SELECT COUNT(*) as count FROM attendance_records
-                WHERE student_id = ? AND session_id IN ({','.join(['?']*len(last_30_session_ids))})
-            """, [student_id] + last_30_session_ids).fetchone()['count']
-            last_30_days_avg = (last_30_present / len(last_30_sessions) * 100) if last_30_sessions else 0
-        else:
-            last_30_days_avg = 0
-        
-        # Calculate overall semester average
-        total_present = 0
-        if sessions:
-            session_ids = [s['id'] for s in sessions]
-            total_present = conn.execute(f"""
-                SELECT COUNT(*) as count FROM attendance_records
-                WHERE student_id = ? AND session_id IN ({','.join(['?']*len(session_ids))})
-            """, [student_id] + session_ids).fetchone()['count']
-            semester_total = (total_present / len(sessions) * 100) if sessions else 0
-        else:
-            semester_total = 0
+        last_7_days_avg = (rows[0]['last_n_present'] / last_7_count * 100) if last_7_count else 0
+        last_30_days_avg = (rows[0]['trend_n_present'] / last_30_count * 100) if last_30_count else 0
+        semester_total = (total_present / total_sessions * 100) if total_sessions else 0
         
         # Determine trend direction
         if last_7_days_avg > last_30_days_avg:
@@ -3372,32 +3529,21 @@ def get_student_analytics(user_data):
         else:
             status = 'critical'
         
-        # Get breakdown for the last 7 sessions (for charting)
+        # Breakdown for the last 7 sessions in chronological order (for charting)
         daily_breakdown = []
-        # Reverse to get chronological order (oldest to newest of the last 7 sessions)
-        last_7_sessions_chrono = list(reversed(last_7_sessions))
-        for session in last_7_sessions_chrono:
-            session_id = session['id']
-            session_date = session['start_time'].split()[0]  # Extract date from datetime
-            
-            # Check if student was present in this session
-            present = conn.execute("""
-                SELECT COUNT(*) as count FROM attendance_records
-                WHERE student_id = ? AND session_id = ?
-            """, (student_id, session_id)).fetchone()['count']
-            
-            session_percentage = 100 if present > 0 else 0
-            
+        for row in rows:
+            if row['recency'] > ANALYTICS_LAST_DAYS:
+                continue
             daily_breakdown.append({
-                'date': session_date,
-                'percentage': session_percentage,
-                'session_id': session_id
+                'date': row['start_time'].split()[0],  # Extract date from datetime
+                'percentage': 100 if row['attended'] else 0,
+                'session_id': row['session_id']
             })
         
         # Get detailed status from analytics module
         status_data = analytics.calculate_status_and_improvement(
             total_present, 
-            len(sessions),
+            total_sessions,
             target_percent=MINIMUM_ATTENDANCE_PERCENTAGE,
             critical_percent=ATTENDANCE_WARNING_THRESHOLD
         )
@@ -3412,7 +3558,7 @@ def get_student_analytics(user_data):
             'status': status_data['status'].lower(),
             'improvement_plan': status_data,
             'daily_breakdown': daily_breakdown,
-            'total_sessions': len(sessions)
+            'total_sessions': total_sessions
         }
     
     conn.close()
@@ -3423,29 +3569,83 @@ def get_student_analytics(user_data):
         'warning_threshold': ATTENDANCE_WARNING_THRESHOLD
     })
 
+def get_page_limit():
+    """Page size from ?limit=, clamped to 1..PAGE_SIZE_MAX (PAGE_SIZE_DEFAULT if missing)."""
+    limit = request.args.get('limit', default=Config.PAGE_SIZE_DEFAULT, type=int)
+    return max(1, min(limit, Config.PAGE_SIZE_MAX))
+
+# Keyset filter for session pages ordered by (start_time DESC, id DESC) - params from get_session_cursor()
+SESSION_CURSOR_SQL = "(? IS NULL OR s.start_time < ? OR (s.start_time = ? AND s.id < ?))"
+
+def get_session_cursor():
+    """
+    (start_time, session_id) from ?before=<start_time>|<id> - the id breaks ties between
+    sessions that started at the same time. A bare start_time (older clients) gives id None,
+    i.e. only strictly older sessions. Returns the 4 parameters of SESSION_CURSOR_SQL.
+    """
+    before = request.args.get('before') or None
+    session_id = None
+    if before is not None:
+        start_time, separator, tail = before.rpartition('|')
+        if separator and tail.isdigit():
+            before, session_id = start_time, int(tail)
+    return (before, before, before, session_id)
+
+def session_cursor(row):
+    """next_before value that continues after this session row."""
+    return f"{row['start_time']}|{row['id']}"
+
 @app.route('/api/student/course/<int:course_id>', methods=['GET'])
 @token_required
 def get_course_details(user_data, course_id):
+    """
+    Course totals plus one page of the attendance log (newest first).
+    Query Parameters:
+        - before (optional): next_before of the previous page ("<start_time>|<session id>";
+          a bare start_time is still accepted)
+        - limit (optional, default=PAGE_SIZE_DEFAULT): log entries per page
+    The response's next_before is the cursor for the following page (null on the last page).
+    """
     student_id = user_data['student_id']
+    cursor_params = get_session_cursor()
+    limit = get_page_limit()
     conn = get_db_connection()
     course = conn.execute("SELECT course_name FROM courses WHERE id = ?", (course_id,)).fetchone()
-    sessions = conn.execute("SELECT id, start_time, end_time FROM sessions WHERE course_id = ? ORDER BY start_time DESC", (course_id,)).fetchall()
     
-    attendance_log = []
-    present_count = 0
-    for session in sessions:
-        record = conn.execute("SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?", (session['id'], student_id)).fetchone()
-        status = "Present" if record else "Absent"
-        if record: present_count += 1
-        attendance_log.append({"date": session['start_time'], "end_time": session['end_time'], "status": status})
+    # Totals over the whole course, independent of the page
+    totals = conn.execute("""
+        SELECT COUNT(*) AS total_sessions, COUNT(ar.id) AS present_count
+        FROM sessions s
+        LEFT JOIN attendance_records ar ON ar.session_id = s.id AND ar.student_id = ?
+        WHERE s.course_id = ?
+    """, (student_id, course_id)).fetchone()
+    
+    # One extra row tells whether another page exists
+    rows = conn.execute(f"""
+        SELECT s.id, s.start_time, s.end_time, ar.id IS NOT NULL AS attended
+        FROM sessions s
+        LEFT JOIN attendance_records ar ON ar.session_id = s.id AND ar.student_id = ?
+        WHERE s.course_id = ? AND {SESSION_CURSOR_SQL}
+        ORDER BY s.start_time DESC, s.id DESC
+        LIMIT ?
+    """, (student_id, course_id, *cursor_params, limit + 1)).fetchall()
+    conn.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    attendance_log = [
+        {"date": row['start_time'], "end_time": row['end_time'], "status": "Present" if row['attended'] else "Absent"}
+        for row in rows
+    ]
 
-    total_sessions = len(sessions)
+    total_sessions = totals['total_sessions']
+    present_count = totals['present_count']
     percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
-    conn.close()
     
     return jsonify({
         "course_name": course['course_name'], "present_count": present_count, "absent_count": total_sessions - present_count,
-        "total_sessions": total_sessions, "percentage": round(percentage), "log": attendance_log
+        "total_sessions": total_sessions, "percentage": round(percentage), "log": attendance_log,
+        "has_more": has_more, "next_before": session_cursor(rows[-1]) if has_more else None
     })
 
 
@@ -3461,117 +3661,144 @@ def get_course_details(user_data, course_id):
 
 
 # =================================================================
-#   DEVICE API ENDPOINTS (For Live Status)
-# =================================================================
-
-# We will use a simple global variable to store the last heartbeat
-# In a real multi-device system, this would be a dictionary or a database table
-# =================================================================
-#   DEVICE API ENDPOINTS (Enhanced with Timestamp Validation)
+#   DEVICE API ENDPOINTS (Device registry - one row per scanner MAC)
 # =================================================================
 
-# Global variable to store last heartbeat
-last_device_heartbeat = {}
-
 @app.route('/api/device/heartbeat', methods=['POST'])
 def device_heartbeat():
     """
-    Receives a status update from the Smart Scanner device.
-    ✅ NEW: Adds server-side timestamp for freshness validation
+    Receives a status update from a Smart Scanner device and stores it in the
+    device registry (shared by all server processes), with the session it serves.
     """
-    global last_device_heartbeat
-    data = request.get_json()
+    data = request.get_json() or {}
+    if not data.get('mac_address'):
+        return jsonify({"status": "error", "message": "mac_address is required"}), 400
     
-    # ✅ NEW: Add server timestamp when heartbeat is received
-    data['server_timestamp'] = get_ist_now().isoformat()
+    # The room comes from the registry (set by an admin), never from the unauthenticated heartbeat
+    room = scanner_cache.room_for_device(data['mac_address'])
+    active = scanner_cache.active_session(room)
+    session_id = active.session_id if active else None
     
-    last_device_heartbeat = data
+    conn = get_db_connection()
+    device_registry.record_heartbeat(conn, data, session_id)
+    conn.close()
     
     logger.info(f"Device heartbeat - Battery: {data.get('battery')}%, "
                 f"Queue: {data.get('queue_count')}, Sync: {data.get('sync_count')}, "
                 f"MAC: {data.get('mac_address')}")
     
+    # Push the new status to open live dashboards (each stream picks the device of its session)
+    event_hub.broadcast('device', {"mac_address": data['mac_address'], "session_id": session_id})
+    
     return jsonify({"status": "ok"})
 
 
-@app.route('/api/teacher/device-status', methods=['GET'])
-def get_device_status():
+def device_status_payload(conn, session_id=None, log_stale=False):
     """
-    Provides the last known device status to the Teacher Dashboard.
-    ✅ NEW: Validates timestamp freshness before returning data
+    Status of the scanner serving `session_id` (else the most recently seen one),
+    as shown on the Teacher Dashboard. Offline after DEVICE_OFFLINE_SECONDS without a heartbeat.
     """
-    global last_device_heartbeat
-    
-    # Check if we have any heartbeat data at all
-    if not last_device_heartbeat or 'server_timestamp' not in last_device_heartbeat:
-        return jsonify({
-            "status": "offline",
-            "message": "No heartbeat data available",
-            "mac_address": None,
-            "wifi_strength": None,
-            "battery": None,
-            "queue_count": None,
-            "sync_count": None
-        })
-    
-    # ✅ NEW: Check if heartbeat is fresh (within last 15 seconds)
     try:
-        last_timestamp = datetime.datetime.fromisoformat(last_device_heartbeat['server_timestamp'])
-        current_time = get_ist_now()
-        time_diff = (current_time - last_timestamp).total_seconds()
-        
-        # If heartbeat is older than 15 seconds, device is considered offline
-        if time_diff > 15:
-            logger.warning(f"Device heartbeat stale - Last seen {time_diff:.1f} seconds ago")
-            return jsonify({
-                "status": "offline",
-                "message": f"Last heartbeat {int(time_diff)} seconds ago",
-                "mac_address": last_device_heartbeat.get('mac_address'),
-                "wifi_strength": None,
-                "battery": last_device_heartbeat.get('battery'),  # Show last known battery
-                "queue_count": last_device_heartbeat.get('queue_count'),
-                "sync_count": last_device_heartbeat.get('sync_count'),
-                "last_seen": int(time_diff)
-            })
-        
-        # ✅ Heartbeat is fresh - device is online
-        return jsonify({
-            "status": "online",
-            "mac_address": last_device_heartbeat.get('mac_address'),
-            "wifi_strength": last_device_heartbeat.get('wifi_strength'),
-            "battery": last_device_heartbeat.get('battery'),
-            "queue_count": last_device_heartbeat.get('queue_count'),
-            "sync_count": last_device_heartbeat.get('sync_count'),
-            "last_seen": int(time_diff)
-        })
-        
+        session = conn.execute("SELECT room FROM sessions WHERE id = ?", (session_id,)).fetchone() if session_id else None
+        payload = device_registry.for_session(conn, session_id, session['room'] if session else None)
     except Exception as e:
         logger.error(f"Error validating device status: {e}")
-        return jsonify({
+        return {
             "status": "error",
             "message": "Error checking device status"
-        })
+        }
+    if log_stale and payload['status'] == 'offline' and payload['mac_address']:
+        logger.warning(f"Device heartbeat stale - {payload['mac_address']} last seen {payload['last_seen']} seconds ago")
+    return payload
+
+
+@app.route('/api/teacher/device-status', methods=['GET'])
+def get_device_status():
+    """
+    Provides the last known device status to the Teacher Dashboard.
+    ?session_id= picks the scanner serving that session, ?mac_address= a specific scanner.
+    Open live dashboards receive the same payload as 'device' events instead.
+    """
+    conn = get_db_connection()
+    mac_address = request.args.get('mac_address')
+    if mac_address:
+        payload = device_registry.get(conn, mac_address)
+        conn.close()
+        if payload is None:
+            return jsonify({"error": "Device not found"}), 404
+        return jsonify(payload)
+    payload = device_status_payload(conn, request.args.get('session_id', type=int), log_stale=True)
+    conn.close()
+    return jsonify(payload)
+
+
+@app.route('/api/admin/devices', methods=['GET'])
+@token_required
+def list_devices(user_data):
+    """Every scanner that has sent a heartbeat, with its status, room and session."""
+    conn = get_db_connection()
+    devices = device_registry.list_devices(conn)
+    conn.close()
+    return jsonify(devices)
+
+
+@app.route('/api/admin/devices/<mac_address>', methods=['PUT'])
+@token_required
+def update_device(user_data, mac_address):
+    """Assigns a scanner to a classroom: {"room": "LT-2"} (null clears it)."""
+    data = request.get_json() or {}
+    if 'room' not in data:
+        return jsonify({"error": "room is required"}), 400
+    room = str(data['room']).strip() if data['room'] is not None else None
+    room = room or None
+    conn = get_db_connection()
+    updated = device_registry.set_room(conn, mac_address, room)
+    conn.close()
+    if not updated:
+        return jsonify({"error": "Device not found"}), 404
+    scanner_cache.forget_device(mac_address)
+    logger.info(f"Device {mac_address} assigned to room {room}")
+    return jsonify({"message": "Device updated", "mac_address": mac_address, "room": room})
+
+
+@app.route('/api/teacher/rooms', methods=['GET'])
+def list_rooms():
+    """Classrooms with a scanner assigned (choices for the session setup screen)."""
+    conn = get_db_connection()
+    rooms = device_registry.list_rooms(conn)
+    conn.close()
+    return jsonify(rooms)
 
 
 # =================================================================
 #   DEVICE API ENDPOINTS (Fully Functional)
 # =================================================================
 
+def calling_device_room():
+    """
+    Room of the scanner making this request - scanners send their MAC in the
+    X-Device-MAC header. None (unbound scanner, or no header) routes to the
+    newest active session started without a room.
+    """
+    return scanner_cache.room_for_device(request.headers.get('X-Device-MAC'))
+
+
 # This endpoint is polled by the ESP32 device to know if it should
 # be in 'ATTENDANCE_MODE' or 'AWAITING_SESSION' mode.
 @app.route('/api/session-status', methods=['GET'])
 def get_session_status():
-    """Checks for an active session and returns its status and name."""
+    """Checks for an active session in the calling scanner's room and returns its status and name."""
+    room = calling_device_room()
     conn = get_db_connection()
-    # Find the most recent active session
+    # Find the most recent active session for this scanner's room
     session_data = conn.execute("""
         SELECT s.id, c.course_code 
         FROM sessions s
         JOIN courses c ON s.course_id = c.id
-        WHERE s.is_active = 1 
+        WHERE s.is_active = 1 AND s.room IS ? AND s.session_type IS NOT 'online'
         ORDER BY s.start_time DESC 
         LIMIT 1
-    """).fetchone()
+    """, (room,)).fetchone()
     conn.close()
 
     if session_data:
@@ -3590,13 +3817,46 @@ def get_session_status():
 # This is the main endpoint for the Smart Scanner to record attendance.
 @app.route('/api/mark-attendance-by-roll-id', methods=['POST'])
 def mark_attendance_by_roll_id():
-    # [Keep all existing validation code...]
     data = request.get_json()
     class_roll_id = data.get('class_roll_id')
     logger.info(f"Attendance attempt - Roll ID: {class_roll_id}")
     
+    # Fast path: the room's active session, roster and already-marked students come from the scanner cache
+    room = calling_device_room()
+    active = scanner_cache.active_session(room)
+    
+    if not active:
+        logger.warning(f"Attendance failed - No active session")
+        return jsonify({"status": "error", "message": "No Active Session"}), 400
+    
+    student_id = active.student_for_roll(class_roll_id)
+    if student_id is None:
+        # Not in the cached roster - the enrollment may be newer than the cache
+        return _mark_attendance_uncached(class_roll_id, room)
+    
+    # ✅ INSERT ATTENDANCE RECORD - group-committed, only while the cached session is still
+    # active. Runs for cached duplicates too: another server process may have deleted the record.
+    inserted = attendance_writer.insert(active.session_id, student_id, 'biometric', require_active=True)
+    
+    if not inserted:
+        if student_id in active.marked:
+            logger.info(f"Attendance duplicate - Roll ID {class_roll_id}")
+            return jsonify({"status": "duplicate", "message": "Already Marked"})
+        # Marked or ended by another server process - let the database answer
+        scanner_cache.stale(f"insert for session {active.session_id} rejected")
+        return _mark_attendance_uncached(class_roll_id, room)
+    
+    scanner_cache.note_marked(active.session_id, [student_id])
+    logger.info(f"Attendance marked - Roll ID {class_roll_id}")
+    event_hub.publish(active.session_id, 'attendance')
+    
+    return jsonify({"status": "success", "message": "Marked"})
+
+
+def _mark_attendance_uncached(class_roll_id, room=None):
+    """The scan straight from the database - used when the scanner cache can't answer it."""
     conn = get_db_connection()
-    active_session = conn.execute("SELECT id, course_id FROM sessions WHERE is_active = 1").fetchone()
+    active_session = conn.execute(ACTIVE_SESSION_FOR_ROOM_SQL, (room,)).fetchone()
     
     if not active_session:
         logger.warning(f"Attendance failed - No active session")
@@ -3614,32 +3874,24 @@ def mark_attendance_by_roll_id():
         return jsonify({"status": "not_enrolled", "message": "Not Enrolled"})
 
     student_id = enrollment['student_id']
+    # The cache missed an enrollment or session the database has - reload it on the next scan
+    scanner_cache.invalidate("uncached scan found an enrollment")
 
-    existing_record = conn.execute(
-        "SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?",
-        (active_session['id'], student_id)
-    ).fetchone()
-
-    if existing_record:
-        logger.info(f"Attendance duplicate - Roll ID {class_roll_id}")
-        conn.close()
-        return jsonify({"status": "duplicate", "message": "Already Marked"})
+    conn.close()
     
-    # ✅ INSERT ATTENDANCE RECORD
-    conn.execute(
-        "INSERT INTO attendance_records (session_id, student_id, override_method) VALUES (?, ?, ?)",
-        (active_session['id'], student_id, 'biometric')
-    )
-    conn.commit()
+    # ✅ INSERT ATTENDANCE RECORD (UNIQUE index turns a re-scan into a no-op)
+    inserted = attendance_writer.insert(active_session['id'], student_id, 'biometric')
     
-    conn.close()
+    if not inserted:
+        logger.info(f"Attendance duplicate - Roll ID {class_roll_id}")
+        return jsonify({"status": "duplicate", "message": "Already Marked"})
     logger.info(f"Attendance marked - Roll ID {class_roll_id}")
+    event_hub.publish(active_session['id'], 'attendance')
     
     return jsonify({"status": "success", "message": "Marked"})
 
     
 
-
 @app.route('/api/bulk-mark-attendance', methods=['POST'])
 def bulk_mark_attendance():
     """
@@ -3674,16 +3926,18 @@ def bulk_mark_attendance():
             logger.warning("Bulk sync failed - Invalid or empty roll_ids")
             return jsonify({"error": "No roll IDs provided or invalid format"}), 400
         
-        logger.info(f"[BULK SYNC] Processing {len(roll_ids)} roll IDs: {roll_ids}")
-        
         conn = get_db_connection()
         
-        # Find active session
-        active_session = conn.execute(
-            "SELECT id, course_id FROM sessions WHERE is_active = 1"
-        ).fetchone()
+        # The scanner's room session, roster and marked students from the scanner cache -
+        # confirmed with one query, since another server process may have ended the session
+        room = calling_device_room()
+        active = scanner_cache.active_session(room)
+        if active and not conn.execute("SELECT 1 FROM sessions WHERE id = ? AND is_active = 1",
+                                       (active.session_id,)).fetchone():
+            scanner_cache.stale(f"bulk sync: session {active.session_id} no longer active")
+            active = scanner_cache.reload(room)
         
-        if not active_session:
+        if not active:
             conn.close()
             logger.warning("Bulk sync failed - No active session")
             return jsonify({
@@ -3692,76 +3946,92 @@ def bulk_mark_attendance():
                 "failed": roll_ids
             }), 400
         
-        session_id = active_session['id']
-        course_id = active_session['course_id']
-        
-        success_count = 0
-        failed_ids = []
-        details = {}
+        session_id = active.session_id
+        course_id = active.course_id
         
-        # Process each roll ID
+        # Validate roll IDs (integers only) - None marks an invalid entry, with its reason in `invalid`
+        parsed_rolls = []
+        invalid = {}
         for roll_id in roll_ids:
             try:
-                # Validate roll_id is an integer
-                roll_id = int(roll_id)
-                
-                # Check enrollment
-                enrollment = conn.execute("""
-                    SELECT student_id 
-                    FROM enrollments 
-                    WHERE course_id = ? AND class_roll_id = ?
-                """, (course_id, roll_id)).fetchone()
-                
-                if not enrollment:
-                    failed_ids.append(roll_id)
-                    details[str(roll_id)] = "not_enrolled"
-                    logger.warning(f"  [FAILED] Roll {roll_id} not enrolled in course {course_id}")
-                    continue
-                
-                student_id = enrollment['student_id']
-                
-                # Check for duplicate
-                existing = conn.execute("""
-                    SELECT id FROM attendance_records 
-                    WHERE session_id = ? AND student_id = ?
-                """, (session_id, student_id)).fetchone()
-                
-                if existing:
-                    # Already marked - consider it success (idempotent behavior)
-                    success_count += 1
-                    details[str(roll_id)] = "already_marked"
-                    logger.info(f"  [SKIPPED] Roll {roll_id} already marked - skipping")
-                    continue
-                
-                # Insert attendance record
-                conn.execute("""
-                    INSERT INTO attendance_records 
-                    (session_id, student_id, override_method, timestamp) 
-                    VALUES (?, ?, 'biometric_queue', CURRENT_TIMESTAMP)
-                """, (session_id, student_id))
-                
-                # Log success
-                logger.info(f"  [SUCCESS] Roll {roll_id} marked")
-                
-                success_count += 1
-                details[str(roll_id)] = "success"
-                
+                parsed_rolls.append(int(roll_id))
             except ValueError:
-                failed_ids.append(roll_id)
-                details[str(roll_id)] = "invalid_roll_id"
-                logger.error(f"  [ERROR] Invalid roll ID format: {roll_id}")
+                parsed_rolls.append(None)
+                invalid[len(parsed_rolls) - 1] = "invalid_roll_id"
             except Exception as e:
+                parsed_rolls.append(None)
+                invalid[len(parsed_rolls) - 1] = f"error: {str(e)}"
+        valid_rolls = [roll_id for roll_id in parsed_rolls if roll_id is not None]
+        
+        # One enrollment lookup: the cached roster, plus a single query for rolls the cache doesn't know
+        roll_students = {roll_id: active.student_for_roll(roll_id) for roll_id in valid_rolls}
+        unknown_rolls = [roll_id for roll_id, student_id in roll_students.items() if student_id is None]
+        if unknown_rolls:
+            placeholders = ','.join('?' * len(unknown_rolls))
+            found = {row['class_roll_id']: row['student_id'] for row in conn.execute(f"""
+                SELECT class_roll_id, student_id FROM enrollments
+                WHERE course_id = ? AND class_roll_id IN ({placeholders})
+            """, (course_id, *unknown_rolls))}
+            if found:
+                roll_students.update(found)
+                scanner_cache.invalidate("bulk sync found an uncached enrollment")
+        
+        # One transaction: which students are already marked, then one executemany insert.
+        # The database decides, not the cached marked set - another process may have deleted a record.
+        candidates = {student_id for student_id in roll_students.values() if student_id is not None}
+        newly_marked = []
+        if candidates:
+            placeholders = ','.join('?' * len(candidates))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                already_marked = {row['student_id'] for row in conn.execute(f"""
+                    SELECT student_id FROM attendance_records
+                    WHERE session_id = ? AND student_id IN ({placeholders})
+                """, (session_id, *candidates))}
+                newly_marked = sorted(candidates - already_marked)
+                conn.executemany("""
+                    INSERT OR IGNORE INTO attendance_records 
+                    (session_id, student_id, override_method, timestamp) 
+                    VALUES (?, ?, 'biometric_queue', CURRENT_TIMESTAMP)
+                """, [(session_id, student_id) for student_id in newly_marked])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        conn.close()
+        
+        # Per-roll details from the result sets - a roll sent twice is "already_marked" the second time
+        success_count = 0
+        failed_ids = []
+        details = {}
+        pending = set(newly_marked)
+        for index, roll_id in enumerate(parsed_rolls):
+            if roll_id is None:
+                failed_ids.append(roll_ids[index])
+                details[str(roll_ids[index])] = invalid[index]
+                continue
+            student_id = roll_students[roll_id]
+            if student_id is None:
                 failed_ids.append(roll_id)
-                details[str(roll_id)] = f"error: {str(e)}"
-                logger.error(f"  [ERROR] Error processing roll {roll_id}: {e}")
+                details[str(roll_id)] = "not_enrolled"
+                continue
+            success_count += 1
+            if student_id in pending:
+                pending.discard(student_id)
+                details[str(roll_id)] = "success"
+            else:
+                details[str(roll_id)] = "already_marked"
         
-        # Commit all changes at once (transaction)
-        conn.commit()
-        conn.close()
+        if newly_marked:
+            scanner_cache.note_marked(session_id, newly_marked)
+            event_hub.publish(session_id, 'attendance')
         
-        logger.info(f"[BULK SYNC] Complete - {success_count}/{len(roll_ids)} successful")
+        summary = (f"[BULK SYNC] Session {session_id} - {success_count}/{len(roll_ids)} successful "
+                   f"({len(newly_marked)} newly marked)")
         if failed_ids:
-            logger.warning(f"   Failed IDs: {failed_ids}")
+            logger.warning(f"{summary}, failed IDs: {failed_ids}")
+        else:
+            logger.info(summary)
         
         return jsonify({
             "success_count": success_count,
@@ -3781,46 +4051,52 @@ def bulk_mark_attendance():
 
 
 # --- Automatic Session Timeout ---
-def auto_expire_sessions():
+def sessions_auto_expired(session_ids):
+    """
+    Called by the session expiry scheduler right after it closed sessions whose
+    end_time passed (within a second). Pushes the change to dashboards and scanners.
     """
-    Background task that runs every 5 minutes.
-    Closes sessions that have passed their scheduled end_time.
-    This is a BACKUP - the frontend now triggers immediate expiry.
+    for session_id in session_ids:
+        event_hub.publish(session_id, 'session')
+    scanner_cache.invalidate(f"session(s) {session_ids} auto-expired")
+    logger.info(f"Auto-closed {len(session_ids)} session(s)")
+
+# --- Periodic WAL Checkpoint ---
+def checkpoint_database():
+    """
+    Background task that folds the WAL file back into the main database.
+    PASSIVE mode never blocks readers or the scanner's writes.
     """
     try:
         conn = get_db_connection()
-        now = get_ist_now()
-        now_str = now.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Find ACTIVE sessions that are past their end_time
-        expired_sessions = conn.execute("""
-            SELECT id, course_id, start_time, end_time 
-            FROM sessions 
-            WHERE is_active = 1 
-            AND datetime(end_time) < datetime(?)
-        """, (now_str,)).fetchall()
-        
-        if expired_sessions:
-            # ONLY log if sessions were actually expired
-            for session in expired_sessions:
-                logger.warning(f"BACKUP Auto-close: Session {session['id']}, "
-                             f"Course {session['course_id']}, "
-                             f"End: {session['end_time']}")
-            
-            conn.execute("""
-                UPDATE sessions 
-                SET is_active = 0 
-                WHERE is_active = 1 
-                AND datetime(end_time) < datetime(?)
-            """, (now_str,))
-            conn.commit()
-            
-            logger.info(f"Auto-closed {len(expired_sessions)} session(s)")
-        
-        # REMOVED: "Auto-expire check running" log - too noisy
+        busy, wal_frames, checkpointed = checkpoint_wal(conn)
+        conn.close()
+        if busy or checkpointed < wal_frames:
+            logger.info(f"[DB] WAL checkpoint partial - {checkpointed}/{wal_frames} frames (readers active)")
+    except Exception as e:
+        logger.error(f"Error in checkpoint_database: {e}", exc_info=True)
+
+def prune_attendance_changes():
+    """Background task that trims the attendance change log read by the matrix store."""
+    try:
+        conn = get_db_connection()
+        removed = prune_change_log(conn)
         conn.close()
+        if removed:
+            logger.info(f"[MATRIX] Pruned {removed} old attendance change-log rows")
     except Exception as e:
-        logger.error(f"Error in auto_expire_sessions: {e}", exc_info=True)
+        logger.error(f"Error in prune_attendance_changes: {e}", exc_info=True)
+
+def cleanup_export_jobs():
+    """Background task that deletes expired export zips and fails export jobs that stopped progressing."""
+    try:
+        conn = get_db_connection()
+        removed = export_jobs.cleanup(conn, Config.EXPORT_RETENTION_HOURS)
+        conn.close()
+        if removed:
+            logger.info(f"[EXPORT] Removed {removed} expired export job(s)")
+    except Exception as e:
+        logger.error(f"Error in cleanup_export_jobs: {e}", exc_info=True)
 
 # =================================================================
 #   SCHEDULED EMAIL TASKS
@@ -3837,14 +4113,37 @@ def auto_expire_sessions():
 
 
 
+# Session expiry: timer heap of active sessions' end times, rebuilt from the database at boot
+session_expiry = SessionExpiryScheduler(db_pool.connection, get_ist_now, on_expired=sessions_auto_expired,
+                                        resync_seconds=Config.SESSION_EXPIRY_RESYNC_SECONDS)
+session_expiry.start()
+atexit.register(session_expiry.shutdown)
+
 # Create and configure the background scheduler
 scheduler = BackgroundScheduler()
+if Config.WAL_CHECKPOINT_MINUTES > 0:
+    scheduler.add_job(
+        func=checkpoint_database,
+        trigger="interval",
+        minutes=Config.WAL_CHECKPOINT_MINUTES,
+        id='checkpoint_database',
+        name='Checkpoint SQLite WAL',
+        replace_existing=True
+    )
+scheduler.add_job(
+    func=prune_attendance_changes,
+    trigger="interval",
+    hours=1,
+    id='prune_attendance_changes',
+    name='Prune attendance change log',
+    replace_existing=True
+)
 scheduler.add_job(
-    func=auto_expire_sessions,
+    func=cleanup_export_jobs,
     trigger="interval",
-    minutes=5,
-    id='auto_expire_sessions',
-    name='Auto-close expired sessions',
+    hours=1,
+    id='cleanup_export_jobs',
+    name='Clean up export jobs',
     replace_existing=True
 )
 # Email jobs removed
@@ -3863,93 +4162,7 @@ atexit.register(lambda: scheduler.shutdown())
 
 # =================================================================
 #   Main Execution Block
-# =================================================================# --- Leaderboard Helper Functions ---
-
-def calculate_streaks(conn, student_id, course_id):
-    """Calculate current and longest attendance streaks for a student in a course."""
-    sessions = conn.execute("""
-        SELECT s.id, s.start_time
-        FROM sessions s
-        WHERE s.course_id = ?
-        ORDER BY s.start_time DESC
-    """, (course_id,)).fetchall()
-    
-    current_streak = 0
-    longest_streak = 0
-    temp_streak = 0
-    
-    for session in sessions:
-        record = conn.execute(
-            "SELECT id FROM attendance_records WHERE session_id = ? AND student_id = ?",
-            (session['id'], student_id)
-        ).fetchone()
-        
-        if record:  # Present
-            temp_streak += 1
-            current_streak = temp_streak
-        else:  # Absent
-            longest_streak = max(longest_streak, temp_streak)
-            temp_streak = 0
-            if current_streak > 0:
-                break  # Stop counting current streak at first absence
-    
-    longest_streak = max(longest_streak, temp_streak)
-    
-    return {
-        'current_streak': current_streak,
-        'longest_streak': longest_streak
-    }
-
-def generate_badges(attendance_pct, current_streak, longest_streak, conn, student_id, course_id):
-    """Generate badges based on attendance and streak achievements."""
-    badges = []
-    
-    # FIRST_STEP: First class attended
-    first_attendance = conn.execute(
-        "SELECT id FROM attendance_records WHERE student_id = ? LIMIT 1",
-        (student_id,)
-    ).fetchone()
-    if first_attendance:
-        badges.append({
-            'type': 'FIRST_STEP',
-            'icon': '🎯',
-            'description': 'First class attended'
-        })
-    
-    # CONSISTENT: 5+ current streak
-    if current_streak >= 5:
-        badges.append({
-            'type': 'CONSISTENT',
-            'icon': '🔥',
-            'description': f'{current_streak} day streak'
-        })
-    
-    # PERFECT_WEEK: 7-day streak
-    if current_streak >= 7:
-        badges.append({
-            'type': 'PERFECT_WEEK',
-            'icon': '⭐',
-            'description': '7 day perfect streak'
-        })
-    
-    # IRON_STREAK: 15+ day streak
-    if longest_streak >= 15:
-        badges.append({
-            'type': 'IRON_STREAK',
-            'icon': '💪',
-            'description': '15+ day iron streak'
-        })
-    
-    # PERFECT_MONTH: High attendance (90%+)
-    if attendance_pct >= 90:
-        badges.append({
-            'type': 'PERFECT_MONTH',
-            'icon': '👑',
-            'description': '90%+ attendance'
-        })
-    
-    return badges
-
+# =================================================================
 import traceback
 
 @app.route('/api/student/leaderboard', methods=['GET'])
@@ -3971,169 +4184,39 @@ def get_leaderboard(user_data):
         
         conn = get_db_connection()
         
-        # Build query to get all enrolled students with attendance data
-        if course_id:
-            # Get students enrolled in specific course
-            students_query = """
-                SELECT DISTINCT e.student_id, s.student_name
-                FROM enrollments e
-                JOIN students s ON e.student_id = s.id
-                WHERE e.course_id = ?
-            """
-            params = [course_id]
-            query_type = 'course'
-        elif semester_id:
-            # Get students in specific semester
-            # FIX: Join with courses table since enrollments table doesn't have semester_id
-            students_query = """
-                SELECT DISTINCT e.student_id, s.student_name
-                FROM enrollments e
-                JOIN students s ON e.student_id = s.id
-                JOIN courses c ON e.course_id = c.id
-                WHERE c.semester_id = ?
-            """
-            params = [semester_id]
-            query_type = 'semester'
-        else:
-            # Get all students (global leaderboard)
-            students_query = "SELECT id as student_id, student_name FROM students"
-            params = []
-            query_type = 'global'
-        
-        students = conn.execute(students_query, params).fetchall()
-        
-        # Pre-fetch context data (courses and sessions) to avoid N+1 queries
-        target_course_ids = []
-        target_session_ids = []
+        # Ranked board for this scope - cached until attendance data changes
+        scope, scope_id = resolve_scope(course_id, semester_id)
+        board = leaderboard_engine.get(conn, scope, scope_id)
+        conn.close()
         
-        if query_type == 'course':
-            target_course_ids = [course_id]
-            sessions = conn.execute("SELECT id FROM sessions WHERE course_id = ?", (course_id,)).fetchall()
-            target_session_ids = [s['id'] for s in sessions]
-            
-        elif query_type == 'semester':
-            # Get all courses in this semester
-            courses_in_semester = conn.execute(
-                "SELECT id FROM courses WHERE semester_id = ?",
-                (semester_id,)
-            ).fetchall()
-            target_course_ids = [c['id'] for c in courses_in_semester]
-            
-            if target_course_ids:
-                placeholders = ','.join(['?'] * len(target_course_ids))
-                sessions = conn.execute(
-                    f"SELECT id FROM sessions WHERE course_id IN ({placeholders})",
-                    target_course_ids
-                ).fetchall()
-                target_session_ids = [s['id'] for s in sessions]
-            else:
-                target_session_ids = []
-                
-        else: # global
-            sessions = conn.execute("SELECT id FROM sessions").fetchall()
-            target_session_ids = [s['id'] for s in sessions]
-
-        leaderboard_data = []
         user_rank_info = None
         user_stats = None
         user_badges = []
         
-        # Optimization: If we have no sessions to check against (e.g. empty semester), 
-        # we can skip detailed calculation or handle gracefully
-        
-        for student in students:
-            sid = student['student_id']
-            
-            # Skip students in semester view if there are no courses/sessions
-            if query_type == 'semester' and not target_course_ids:
-                continue
-
-            total_sessions = len(target_session_ids)
-            
-            if total_sessions > 0:
-                # Chunking session_ids to avoid SQLite limit (999 variables) if necessary
-                # But for now assuming session count isn't massive. 
-                # If massive, we should change logic to count using JOINs instead of IN clause.
-                
-                if len(target_session_ids) > 900:
-                    # Fallback for large datasets: use a loop or better query
-                    # For safety/simplicity in this fix, we'll slice it or just log warning
-                    # Better approach:
-                    # SELECT COUNT(*) FROM attendance_records WHERE student_id=? AND session_id IN (...)
-                    pass 
-
-                present_count = conn.execute(
-                    f"SELECT COUNT(id) as count FROM attendance_records WHERE student_id = ? AND session_id IN ({','.join(['?']*len(target_session_ids))})",
-                    [sid] + target_session_ids
-                ).fetchone()['count']
-            else:
-                present_count = 0
-            
-            attendance_pct = (present_count / total_sessions * 100) if total_sessions > 0 else 0
-            
-            # Calculate streaks
-            if query_type == 'course' and course_id:
-                streaks = calculate_streaks(conn, sid, course_id)
-            elif query_type == 'semester' and target_course_ids:
-                # For semester view, use first course's streaks (Legacy logic maintained)
-                streaks = calculate_streaks(conn, sid, target_course_ids[0])
-            else:
-                # For global, use any course
-                any_course = conn.execute("SELECT id FROM courses LIMIT 1").fetchone()
-                streaks = calculate_streaks(conn, sid, any_course['id']) if any_course else {'current_streak': 0, 'longest_streak': 0}
-            
-            # Generate badges
-            badge_course_id = course_id or (target_course_ids[0] if target_course_ids else 1)
-            badges = generate_badges(attendance_pct, streaks['current_streak'], streaks['longest_streak'], conn, sid, badge_course_id)
-            
-            # Add to leaderboard
-            leaderboard_data.append({
-                'student_id': sid,
-                'student_name': student['student_name'],
-                'attendance_percentage': round(attendance_pct, 1),
-                'present_count': present_count,
-                'total_sessions': total_sessions,
-                'current_streak': streaks['current_streak'],
-                'longest_streak': streaks['longest_streak'],
-                'badges': badges
-            })
-            
-            # Store user's data for later
-            if sid == student_id:
-                user_stats = {
-                    'attendance_percentage': round(attendance_pct, 1),
-                    'current_streak': streaks['current_streak'],
-                    'longest_streak': streaks['longest_streak'],
-                    'present_count': present_count,
-                    'total_sessions': total_sessions
-                }
-                user_badges = badges
-        
-        # Sort by: attendance % DESC, then streak DESC, then present count DESC
-        leaderboard_data.sort(key=lambda x: (-x['attendance_percentage'], -x['current_streak'], -x['present_count']))
-        
-        # Assign ranks and find user's rank
-        for idx, entry in enumerate(leaderboard_data):
-            entry['rank'] = idx + 1
-            if entry['student_id'] == student_id:
-                user_rank_info = {
-                    'rank': idx + 1,
-                    'position': idx + 1,
-                    'percentile': round((idx / len(leaderboard_data) * 100)) if leaderboard_data else 0,
-                    'total_students': len(leaderboard_data)
-                }
-        
-        # Trim to limit
-        leaderboard_display = leaderboard_data[:limit]
-        
-        conn.close()
+        idx = board.position(student_id)
+        if idx is not None:
+            entry = board.entries[idx]
+            user_rank_info = {
+                'rank': idx + 1,
+                'position': idx + 1,
+                'percentile': round((idx / len(board) * 100)),
+                'total_students': len(board)
+            }
+            user_stats = {
+                'attendance_percentage': entry['attendance_percentage'],
+                'current_streak': entry['current_streak'],
+                'longest_streak': entry['longest_streak'],
+                'present_count': entry['present_count'],
+                'total_sessions': entry['total_sessions']
+            }
+            user_badges = entry['badges']
         
         return jsonify({
             'user_rank': user_rank_info or {'rank': 0, 'position': 0, 'percentile': 0, 'total_students': 0},
             'user_stats': user_stats or {'attendance_percentage': 0, 'current_streak': 0, 'longest_streak': 0, 'present_count': 0, 'total_sessions': 0},
             'user_badges': user_badges,
-            'leaderboard': leaderboard_display,
-            'total_on_leaderboard': len(leaderboard_data),
+            'leaderboard': board.entries[:limit],
+            'total_on_leaderboard': len(board),
             'course_id': course_id,
             'semester_id': semester_id
         })
@@ -4147,6 +4230,8 @@ def get_leaderboard(user_data):
 #   Server Startup
 # =================================================================
 
+logger.info(f"[STARTUP] Server module loaded in {_import_timer.elapsed_ms():.0f}ms")
+
 if __name__ == '__main__':
     # Start auto-sync if configured (local server only)
     if not Config.IS_CLOUD_SERVER and Config.CLOUD_SERVER_URL and Config.SYNC_INTERVAL_SECONDS > 0:
@@ -0,0 +1,193 @@
+# =================================================================
+#   A.R.I.S.E. - Session Expiry Scheduler
+#   Ends each active session within a second of its end_time, instead
+#   of a full-table scan every 5 minutes
+#
+#   Architecture:
+#     boot / resync ------------> rebuild(): active sessions from the DB
+#     start / extend session ---> schedule(session_id, end_time)
+#     end / delete session -----> cancel(session_id)
+#        timer thread: min-heap of (end_time, session_id), sleeps until
+#        the earliest deadline --> UPDATE ... WHERE is_active = 1 AND
+#        end_time has passed --> on_expired([session_id, ...])
+#
+#   The UPDATE re-checks end_time in the database, so a session that
+#   another server process extended is re-scheduled, not closed. Each
+#   process also rebuilds its heap every resync_seconds to pick up
+#   sessions started elsewhere - expiring twice is a no-op.
+# =================================================================
+
+import time
+import heapq
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_EXPIRE_SQL = """
+    UPDATE sessions SET is_active = 0
+    WHERE id = ? AND is_active = 1 AND datetime(end_time) <= datetime(?)
+"""
+
+
+def parse_end_time(value):
+    """end_time column value -> naive datetime, or None if missing / unparseable."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class SessionExpiryScheduler:
+    """
+    In-process timer heap of active sessions' end times. `now` returns the
+    current time in the same (naive, local) timezone as sessions.end_time.
+    """
+
+    def __init__(self, connect, now, on_expired=None, resync_seconds=60):
+        self.connect = connect          # Returns a pooled connection (closed after use)
+        self.now = now
+        self.on_expired = on_expired    # Called with the list of session ids closed by a tick
+        self.resync_seconds = resync_seconds
+        self._heap = []                 # (deadline, session_id), may hold outdated entries
+        self._deadlines = {}            # session_id -> current deadline
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._stats = {'expired': 0, 'rescheduled': 0, 'rebuilds': 0, 'max_lateness_ms': 0}
+
+    def start(self):
+        """Rebuilds the heap from the database and starts the timer thread."""
+        self.rebuild()
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='session-expiry', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            thread, self._thread = self._thread, None
+            self._cond.notify()
+        if thread is not None:
+            thread.join(2)
+
+    def schedule(self, session_id, end_time):
+        """(Re)sets a session's deadline - end_time as a datetime or a sessions.end_time string."""
+        deadline = end_time if isinstance(end_time, datetime.datetime) else parse_end_time(end_time)
+        with self._cond:
+            if deadline is None:
+                self._deadlines.pop(session_id, None)
+                return
+            self._deadlines[session_id] = deadline
+            heapq.heappush(self._heap, (deadline, session_id))
+            if self._heap[0] == (deadline, session_id):
+                self._cond.notify()   # New earliest deadline - wake the timer
+
+    def cancel(self, session_id):
+        """The session ended some other way (its heap entry is skipped when it comes up)."""
+        with self._cond:
+            self._deadlines.pop(session_id, None)
+
+    def rebuild(self):
+        """Replaces the heap with the active sessions in the database."""
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT id, end_time FROM sessions WHERE is_active = 1").fetchall()
+        finally:
+            conn.close()
+        deadlines = {}
+        for row in rows:
+            deadline = parse_end_time(row['end_time'])
+            if deadline is not None:
+                deadlines[row['id']] = deadline
+        with self._cond:
+            self._deadlines = deadlines
+            self._heap = [(deadline, session_id) for session_id, deadline in deadlines.items()]
+            heapq.heapify(self._heap)
+            self._stats['rebuilds'] += 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['scheduled'] = len(self._deadlines)
+            next_deadline = min(self._deadlines.values(), default=None)
+        stats['next_deadline'] = next_deadline.strftime('%Y-%m-%d %H:%M:%S') if next_deadline else None
+        stats['resync_seconds'] = self.resync_seconds
+        return stats
+
+    # --- Timer thread ---
+
+    def _run(self):
+        next_resync = time.monotonic() + self.resync_seconds
+        while True:
+            with self._cond:
+                while self._running:
+                    wait = next_resync - time.monotonic()
+                    if self._heap:
+                        wait = min(wait, (self._heap[0][0] - self.now()).total_seconds())
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+                due = self._pop_due()
+
+            try:
+                if due:
+                    self._expire(due)
+                if time.monotonic() >= next_resync:
+                    self.rebuild()
+                    next_resync = time.monotonic() + self.resync_seconds
+            except Exception as e:
+                # Database busy or gone - try again at the next resync
+                logger.error(f"[EXPIRY] Expiry tick failed: {e}", exc_info=True)
+                next_resync = time.monotonic() + self.resync_seconds
+
+    def _pop_due(self):
+        """Current (not outdated) heap entries whose deadline has passed. Caller holds the lock."""
+        now = self.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(self._heap)
+            if self._deadlines.get(session_id) == deadline:
+                del self._deadlines[session_id]
+                due.append((session_id, deadline))
+        return due
+
+    def _expire(self, due):
+        now = self.now()
+        expired, lateness, rescheduled = [], [], []
+        conn = self.connect()
+        try:
+            for session_id, deadline in due:
+                if conn.execute(_EXPIRE_SQL, (session_id, now.strftime('%Y-%m-%d %H:%M:%S'))).rowcount:
+                    expired.append(session_id)
+                    lateness.append(int((now - deadline).total_seconds() * 1000))
+                    continue
+                # Still active with a later end_time (extended by another process) -> wait for that
+                row = conn.execute("SELECT end_time FROM sessions WHERE id = ? AND is_active = 1",
+                                   (session_id,)).fetchone()
+                if row is not None:
+                    rescheduled.append((session_id, parse_end_time(row['end_time'])))
+            conn.commit()
+        finally:
+            conn.close()
+
+        for session_id, end_time in rescheduled:
+            # Never re-arm in the past (sub-second rounding) - that would spin the timer
+            self.schedule(session_id, max(end_time, now + datetime.timedelta(seconds=1)) if end_time else None)
+        for session_id, lateness_ms in zip(expired, lateness):
+            logger.info(f"[EXPIRY] Session {session_id} auto-closed ({lateness_ms} ms after end time)")
+        with self._cond:
+            self._stats['expired'] += len(expired)
+            self._stats['rescheduled'] += len(rescheduled)
+            self._stats['max_lateness_ms'] = max([self._stats['max_lateness_ms']] + lateness)
+        if expired and self.on_expired is not None:
+            self.on_expired(expired)
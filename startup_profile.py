@@ -0,0 +1,69 @@
+# =================================================================
+#   A.R.I.S.E. - Startup Profiling
+#   Measures how long each top-level import takes while the server
+#   module loads, so slow imports show up in the boot log
+#
+#   Heavy libraries (matplotlib, openpyxl) are imported on first use,
+#   not at boot - a regression shows up here as a slow entry.
+# =================================================================
+
+import sys
+import time
+import builtins
+import threading
+
+
+class ImportTimer:
+    """
+    Wraps builtins.__import__ while active and records the wall time of every
+    module imported for the first time. Nested imports are counted in the
+    module that triggered them (flask includes werkzeug, ...). Stop it before
+    the program starts threads or forks - only the importing thread is timed.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.started_at = None
+        self._original_import = builtins.__import__   # Kept after stop() for calls still in progress
+        self._active = False
+        self._local = threading.local()               # Nesting depth per thread
+
+    def start(self):
+        if self._active:
+            return
+        self.started_at = time.perf_counter()
+        self._original_import = builtins.__import__
+        self._active = True
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """Restores builtins.__import__ (elapsed_ms() keeps counting from start())."""
+        if self._active:
+            self._active = False
+            if builtins.__import__ == self._timed_import:
+                builtins.__import__ = self._original_import
+
+    def elapsed_ms(self):
+        """Milliseconds since start()."""
+        return (time.perf_counter() - self.started_at) * 1000 if self.started_at else 0
+
+    def slowest(self, count=8):
+        """[(module, ms), ...] for the slowest imports, slowest first."""
+        ranked = sorted(self.timings.items(), key=lambda item: item[1], reverse=True)
+        return [(name, round(seconds * 1000, 1)) for name, seconds in ranked[:count]]
+
+    def summary(self, count=8):
+        return ', '.join(f"{name} {ms:.0f}ms" for name, ms in self.slowest(count))
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        depth = getattr(self._local, 'depth', 0)
+        if not self._active or depth or level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = depth
+            self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start
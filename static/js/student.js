@@ -298,6 +298,78 @@ document.addEventListener('DOMContentLoaded', () => {
     return courseCard;
   }
 
+  // Render one page of attendance log entries
+  function renderAttendanceLog(logContainer, entries) {
+    entries.forEach((entry) => {
+      const dateObj = new Date(entry.date);
+      const dateStr = dateObj.toLocaleDateString('en-GB', {
+        day: '2-digit',
+        month: 'short',
+        year: 'numeric',
+      });
+      const timeStr = dateObj.toLocaleTimeString('en-GB', {
+        hour: '2-digit',
+        minute: '2-digit',
+        hour12: false,
+      });
+
+      const logItem = document.createElement('div');
+      logItem.className = 'stat-card';
+      logItem.style.display = 'flex';
+      logItem.style.justifyContent = 'space-between';
+      logItem.style.alignItems = 'center';
+
+      const icon = entry.status === 'Present' ? '✅' : '❌';
+      const color =
+        entry.status === 'Present'
+          ? 'var(--success-color)'
+          : 'var(--danger-color)';
+
+      logItem.innerHTML = `
+                  <span>
+                    ${dateStr} <span style="color: var(--text-light); font-size: 0.95em;">(${timeStr})</span>
+                  </span>
+                  <span style="color: ${color}; font-weight: bold;">
+                      ${icon} ${entry.status}
+                  </span>
+              `;
+      logContainer.appendChild(logItem);
+    });
+  }
+
+  // Adds a "Load older" button that fetches the next page of the log
+  function appendLoadMoreButton(logContainer, courseId, before) {
+    const button = document.createElement('button');
+    button.className = 'button-secondary';
+    button.style.width = '100%';
+    button.style.marginTop = '10px';
+    button.textContent = 'Load older classes';
+    button.addEventListener('click', async () => {
+      button.disabled = true;
+      button.textContent = 'Loading...';
+      try {
+        const params = new URLSearchParams({ before });
+        const response = await fetch(
+          `/api/student/course/${courseId}?${params}`,
+          { headers: { Authorization: `Bearer ${token}` } },
+        );
+        const data = await response.json();
+        // Ignore the page if the user already opened another course
+        if (currentCourseId !== courseId) return;
+        button.remove();
+        renderAttendanceLog(logContainer, data.log);
+        if (data.has_more) {
+          appendLoadMoreButton(logContainer, courseId, data.next_before);
+        }
+      } catch (error) {
+        console.error('Course log page error:', error);
+        button.disabled = false;
+        button.textContent = 'Load older classes';
+      }
+    });
+    logContainer.appendChild(button);
+  }
+
   // Load course detail
   async function loadCourseDetail(courseId) {
     currentCourseId = courseId;
@@ -319,41 +391,10 @@ document.addEventListener('DOMContentLoaded', () => {
       const logContainer = document.getElementById('attendance-log');
       logContainer.innerHTML = '';
 
-      data.log.forEach((entry) => {
-        const dateObj = new Date(entry.date);
-        const dateStr = dateObj.toLocaleDateString('en-GB', {
-          day: '2-digit',
-          month: 'short',
-          year: 'numeric',
-        });
-        const timeStr = dateObj.toLocaleTimeString('en-GB', {
-          hour: '2-digit',
-          minute: '2-digit',
-          hour12: false,
-        });
-
-        const logItem = document.createElement('div');
-        logItem.className = 'stat-card';
-        logItem.style.display = 'flex';
-        logItem.style.justifyContent = 'space-between';
-        logItem.style.alignItems = 'center';
-
-        const icon = entry.status === 'Present' ? '✅' : '❌';
-        const color =
-          entry.status === 'Present'
-            ? 'var(--success-color)'
-            : 'var(--danger-color)';
-
-        logItem.innerHTML = `
-                    <span>
-                      ${dateStr} <span style="color: var(--text-light); font-size: 0.95em;">(${timeStr})</span>
-                    </span>
-                    <span style="color: ${color}; font-weight: bold;">
-                        ${icon} ${entry.status}
-                    </span>
-                `;
-        logContainer.appendChild(logItem);
-      });
+      renderAttendanceLog(logContainer, data.log);
+      if (data.has_more) {
+        appendLoadMoreButton(logContainer, courseId, data.next_before);
+      }
 
       showView('courseDetail');
     } catch (error) {
@@ -76,6 +76,8 @@ document.addEventListener('DOMContentLoaded', () => {
   const sessionDateInput = document.getElementById('session-date-input');
   const durationInput = document.getElementById('duration-input');
   const topicInput = document.getElementById('topic-input');
+  const roomInput = document.getElementById('room-input');
+  const roomOptions = document.getElementById('room-options');
   const confirmSetupButton = document.getElementById('confirm-setup-button');
   const backToSetupButton = document.getElementById('back-to-setup-button');
   const startOfflineButton = document.getElementById('start-offline-button');
@@ -261,6 +263,23 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Classrooms with a scanner assigned - suggestions for the optional room field
+  async function loadRoomOptions() {
+    if (!roomOptions) return;
+    try {
+      const response = await fetch('/api/teacher/rooms');
+      const rooms = await response.json();
+      roomOptions.innerHTML = '';
+      rooms.forEach(room => {
+        const option = document.createElement('option');
+        option.value = room;
+        roomOptions.appendChild(option);
+      });
+    } catch (err) {
+      console.error('Failed to load rooms:', err);
+    }
+  }
+
   function renderDropdownOptions(courses) {
     courseDropdownOptions.innerHTML = '';
 
@@ -375,6 +394,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
   async function initializeApp() {
     await loadCourseCodes();
+    loadRoomOptions();
 
     const storedState = loadState();
 
@@ -636,10 +656,8 @@ document.addEventListener('DOMContentLoaded', () => {
       switchHomeScreen('online-live');
       saveState();
 
-      // Start OTP rotation
-      startOtpRotation();
-      // Start live attendance polling
-      startOnlineStatusPolling();
+      // Live attendance + OTP rotation (pushed over SSE, polled if the stream is unavailable)
+      startOnlineLiveUpdates();
       // Start countdown timer
       startCountdownTimer();
 
@@ -649,6 +667,13 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  function showOtp(otp, timeRemaining) {
+    document.getElementById('online-otp-code').textContent = otp;
+    // Update timer bar
+    const pct = (timeRemaining / 30) * 100;
+    document.getElementById('otp-timer-fill').style.width = `${pct}%`;
+  }
+
   function startOtpRotation() {
     if (onlineOtpInterval) clearInterval(onlineOtpInterval);
 
@@ -658,10 +683,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const res = await fetch(`/api/online/session/${sessionState.sessionToken}/otp`);
         if (res.ok) {
           const data = await res.json();
-          document.getElementById('online-otp-code').textContent = data.otp;
-          // Update timer bar
-          const pct = (data.time_remaining / 30) * 100;
-          document.getElementById('otp-timer-fill').style.width = `${pct}%`;
+          showOtp(data.otp, data.time_remaining);
         }
       } catch (_) { /* silent */ }
     }
@@ -670,46 +692,64 @@ document.addEventListener('DOMContentLoaded', () => {
     onlineOtpInterval = setInterval(refreshOtp, 2000);
   }
 
+  // Online dashboard data: full roster and marked students (newest first)
+  let onlineRoster = [];
+  let onlineMarked = [];
+
+  function renderOnlineStatus() {
+    document.getElementById('online-attendance-count').textContent = onlineMarked.length;
+
+    // Update marked students table
+    const markedTbody = document.querySelector('#online-students-table tbody');
+    markedTbody.innerHTML = '';
+    onlineMarked.forEach(s => {
+      const row = document.createElement('tr');
+      const time = s.marked_at ? new Date(s.marked_at).toLocaleTimeString() : '';
+      row.innerHTML = `
+        <td>${s.class_roll_id || '-'}</td>
+        <td>${s.student_name}</td>
+        <td>${s.university_roll_no}</td>
+        <td>${time}</td>
+      `;
+      markedTbody.appendChild(row);
+    });
+
+    // Compute and render unmarked students
+    const markedRolls = new Set(onlineMarked.map(s => s.university_roll_no));
+    renderOnlineUnmarkedStudents(onlineRoster.filter(s => !markedRolls.has(s.university_roll_no)));
+  }
+
+  // Attendance cursor for ?since= polls (0 = full reload including the roster)
+  let onlineCursor = 0;
+
+  async function fetchOnlineStatus() {
+    const since = onlineCursor;
+    const res = await fetch(`/api/teacher/session/${sessionState.sessionId}/online-status?since=${since}`);
+    if (!res.ok) return null;
+    const data = await res.json();
+    document.getElementById('online-total-students').textContent = data.total_students;
+    if (since === 0) {
+      onlineRoster = data.all_students || [];
+      onlineMarked = data.marked_students || [];
+    } else {
+      onlineMarked = data.marked_students.concat(onlineMarked);
+    }
+    // A removed record can't be expressed as a delta - reload everything next time
+    onlineCursor = onlineMarked.length === data.marked_count ? data.last_record_id : 0;
+    renderOnlineStatus();
+    return data;
+  }
+
   function startOnlineStatusPolling() {
     if (onlineStatusInterval) clearInterval(onlineStatusInterval);
 
     async function refreshStatus() {
       if (!sessionState.sessionId) return;
       try {
-        const res = await fetch(`/api/teacher/session/${sessionState.sessionId}/online-status`);
-        if (res.ok) {
-          const data = await res.json();
-          document.getElementById('online-attendance-count').textContent = data.marked_count;
-          document.getElementById('online-total-students').textContent = data.total_students;
-
-          // Update marked students table
-          const markedTbody = document.querySelector('#online-students-table tbody');
-          markedTbody.innerHTML = '';
-          if (data.marked_students && data.marked_students.length > 0) {
-            data.marked_students.forEach(s => {
-              const row = document.createElement('tr');
-              const time = s.marked_at ? new Date(s.marked_at).toLocaleTimeString() : '';
-              row.innerHTML = `
-                <td>${s.class_roll_id || '-'}</td>
-                <td>${s.student_name}</td>
-                <td>${s.university_roll_no}</td>
-                <td>${time}</td>
-              `;
-              markedTbody.appendChild(row);
-            });
-          }
-
-          // Compute and render unmarked students
-          if (data.all_students) {
-            const markedRolls = new Set(data.marked_students.map(s => s.university_roll_no));
-            const unmarked = data.all_students.filter(s => !markedRolls.has(s.university_roll_no));
-            renderOnlineUnmarkedStudents(unmarked);
-          }
-
-          if (!data.is_active) {
-            clearInterval(onlineOtpInterval);
-            clearInterval(onlineStatusInterval);
-          }
+        const data = await fetchOnlineStatus();
+        if (data && !data.is_active) {
+          clearInterval(onlineOtpInterval);
+          clearInterval(onlineStatusInterval);
         }
       } catch (_) { /* silent */ }
     }
@@ -718,6 +758,49 @@ document.addEventListener('DOMContentLoaded', () => {
     onlineStatusInterval = setInterval(refreshStatus, 3000);
   }
 
+  async function startOnlineLiveUpdates() {
+    // Roster and current list once; after that the event stream only sends changes
+    onlineCursor = 0;
+    try {
+      await fetchOnlineStatus();
+    } catch (_) { /* silent */ }
+
+    openLiveEvents({
+      snapshot: (data) => {
+        onlineMarked = data.present.slice().reverse();
+        renderOnlineStatus();
+        handleOnlineSession(data);
+      },
+      attendance: (data) => {
+        if (data.present.length === 0) return;
+        onlineMarked = data.present.slice().reverse().concat(onlineMarked);
+        renderOnlineStatus();
+      },
+      session: handleOnlineSession,
+      otp: (data) => {
+        // The bar runs down locally between rotations
+        const rotatesAt = Date.now() + data.time_remaining * 1000;
+        showOtp(data.otp, data.time_remaining);
+        if (onlineOtpInterval) clearInterval(onlineOtpInterval);
+        onlineOtpInterval = setInterval(() => {
+          showOtp(data.otp, Math.max(0, (rotatesAt - Date.now()) / 1000));
+        }, 1000);
+      },
+    }, () => {
+      startOtpRotation();
+      startOnlineStatusPolling();
+    });
+  }
+
+  function handleOnlineSession(data) {
+    if (data.session_active) {
+      sessionState.endTime = new Date(Date.now() + data.seconds_remaining * 1000);
+    } else {
+      closeLiveEvents();
+      clearInterval(onlineOtpInterval);
+    }
+  }
+
   // Render unmarked students for online mode
   let onlineAllStudents = [];
 
@@ -803,6 +886,7 @@ document.addEventListener('DOMContentLoaded', () => {
     if (confirmed && sessionState.sessionId) {
       try {
         await fetch(`/api/teacher/session/${sessionState.sessionId}/end`, { method: 'POST' });
+        closeLiveEvents();
         clearInterval(onlineOtpInterval);
         clearInterval(onlineStatusInterval);
         sessionState.sessionToken = null;
@@ -844,6 +928,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const start_time = new Date(`${sessionDate}T${now.toTimeString().split(' ')[0]}`).toISOString();
     const duration_minutes = durationInput.value;
     const topic = topicInput ? topicInput.value.trim() : '';
+    const room = roomInput ? roomInput.value.trim() : '';
 
     try {
       const response = await fetch('/api/teacher/start-session', {
@@ -855,6 +940,7 @@ document.addEventListener('DOMContentLoaded', () => {
           duration_minutes,
           session_type: sessionType,
           topic: topic,
+          room: room,
         }),
       });
 
@@ -892,10 +978,58 @@ document.addEventListener('DOMContentLoaded', () => {
   // =============================================================
   // 9. LIVE DASHBOARD
   // =============================================================
-  function startLiveUpdates() {
-    if (sessionState.liveUpdateInterval) {
-      clearInterval(sessionState.liveUpdateInterval);
+  // Scans, overrides, session changes and device heartbeats are pushed by the
+  // server (/events, Server-Sent Events); polling is only the fallback.
+  let liveEventSource = null;
+  let liveMarkedRolls = new Set();
+  let liveCursor = 0;   // Attendance cursor for ?since= polls (0 = full reload)
+
+  function openLiveEvents(handlers, onUnavailable) {
+    closeLiveEvents();
+    if (!window.EventSource || !sessionState.sessionId) {
+      onUnavailable();
+      return;
+    }
+    const source = new EventSource(`/api/teacher/session/${sessionState.sessionId}/events`);
+    Object.entries(handlers).forEach(([name, handler]) => {
+      source.addEventListener(name, (event) => handler(JSON.parse(event.data)));
+    });
+    source.onerror = () => {
+      // EventSource reconnects on its own - CLOSED means the stream could not be opened
+      if (source.readyState === EventSource.CLOSED && liveEventSource === source) {
+        liveEventSource = null;
+        onUnavailable();
+      }
+    };
+    liveEventSource = source;
+  }
+
+  function closeLiveEvents() {
+    if (liveEventSource) {
+      liveEventSource.close();
+      liveEventSource = null;
     }
+  }
+
+  function startLiveUpdates() {
+    stopLiveUpdates();
+    openLiveEvents({
+      snapshot: (data) => {
+        liveMarkedRolls = new Set(data.present.map(s => s.university_roll_no));
+        renderLiveAttendance();
+        handleLiveSession(data);
+      },
+      attendance: (data) => {
+        data.present.forEach(s => liveMarkedRolls.add(s.university_roll_no));
+        renderLiveAttendance();
+      },
+      session: handleLiveSession,
+      device: renderDeviceStatus,
+    }, startLivePolling);
+  }
+
+  function startLivePolling() {
+    liveCursor = 0;
     updateLiveStatus();
     sessionState.liveUpdateInterval = setInterval(() => {
       updateLiveStatus();
@@ -903,12 +1037,32 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   function stopLiveUpdates() {
+    closeLiveEvents();
     if (sessionState.liveUpdateInterval) {
       clearInterval(sessionState.liveUpdateInterval);
       sessionState.liveUpdateInterval = null;
     }
   }
 
+  function renderLiveAttendance() {
+    const unmarkedStudents = sessionState.allStudents.filter(s => !liveMarkedRolls.has(s.university_roll_no));
+    renderUnmarkedStudents(unmarkedStudents);
+    attendanceCountSpan.textContent = liveMarkedRolls.size;
+  }
+
+  async function handleLiveSession(data) {
+    if (data.session_active) {
+      // Keeps the countdown right when the session is extended from another tab
+      sessionState.endTime = new Date(Date.now() + data.seconds_remaining * 1000);
+      return;
+    }
+    console.log('Session auto-expired detected');
+    stopLiveUpdates();
+    stopCountdownTimer();
+    await Modal.alert('Session has automatically ended due to time expiration.', 'Session Expired', 'warning');
+    loadPostSessionReport(sessionState.sessionId);
+  }
+
   function startCountdownTimer() {
     if (sessionState.countdownInterval) {
       clearInterval(sessionState.countdownInterval);
@@ -995,7 +1149,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     try {
       // Get attendance status
-      const statusResponse = await fetch(`/api/teacher/session/${sessionState.sessionId}/status`);
+      const since = liveCursor;
+      const statusResponse = await fetch(`/api/teacher/session/${sessionState.sessionId}/status?since=${since}`);
       const statusData = await statusResponse.json();
 
       if (statusResponse.ok) {
@@ -1014,29 +1169,22 @@ document.addEventListener('DOMContentLoaded', () => {
           totalStudentsSpan.textContent = sessionState.allStudents.length;
         }
 
-        const markedUnivRollNos = new Set(statusData.marked_students);
-        const unmarkedStudents = sessionState.allStudents.filter(s => !markedUnivRollNos.has(s.university_roll_no));
-        renderUnmarkedStudents(unmarkedStudents);
-        attendanceCountSpan.textContent = markedUnivRollNos.size;
+        if (since === 0) {
+          liveMarkedRolls = new Set(statusData.marked_students);
+        } else {
+          statusData.marked_students.forEach(roll => liveMarkedRolls.add(roll));
+        }
+        // A removed record can't be expressed as a delta - reload everything next time
+        liveCursor = liveMarkedRolls.size === statusData.present_count ? statusData.last_record_id : 0;
+        renderLiveAttendance();
       }
 
       // Device status
-      const deviceResponse = await fetch('/api/teacher/device-status');
+      const deviceResponse = await fetch(`/api/teacher/device-status?session_id=${sessionState.sessionId}`);
       const deviceData = await deviceResponse.json();
 
       if (deviceResponse.ok) {
-        if (deviceData.status === 'online') {
-          const strength = deviceData.wifi_strength > -67 ? 'Strong' : deviceData.wifi_strength > -80 ? 'Okay' : 'Weak';
-          deviceStatusText.innerHTML = `✅ Online (${strength})<br>🔋 ${deviceData.battery}% | 📝 Q: ${deviceData.queue_count} | 🔄 S: ${deviceData.sync_count}`;
-        } else if (deviceData.status === 'offline') {
-          if (deviceData.last_seen !== undefined) {
-            deviceStatusText.innerHTML = `❌ Offline (${deviceData.last_seen}s ago)<br>🔋 Last: ${deviceData.battery || '?'}% | 📝 Q: ${deviceData.queue_count || 0}`;
-          } else {
-            deviceStatusText.innerHTML = `❌ Offline / No Data<br>Waiting for device...`;
-          }
-        } else {
-          deviceStatusText.innerHTML = `⚠️ Status Unknown<br>${deviceData.message || 'Check connection'}`;
-        }
+        renderDeviceStatus(deviceData);
       } else {
         deviceStatusText.innerHTML = `❌ Error<br>Cannot fetch status`;
       }
@@ -1046,6 +1194,28 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  function renderDeviceStatus(deviceData) {
+    // Room and counters end up in innerHTML - escape them
+    const esc = (value) => {
+      const span = document.createElement('span');
+      span.textContent = value ?? '';
+      return span.innerHTML;
+    };
+    const room = deviceData.room ? ` · ${esc(deviceData.room)}` : '';
+    if (deviceData.status === 'online') {
+      const strength = deviceData.wifi_strength > -67 ? 'Strong' : deviceData.wifi_strength > -80 ? 'Okay' : 'Weak';
+      deviceStatusText.innerHTML = `✅ Online (${strength})${room}<br>🔋 ${esc(deviceData.battery)}% | 📝 Q: ${esc(deviceData.queue_count)} | 🔄 S: ${esc(deviceData.sync_count)}`;
+    } else if (deviceData.status === 'offline') {
+      if (deviceData.last_seen !== undefined) {
+        deviceStatusText.innerHTML = `❌ Offline (${deviceData.last_seen}s ago)${room}<br>🔋 Last: ${esc(deviceData.battery || '?')}% | 📝 Q: ${esc(deviceData.queue_count || 0)}`;
+      } else {
+        deviceStatusText.innerHTML = `❌ Offline / No Data<br>Waiting for device...`;
+      }
+    } else {
+      deviceStatusText.innerHTML = `⚠️ Status Unknown<br>${esc(deviceData.message || 'Check connection')}`;
+    }
+  }
+
   function renderUnmarkedStudents(students) {
     unmarkedStudentsTbody.innerHTML = '';
     const searchTerm = searchInput.value.toLowerCase();
@@ -1065,7 +1235,7 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   searchInput.addEventListener('input', () => {
-    updateLiveStatus();
+    renderLiveAttendance();
   });
 
   unmarkedStudentsTbody.addEventListener('click', async (event) => {
@@ -1091,7 +1261,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
           if (response.ok) {
             await Modal.alert('Attendance marked successfully!', 'Success', 'success');
-            updateLiveStatus();
+            if (!liveEventSource) updateLiveStatus();
           } else {
             const errorData = await response.json();
             await Modal.alert(`Failed to mark attendance: ${errorData.message}`, 'Error', 'error');
@@ -1498,8 +1668,8 @@ document.addEventListener('DOMContentLoaded', () => {
           await fetchAndPopulateStudents();
           updateSelectionCount();
 
-          // Update live dashboard
-          updateLiveStatus();
+          // Update live dashboard (pushed already when the event stream is open)
+          if (!liveEventSource) updateLiveStatus();
         } else {
           const error = await response.json();
           await Modal.alert(error.message || 'Failed to mark students', 'Error', 'error');
@@ -1700,40 +1870,14 @@ document.addEventListener('DOMContentLoaded', () => {
     historyContent.style.display = 'none';
 
     try {
-      const response = await fetch(`/api/teacher/history/${sessionState.courseId}`);
-      const data = await response.json();
+      const data = await fetchHistoryPage(sessionState.courseId);
 
-      if (response.ok) {
+      if (data) {
         historyList.innerHTML = '';
 
         if (data.sessions && data.sessions.length > 0) {
           noHistoryMessage.style.display = 'none';
-
-          data.sessions.forEach(session => {
-            const badgeClass = session.attendance_percent >= 75 ? 'good' : session.attendance_percent >= 50 ? 'warning' : 'critical';
-            const activeClass = session.is_active ? 'active-session' : '';
-
-            const card = document.createElement('div');
-            card.className = `session-history-card ${activeClass}`;
-            card.dataset.sessionId = session.id;
-            card.innerHTML = `
-              <div class="session-card-info">
-                <h4>${session.date} at ${session.time}</h4>
-                <p class="session-topic">${session.topic}</p>
-                <p>${session.session_type === 'offline' ? '📍 Offline' : '🌐 Online'}${session.is_active ? ' • 🟢 Active' : ''}</p>
-              </div>
-              <div class="session-card-stats">
-                <span class="attendance-badge ${badgeClass}">${session.present_count}/${session.total_students} (${session.attendance_percent}%)</span>
-                ${!session.is_active ? `<button class="delete-session-btn" data-session-id="${session.id}" data-session-date="${session.date}" data-session-time="${session.time}" data-session-type="${session.session_type}" data-session-present="${session.present_count}" title="Delete this session">🗑️</button>` : ''}
-              </div>
-            `;
-            card.addEventListener('click', (e) => {
-              // Don't open detail if delete button was clicked
-              if (e.target.closest('.delete-session-btn')) return;
-              showSessionDetailModal(session.id);
-            });
-            historyList.appendChild(card);
-          });
+          renderHistoryPage(sessionState.courseId, data);
         } else {
           noHistoryMessage.style.display = 'block';
         }
@@ -1750,6 +1894,66 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Fetch one page of session history (newest first). Returns null on error.
+  async function fetchHistoryPage(courseId, before = null) {
+    const params = new URLSearchParams();
+    if (before) params.set('before', before);
+    const response = await fetch(`/api/teacher/history/${courseId}?${params}`);
+    return response.ok ? response.json() : null;
+  }
+
+  // Append a page of session cards, plus a "Load older" button if more pages exist
+  function renderHistoryPage(courseId, data) {
+    data.sessions.forEach(session => {
+      const badgeClass = session.attendance_percent >= 75 ? 'good' : session.attendance_percent >= 50 ? 'warning' : 'critical';
+      const activeClass = session.is_active ? 'active-session' : '';
+
+      const card = document.createElement('div');
+      card.className = `session-history-card ${activeClass}`;
+      card.dataset.sessionId = session.id;
+      card.innerHTML = `
+        <div class="session-card-info">
+          <h4>${session.date} at ${session.time}</h4>
+          <p class="session-topic">${session.topic}</p>
+          <p>${session.session_type === 'offline' ? '📍 Offline' : '🌐 Online'}${session.is_active ? ' • 🟢 Active' : ''}</p>
+        </div>
+        <div class="session-card-stats">
+          <span class="attendance-badge ${badgeClass}">${session.present_count}/${session.total_students} (${session.attendance_percent}%)</span>
+          ${!session.is_active ? `<button class="delete-session-btn" data-session-id="${session.id}" data-session-date="${session.date}" data-session-time="${session.time}" data-session-type="${session.session_type}" data-session-present="${session.present_count}" title="Delete this session">🗑️</button>` : ''}
+        </div>
+      `;
+      card.addEventListener('click', (e) => {
+        // Don't open detail if delete button was clicked
+        if (e.target.closest('.delete-session-btn')) return;
+        showSessionDetailModal(session.id);
+      });
+      historyList.appendChild(card);
+    });
+
+    if (!data.has_more) return;
+
+    const loadMoreButton = document.createElement('button');
+    loadMoreButton.className = 'button-secondary';
+    loadMoreButton.style.width = '100%';
+    loadMoreButton.textContent = `Load older sessions (${data.total_count - historyList.querySelectorAll('.session-history-card').length} more)`;
+    loadMoreButton.addEventListener('click', async () => {
+      loadMoreButton.disabled = true;
+      loadMoreButton.textContent = 'Loading...';
+      try {
+        const nextPage = await fetchHistoryPage(courseId, data.next_before);
+        // Ignore the page if the course changed meanwhile
+        if (!nextPage || sessionState.courseId !== courseId) throw new Error('History page unavailable');
+        loadMoreButton.remove();
+        renderHistoryPage(courseId, nextPage);
+      } catch (error) {
+        console.error('History page error:', error);
+        loadMoreButton.disabled = false;
+        loadMoreButton.textContent = 'Load older sessions';
+      }
+    });
+    historyList.appendChild(loadMoreButton);
+  }
+
   // Delete session handler — triggered from history card delete button
   document.addEventListener('click', async (e) => {
     const deleteBtn = e.target.closest('.delete-session-btn');
@@ -2012,7 +2216,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     try {
       // Get history to find a session for the report
-      const historyResponse = await fetch(`/api/teacher/history/${sessionState.courseId}`);
+      const historyResponse = await fetch(`/api/teacher/history/${sessionState.courseId}?limit=1`);
       const historyData = await historyResponse.json();
 
       if (!historyData.sessions || historyData.sessions.length === 0) {
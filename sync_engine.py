@@ -17,6 +17,10 @@ import logging
 import threading
 import time
 
+from schema_migrations import run_migrations
+from rollups import get_data_version
+from attendance_matrix import latest_change_seq, log_reset
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -194,13 +198,6 @@ class SyncEngine:
             conn = sqlite3.connect(self.db_path)
             conn.execute("PRAGMA foreign_keys = OFF")
             
-            # Ensure created_on column exists in the new database
-            try:
-                conn.execute("ALTER TABLE sessions ADD COLUMN created_on TEXT DEFAULT 'local'")
-                conn.commit()
-            except Exception:
-                pass  # Column already exists
-            
             # Map old session IDs to new ones
             old_to_new_id = {}
             inserted_sessions = 0
@@ -290,16 +287,46 @@ class SyncEngine:
             test_conn.execute("SELECT count(*) FROM sqlite_master")
             test_conn.close()
             
-            # Backup existing database (if exists)
+            # Remember the current data version / change seq so caches in every process see the import
+            old_version = 0
+            old_change_seq = 0
             if os.path.exists(self.db_path):
-                backup_path = self.db_path + '.pre_sync_backup'
-                shutil.copy2(self.db_path, backup_path)
+                try:
+                    version_conn = sqlite3.connect(self.db_path)
+                    old_version = get_data_version(version_conn)
+                    old_change_seq = latest_change_seq(version_conn)
+                    version_conn.close()
+                except sqlite3.Error:
+                    pass
+            
+            # Backup existing database (if exists) - with SQLite's backup API, which reads one
+            # consistent snapshot including committed WAL frames, even while other connections write
+            if os.path.exists(self.db_path):
+                self._backup_database(self.db_path + '.pre_sync_backup')
             
             # Replace the database with local snapshot
             shutil.move(temp_path, self.db_path)
             
+            # Stale WAL/shared-memory files belong to the old database - never replay them
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            
             logger.info(f"[SYNC] Database imported successfully: {len(binary_data)} bytes")
             
+            # The snapshot may come from an older local build - bring its schema up to date
+            mig_conn = sqlite3.connect(self.db_path)
+            try:
+                applied = run_migrations(mig_conn)
+                # New file, new data: move the version past the old file's so no cache mistakes them
+                mig_conn.execute("UPDATE data_version SET version = version + ? WHERE id = 1", (old_version + 1,))
+                log_reset(mig_conn, after_seq=old_change_seq)
+                mig_conn.commit()
+            finally:
+                mig_conn.close()
+            if applied:
+                logger.info(f"[SYNC] Migrated imported database to schema version {applied[-1]}")
+            
             # Re-insert online records if provided
             if online_records and (online_records.get('sessions') or online_records.get('attendance')):
                 self.reinsert_online_records(online_records)
@@ -313,6 +340,21 @@ class SyncEngine:
                 os.remove(temp_path)
             return False
     
+    def _backup_database(self, backup_path):
+        """Consistent copy of the live database to `backup_path` (raises on failure)."""
+        for path in (backup_path, backup_path + '-wal', backup_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        source = sqlite3.connect(self.db_path)
+        try:
+            target = sqlite3.connect(backup_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    
     def push_to_cloud(self):
         """
         Push the local database to the cloud server.
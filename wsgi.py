@@ -3,8 +3,10 @@
 #   Used by production WSGI servers (Waitress, Gunicorn, etc.)
 #
 #   Usage:
-#     Windows:  waitress-serve --host=0.0.0.0 --port=5000 wsgi:app
-#     Linux:    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+#     Windows:  waitress-serve --threads=16 --host=0.0.0.0 --port=5000 wsgi:app
+#     Linux:    gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 wsgi:app
+#
+#   Keep the threads: each open live dashboard stream holds one.
 # =================================================================
 
 from server import app